@@ -0,0 +1,156 @@
+import asyncio
+import os
+
+from quart import Quart, request, jsonify, send_file
+from quart_cors import cors
+
+from async_firebase_util import AsyncFirebaseUtil
+from firebase_util import get_decoded_claims_id_token
+from health_util import CachedProbe
+from lock_client_util import AsyncLockGateway
+from logging_util import log_app, log_result
+from metrics_util import instrument_app, generate_metrics
+from nonce_cache import nonce_cache_from_env
+from profiler_util import profile
+from request_validation_util import get_client_ip
+from routes import (Routes, readiness, get_icon_path, JSON_ROUTES, MIRROR_TREES, HEALTH_PROBE_PATH,
+                    STORAGE_PROBE_INTERVAL, TRUSTED_PROXY_HOPS, INVITE_LOCK_STRIPES)
+from signature_verifier import SignatureVerifier, workers_from_env
+from tracing_util import trace_app
+
+# ASGI front-end of the routes app.py serves (see routes): storage and lock sockets are awaited instead of blocking a
+# worker thread. Run with e.g. `hypercorn async_app:app`.
+
+
+class AsyncRoutes(Routes):
+    # Routes on the event loop: independent storage calls run together, token checks, signatures and profiles in
+    # worker threads, and claims of one invite wait on an asyncio lock
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._invite_locks = [asyncio.Lock() for _ in range(INVITE_LOCK_STRIPES)]
+
+    async def gather(self, *awaitables):
+        return await asyncio.gather(*awaitables)
+
+    async def get_decoded_claims(self, id_token):
+        # verify_id_token may fetch Google's public keys
+        return await asyncio.to_thread(get_decoded_claims_id_token, id_token)
+
+    async def verify_signature(self, key, data, signature):
+        return await asyncio.to_thread(self.signature_verifier.verify, key, data, signature)
+
+    async def sign_authorization(self, signer, *args):
+        return await asyncio.to_thread(signer.sign_authorization, *args)
+
+    async def profile(self, seconds):
+        return await asyncio.to_thread(profile, seconds)
+
+    def invite_lock(self, invite_id):
+        return self._invite_locks[hash(invite_id) % INVITE_LOCK_STRIPES]
+
+
+app = cors(Quart(__name__), allow_origin="*")
+instrument_app(app)
+trace_app(app)
+log_app(app)
+
+lock_gateway = AsyncLockGateway()
+signature_verifier = SignatureVerifier(max_workers=workers_from_env())
+
+# fb_util is created when the app starts serving, on its event loop
+routes = AsyncRoutes(None, lock_gateway, signature_verifier, nonce_cache_from_env())
+storage_probe: CachedProbe = None
+
+
+def create_fb_util(fb_util_test=None):
+    # fb_util_test needs the coroutines of AsyncFirebaseUtil
+    routes.fb_util = fb_util_test if fb_util_test else AsyncFirebaseUtil(mirror_trees=MIRROR_TREES)
+
+
+@app.before_serving
+async def open_connections():
+    global storage_probe
+    if routes.fb_util is None:
+        create_fb_util()
+
+    # the probe runs in a worker thread (see readyz) and hands the read back to this loop
+    loop = asyncio.get_running_loop()
+    storage_probe = CachedProbe(
+        "storage", lambda: asyncio.run_coroutine_threadsafe(routes.fb_util.get_data(HEALTH_PROBE_PATH), loop).result(),
+        interval=STORAGE_PROBE_INTERVAL)
+
+
+@app.after_serving
+async def close_connections():
+    lock_gateway.close_all()
+    signature_verifier.close()
+
+    if routes.fb_util is not None:
+        await routes.fb_util.close()
+
+
+def _get_remote_ip(req):
+    return get_client_ip(req.remote_addr, req.headers.get('X-Forwarded-For'), TRUSTED_PROXY_HOPS)
+
+
+def _json_response(response):
+    # rate limited responses also get the 429 status and a Retry-After header
+    log_result(response)
+    if response.get('code') == 429:
+        return jsonify(response), 429, {'Retry-After': str(response['retry_after'])}
+    return jsonify(response)
+
+
+def _json_view(name, method):
+    route = getattr(routes, name)
+
+    async def view():
+        args = await request.get_json() if method == 'POST' else request.args
+        return _json_response(await route(args, _get_remote_ip(request)))
+
+    view.__name__ = name
+    return view
+
+
+for rule, method, name in JSON_ROUTES:
+    app.add_url_rule(rule, view_func=_json_view(name, method), methods=[method])
+
+
+@app.route("/readyz", methods=['GET'])
+async def readyz():
+    lock_gateway.evict_idle()
+    response = readiness(await asyncio.to_thread(storage_probe.check), len(lock_gateway))
+    log_result(response)
+
+    if not response['success']:
+        return jsonify(response), 503
+
+    return jsonify(response)
+
+
+@app.route("/metrics", methods=['GET'])
+async def metrics():
+    body, content_type = generate_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+
+@app.route("/get-icon", methods=['GET'])
+async def get_icon():
+    path, error = get_icon_path(request.args.get("icon_id"))
+
+    if error:
+        return error, 404
+
+    return await send_file(path, mimetype='image/png')
+
+
+@app.route("/admin/profile", methods=['POST'])
+async def admin_profile():
+    response = await routes.admin_profile(await request.get_json(), _get_remote_ip(request))
+
+    if not response['success']:
+        return _json_response(response)
+
+    return response['profile'], 200, {'Content-Type': 'text/plain; charset=utf-8',
+                                      'Content-Disposition': f'attachment; filename=profile-{os.getpid()}.collapsed'}
@@ -0,0 +1,195 @@
+import asyncio
+import json
+from functools import wraps
+from urllib.parse import quote
+
+import httpx
+
+from firebase_util import CREDENTIALS_FILE, DATABASE_URL, generate_random_id, get_firebase_app
+from metrics_util import dependency_timer, DEPENDENCY_CALLS_COALESCED
+from single_flight import AsyncSingleFlight
+from tracing_util import start_span, set_attributes
+
+# characters firebase_admin.db does not allow in paths (db._parse_path); in a URL they would address another path
+INVALID_PATH_CHARACTERS = '[].?#$'
+
+
+def _path_url(path):
+    # "/a/b.json" for "a/b", each segment checked like firebase_admin does and percent-encoded
+    if not isinstance(path, str) or any(character in path for character in INVALID_PATH_CHARACTERS):
+        raise ValueError(f'Invalid path: "{path}". Path contains illegal characters.')
+    return "/" + "/".join(quote(segment, safe="") for segment in path.split("/") if segment) + ".json"
+
+
+def _coalesced(func):
+    # identical reads in flight at the same time make a single database call and share its result
+    operation = func.__name__
+
+    @wraps(func)
+    async def wrapper(self, *args):
+        if self.reads is None:
+            return await func(self, *args)
+
+        result, shared = await self.reads.do((operation, *args), func, self, *args)
+        if shared:
+            DEPENDENCY_CALLS_COALESCED.labels("firebase", operation).inc()
+            set_attributes(**{'rtdb.coalesced': True})
+        return result
+
+    return wrapper
+
+
+def _mirrored(func):
+    # reads of the trees the mirror holds are answered from it while it is in sync (see firebase_util)
+    operation = func.__name__
+
+    @wraps(func)
+    async def wrapper(self, *args):
+        if self.mirror is not None:
+            found, result = getattr(self.mirror, operation)(*args)
+            if found:
+                return result
+        return await func(self, *args)
+
+    return wrapper
+
+
+def _invalidates_reads(func):
+    # reads started after a write returns do not join reads that may have started before it
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            if self.reads is not None:
+                self.reads.forget()
+
+    return wrapper
+
+
+class AsyncFirebaseUtil:
+    # Same interface as FirebaseUtil, with coroutines, talking to the Realtime Database REST API over one pooled
+    # HTTP/1.1 client so requests waiting on the database do not hold a thread each. Reads are coalesced and
+    # mirror_trees mirrored like in FirebaseUtil; the mirror listens through firebase_admin (mirror_db), on threads of
+    # its own, and is read without blocking the event loop.
+
+    def __init__(self, credential=None, database_url=DATABASE_URL, max_connections=100, coalesce_reads=True,
+                 mirror_trees=(), mirror_db=None, transport=None):
+        # credential is a google.auth credential, the service account in CREDENTIALS_FILE by default; transport is
+        # passed to the httpx client (e.g. httpx.MockTransport in tests)
+        if credential is None:
+            from firebase_admin import credentials
+
+            credential = credentials.Certificate(CREDENTIALS_FILE).get_credential()
+
+        self._credential = credential
+        self._client = httpx.AsyncClient(base_url=database_url, timeout=10, transport=transport,
+                                         limits=httpx.Limits(max_connections=max_connections))
+        self._token_lock = asyncio.Lock()
+
+        self.reads = AsyncSingleFlight() if coalesce_reads else None
+        self.mirror = None
+
+        if mirror_trees:
+            from rtdb_mirror import start_mirror
+
+            if mirror_db is None:
+                from firebase_admin import db as mirror_db
+
+                get_firebase_app()
+
+            self.mirror = start_mirror(mirror_db, mirror_trees)
+
+    async def _get_headers(self):
+        if not self._credential.valid:
+            from google.auth.transport.requests import Request
+
+            async with self._token_lock:
+                if not self._credential.valid:
+                    await asyncio.to_thread(self._credential.refresh, Request())
+        return {'Authorization': f'Bearer {self._credential.token}'}
+
+    async def _request(self, method, path, headers=None, **kwargs):
+        headers = {**(await self._get_headers()), **(headers or {})}
+        operation = method.lower()
+        with dependency_timer("firebase", operation), start_span(f"firebase.{operation}", **{'rtdb.path': path}):
+            response = await self._client.request(method, _path_url(path), headers=headers, **kwargs)
+        if response.status_code != 412:
+            response.raise_for_status()
+        return response
+
+    @_mirrored
+    @_coalesced
+    async def get_data(self, path):
+        response = await self._request('GET', path)
+        return response.json()
+
+    @_invalidates_reads
+    async def set_data(self, path, data):
+        await self._request('PATCH', path, json=data, params={'print': 'silent'})
+        if self.mirror is not None:
+            self.mirror.apply_update(path, data)
+        return True
+
+    @_invalidates_reads
+    async def set_multiple_data(self, data_by_path):
+        await self._request('PATCH', "", json=data_by_path, params={'print': 'silent'})
+        if self.mirror is not None:
+            self.mirror.apply_update("", data_by_path)
+        return True
+
+    @_invalidates_reads
+    async def delete_key(self, path):
+        await self._request('DELETE', path)
+        if self.mirror is not None:
+            self.mirror.apply_set(path, None)
+        return True
+
+    @_invalidates_reads
+    async def claim_data(self, path, max_retries=25):
+        # same ETag-conditional delete as firebase_util._claim_ref
+        response = await self._request('GET', path, headers={'X-Firebase-ETag': 'true'})
+        for _ in range(max_retries):
+            data = response.json()
+            if data is None:
+                return None
+
+            etag = response.headers.get('ETag')
+            response = await self._request('PUT', path, content=b"null",
+                                           headers={'if-match': etag, 'Content-Type': 'application/json'})
+            if response.status_code != 412:
+                if self.mirror is not None:
+                    self.mirror.apply_set(path, None)
+                return data
+
+        raise RuntimeError('Claim aborted after failed retries.')
+
+    async def add_data_to_path(self, path, data):
+        return await self.set_data(f"{path}/{generate_random_id(8)}", data)
+
+    @_mirrored
+    @_coalesced
+    async def get_data_where_child_equal_to(self, path, child, value):
+        params = {'orderBy': json.dumps(child), 'equalTo': json.dumps(value), 'limitToFirst': 1}
+        response = await self._request('GET', path, params=params)
+        return response.json()
+
+    @_coalesced
+    async def get_data_where_child_between(self, path, child, start, end, limit):
+        params = {'orderBy': json.dumps(child), 'endAt': json.dumps(end), 'limitToFirst': limit}
+        if start is not None:
+            params['startAt'] = json.dumps(start)
+        response = await self._request('GET', path, params=params)
+        return response.json()
+
+    @_invalidates_reads
+    async def set_random_username(self, user_id):
+        username = generate_random_id(15)
+        await self.set_data(f"users/{user_id}", {'username': username})
+        return username
+
+    async def close(self):
+        # the mirror's listener threads are joined off the event loop
+        if self.mirror is not None:
+            await asyncio.to_thread(self.mirror.stop)
+        await self._client.aclose()
@@ -0,0 +1,93 @@
+from collections import namedtuple
+
+ADMIN = 0
+OWNER = 1
+TENANT = 2
+PERIODIC_USER = 3
+ONE_TIME_USER = 4
+
+ONE_DAY_IN_SEC = 24 * 60 * 60
+ALL_WEEKDAYS = 0b1111111
+
+FOREVER = float("inf")
+
+# Authorization reduced to a time interval [start, end) plus a bitmask of allowed weekdays (bit 0 is Monday, as in
+# datetime.weekday()). Days are UTC days shifted by utc_offset seconds.
+CompiledAuthorization = namedtuple("CompiledAuthorization", ["start", "end", "weekdays_mask", "utc_offset"])
+
+
+def _day_start(timestamp, utc_offset):
+    return timestamp - (timestamp + utc_offset) % ONE_DAY_IN_SEC
+
+
+def _weekday(timestamp, utc_offset):
+    # 1970-01-01 was a Thursday (weekday 3)
+    return (int((timestamp + utc_offset) // ONE_DAY_IN_SEC) + 3) % 7
+
+
+def compile_authorization(authorization, utc_offset=0):
+    # Returns None for missing or malformed authorizations; those are never allowed but never pruned either.
+    if not authorization:
+        return None
+
+    try:
+        auth_type = authorization["type"]
+
+        if auth_type == ADMIN or auth_type == OWNER:
+            return CompiledAuthorization(-FOREVER, FOREVER, ALL_WEEKDAYS, utc_offset)
+
+        if auth_type == TENANT:
+            return CompiledAuthorization(authorization["valid_from"], authorization["valid_until"], ALL_WEEKDAYS,
+                                         utc_offset)
+
+        if auth_type == PERIODIC_USER:
+            weekdays_mask = 0
+            for weekday in authorization["weekdays"]:
+                weekdays_mask |= 1 << int(weekday)
+
+            return CompiledAuthorization(authorization["valid_from"], authorization["valid_until"],
+                                         weekdays_mask & ALL_WEEKDAYS, utc_offset)
+
+        if auth_type == ONE_TIME_USER:
+            start = _day_start(authorization["one_day"], utc_offset)
+            return CompiledAuthorization(start, start + ONE_DAY_IN_SEC, ALL_WEEKDAYS, utc_offset)
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    return None
+
+
+def uses_local_days(authorization):
+    # whether the verdict depends on where the lock's days start, i.e. on its utc_offset
+    return bool(authorization) and authorization.get("type") in (PERIODIC_USER, ONE_TIME_USER)
+
+
+def is_allowed(compiled, now):
+    if compiled is None or not compiled.start <= now < compiled.end:
+        return False
+    return bool(compiled.weekdays_mask >> _weekday(now, compiled.utc_offset) & 1)
+
+
+def is_expired(compiled, now):
+    return compiled is not None and (compiled.end <= now or not compiled.weekdays_mask)
+
+
+def verdict_valid_until(compiled, now):
+    # Time until which is_allowed(compiled, now) keeps its current answer, or None if it never changes.
+    if compiled is None or is_expired(compiled, now):
+        return None
+
+    if now < compiled.start:
+        return compiled.start
+
+    if compiled.weekdays_mask == ALL_WEEKDAYS:
+        return None if compiled.end == FOREVER else compiled.end
+
+    allowed_today = is_allowed(compiled, now)
+    day = _day_start(now, compiled.utc_offset) + ONE_DAY_IN_SEC
+    for _ in range(7):
+        if day >= compiled.end or is_allowed(compiled, day) != allowed_today:
+            break
+        day += ONE_DAY_IN_SEC
+
+    return min(day, compiled.end)
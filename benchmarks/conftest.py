@@ -0,0 +1,26 @@
+import glob
+import os
+
+import pytest
+
+# Benchmark runs are saved to .baselines, and compared with the latest run saved on this kind of machine, when there
+# is one. A best time more than REGRESSION_THRESHOLD slower fails the run; the minimum is compared because it is the
+# statistic least moved by other load on the machine.
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".baselines")
+REGRESSION_THRESHOLD = "min:25%"
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    from pytest_benchmark.utils import get_machine_id, parse_compare_fail
+
+    if config.option.benchmark_storage == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BASELINES_DIR}"
+
+    if config.option.benchmark_compare or not glob.glob(os.path.join(BASELINES_DIR, get_machine_id(), "*.json")):
+        return
+
+    config.option.benchmark_compare = True
+    if not config.option.benchmark_compare_fail:
+        config.option.benchmark_compare_fail = [parse_compare_fail(REGRESSION_THRESHOLD)]
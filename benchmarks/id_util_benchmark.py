@@ -0,0 +1,43 @@
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from id_util import IdPool, generate_id, generate_ids
+
+characters = string.ascii_letters + string.digits
+
+N = 32
+COUNT = 1000
+REPEAT = 5
+
+
+def legacy_generate_random_id(n):
+    return ''.join(random.choice(characters) for _ in range(n))
+
+
+def _best_of(stmt):
+    return min(timeit.repeat(stmt, number=COUNT, repeat=REPEAT)) / COUNT
+
+
+def main():
+    pool = IdPool(N, size=COUNT)
+
+    results = {
+        "legacy random.choice": _best_of(lambda: legacy_generate_random_id(N)),
+        "generate_id": _best_of(lambda: generate_id(N)),
+        "generate_ids (per id)": _best_of(lambda: generate_ids(COUNT, N)) / COUNT,
+        "IdPool.get": _best_of(pool.get),
+    }
+
+    baseline = results["legacy random.choice"]
+    print(f"{N}-character ids, best of {REPEAT} runs")
+    for name, seconds in results.items():
+        print(f"{name:<24} {seconds * 1e6:8.2f} us/id  {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import argparse
+import base64
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+# Load test of app:app under gunicorn (server_launch, one worker) with Firebase replaced by MemoryFirebaseUtil, ID
+# tokens by verify_test_id_token and the locks by a TCP server in this process. Client threads drive a mix of lock
+# and phone traffic and the latency percentiles and throughput per route are written as JSON, to compare commits:
+#
+#   python benchmarks/load_test.py --mix mixed --concurrency 32 --duration 20 --output load-test.json
+#
+# Mixes:
+#   polling  locks ask for authorizations and report their registration status
+#   invites  locks register invites, phones redeem them and list their locks
+#   remote   phones open remote sessions to their lock, send a few messages and close them
+#   mixed    70% polling, 20% invites, 10% remote
+# The same --seed gives the same sequence of scenarios per client. Client threads share the machine with the server,
+# so compare runs from the same machine.
+
+PORT = 5056
+LOCK_MESSAGE_LATENCY = 0.005
+KEY_SIZE = 2048
+# lock keys of the fixtures, generated on the first run and reused by the next ones (see key_pool)
+KEY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".keys")
+
+MIXES = {
+    "polling": {"polling": 1},
+    "invites": {"invites": 1},
+    "remote": {"remote": 1},
+    "mixed": {"polling": 70, "invites": 20, "remote": 10},
+}
+
+
+''' --------------- Server ----------------- '''
+
+
+def _create_app():
+    # gunicorn imports this module as load_test:app. The harness passes the fixtures, storage latency and lock server
+    # port; without them the app starts with an empty database (see lock_fleet_simulator.py).
+    import app as app_module
+    import firebase_util
+    import lock_client_util
+    from memory_firebase_util import MemoryFirebaseUtil, verify_test_id_token
+
+    data = None
+    if os.environ.get("LOAD_TEST_FIXTURES"):
+        with open(os.environ["LOAD_TEST_FIXTURES"]) as file:
+            data = json.load(file)["data"]
+
+    app_module.create_fb_util(MemoryFirebaseUtil(data, latency=float(os.environ.get("LOAD_TEST_LATENCY", 0))))
+    firebase_util.set_id_token_verifier(verify_test_id_token)
+    if os.environ.get("LOAD_TEST_LOCK_PORT"):
+        lock_client_util.LOCK_PORT = int(os.environ["LOAD_TEST_LOCK_PORT"])
+
+    return app_module.app
+
+
+def __getattr__(name):
+    # load_test:app is created when gunicorn asks for it, not when another benchmark imports this module
+    global app
+    if name == "app":
+        app = _create_app()
+        return app
+    raise AttributeError(name)
+
+
+class _LockHandler(socketserver.BaseRequestHandler):
+    # answers every message like a lock would, after LOCK_MESSAGE_LATENCY
+
+    def handle(self):
+        while True:
+            try:
+                msg = self.request.recv(1024)
+            except OSError:
+                return
+            if not msg:
+                return
+            time.sleep(LOCK_MESSAGE_LATENCY)
+            self.request.sendall(b"ACK " + msg[:1000])
+
+
+class LockSimulator(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _LockHandler)
+        self.port = self.server_address[1]
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+''' -------------- Fixtures ---------------- '''
+
+
+def create_lock(index, private_key_pem=None):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    if private_key_pem:
+        key = serialization.load_pem_private_key(private_key_pem, password=None)
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=KEY_SIZE)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"lock-{index}")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(index + 1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .sign(key, hashes.SHA256())
+
+    return {
+        'MAC': f"AA:00:00:00:{index // 256:02X}:{index % 256:02X}",
+        'BLE': f"BB:00:00:00:{index // 256:02X}:{index % 256:02X}",
+        # the database keeps the certificate body without the PEM header and footer
+        'certificate': base64.b64encode(cert.public_bytes(serialization.Encoding.DER)).decode(),
+        'private_key': key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                         serialization.NoEncryption()).decode(),
+    }
+
+
+def create_fixtures(n_clients):
+    # one lock and one user (with one phone) per client thread, the phone is authorized on the lock
+    from key_pool import KeyPairPool
+
+    key_pool = KeyPairPool(size=n_clients, bits=KEY_SIZE, cache_dir=KEY_CACHE_DIR, max_workers=os.cpu_count())
+    try:
+        locks = [create_lock(i, key_pool.get_pem()) for i in range(n_clients)]
+    finally:
+        key_pool.close()
+    users = [{'uid': f"user{i}", 'phone_id': f"phone{i}"} for i in range(n_clients)]
+
+    data = {'doors': {}, 'authorizations': {}, 'users': {}}
+    for lock, user in zip(locks, users):
+        data['doors'][lock['MAC']] = {'MAC': lock['MAC'], 'BLE': lock['BLE'], 'certificate': lock['certificate'],
+                                      'IP': "127.0.0.1"}
+        data['authorizations'][lock['MAC']] = {user['phone_id']: {'phone_id': user['phone_id'],
+                                                                  'smart_lock_MAC': lock['MAC'], 'type': 0}}
+        data['users'][user['uid']] = {'phone_ids': [user['phone_id']]}
+
+    return {'locks': locks, 'users': users, 'data': data}
+
+
+''' --------------- Clients ---------------- '''
+
+
+class Client:
+    # one lock and its owner's phone, each request is recorded as (route, latency, ok) once recording starts
+
+    def __init__(self, lock, user, rng, results):
+        from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+
+        self.lock = lock
+        self.user = user
+        self.id_token = f"token:{user['uid']}"
+        self.rng = rng
+        self.results = results
+        self.recording = False
+
+        self._rsa = RSA_Util(key_str=lock['private_key'], backend=BACKEND_CRYPTOGRAPHY)
+        self._connection = None
+
+    def request(self, method, route, path=None, body=None):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+
+        headers = {'Content-Type': "application/json"} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+
+        start = time.perf_counter()
+        try:
+            self._connection.request(method, path or route, body=payload, headers=headers)
+            response = self._connection.getresponse()
+            response_body = response.read()
+            elapsed = time.perf_counter() - start
+            result = json.loads(response_body) if response.status == 200 else None
+        except (OSError, http.client.HTTPException, ValueError):
+            elapsed = time.perf_counter() - start
+            self._connection.close()
+            self._connection = None
+            result = None
+
+        ok = isinstance(result, dict) and result.get("success") is True
+        if self.recording:
+            self.results.append((route, elapsed, ok))
+        return result if ok else None
+
+    def signed(self, data):
+        # signed like lock firmware that sends timestamp and nonce
+        data = json.dumps({**data, 'smart_lock_MAC': self.lock['MAC'], 'timestamp': time.time(),
+                           'nonce': f"{self.rng.getrandbits(64):016x}"})
+        return {'data': data, 'signature': self._rsa.sign(data).decode()}
+
+    def polling(self):
+        self.request("POST", "/request-authorization", body=self.signed({'phone_id': self.user['phone_id']}))
+        self.request("GET", "/check-lock-registration-status",
+                     f"/check-lock-registration-status?MAC={self.lock['MAC']}")
+
+    def invites(self):
+        result = self.request("POST", "/register-invite", body=self.signed({'type': 1}))
+        if result:
+            invite_id = base64.b64decode(result['inviteID']).decode().split(" ")[0]
+            self.request("POST", "/redeem-invite", body={'id_token': self.id_token, 'invite_id': invite_id,
+                                                         'phone_id': self.user['phone_id'],
+                                                         'master_key_encrypted_lock': "master-key"})
+        self.request("GET", "/get-user-locks", f"/get-user-locks?id_token={self.id_token}")
+
+    def remote(self, n_messages=3):
+        for i in range(n_messages):
+            self.request("POST", "/remote-connection", body={'id_token': self.id_token, 'lock_id': self.lock['MAC'],
+                                                             'msg': f"msg {i}", 'close': i == n_messages - 1})
+
+    def run(self, mix, stop_at):
+        scenarios, weights = zip(*MIXES[mix].items())
+        while time.time() < stop_at:
+            getattr(self, self.rng.choices(scenarios, weights)[0])()
+
+        if self._connection is not None:
+            self._connection.close()
+
+
+''' --------------- Harness ---------------- '''
+
+
+def _percentile(latencies, q):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else 0
+
+
+def _summarize(results, duration):
+    by_route = {}
+    for route, elapsed, ok in results:
+        by_route.setdefault(route, []).append((elapsed, ok))
+    by_route["total"] = [(elapsed, ok) for _, elapsed, ok in results]
+
+    summary = {}
+    for route, samples in sorted(by_route.items()):
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        summary[route] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, ok in samples if not ok),
+            'rps': round(len(samples) / duration, 1),
+            'p50_ms': round(_percentile(latencies, 0.50), 2),
+            'p95_ms': round(_percentile(latencies, 0.95), 2),
+            'p99_ms': round(_percentile(latencies, 0.99), 2),
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0,
+        }
+    return summary
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                             text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def _wait_until_up(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=1)
+            connection.request("GET", "/livez")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run_load_test(mix="mixed", concurrency=32, duration=20, warmup=3, storage_latency=0.02, preset="gthread",
+                  seed=0):
+    fixtures = create_fixtures(concurrency)
+    lock_simulator = LockSimulator()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+        json.dump(fixtures, file)
+
+    # every client thread comes from the same IP, so rate limiting is off unless asked for
+    env = {"RATE_LIMIT_DISABLED": "1", **os.environ, "SERVER_PRESET": preset, "PORT": str(PORT), "WEB_CONCURRENCY": "1",
+           "LOAD_TEST_FIXTURES": file.name, "LOAD_TEST_LATENCY": str(storage_latency),
+           "LOAD_TEST_LOCK_PORT": str(lock_simulator.port)}
+    # one worker: the in-memory database is not shared between processes
+    server = subprocess.Popen(["gunicorn", "-c", "python:server_launch", "--pythonpath", "benchmarks,tests",
+                               "--log-level", "warning", "load_test:app"], cwd=ROOT, env=env)
+    try:
+        _wait_until_up()
+
+        results = []
+        clients = [Client(lock, user, random.Random(seed * 100003 + i), results)
+                   for i, (lock, user) in enumerate(zip(fixtures['locks'], fixtures['users']))]
+        stop_at = time.time() + warmup + duration
+        threads = [threading.Thread(target=client.run, args=(mix, stop_at)) for client in clients]
+        for thread in threads:
+            thread.start()
+
+        time.sleep(warmup)
+        for client in clients:
+            client.recording = True
+
+        for thread in threads:
+            thread.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        lock_simulator.shutdown()
+        os.unlink(file.name)
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'config': {'mix': mix, 'concurrency': concurrency, 'duration': duration, 'warmup': warmup,
+                   'storage_latency': storage_latency, 'lock_latency': LOCK_MESSAGE_LATENCY, 'preset': preset,
+                   'workers': 1, 'seed': seed},
+        'routes': _summarize(results, duration),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the app with in-memory storage and simulated locks.")
+    parser.add_argument("--mix", choices=list(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads, each with its own lock and user")
+    parser.add_argument("--duration", type=float, default=20, help="seconds measured, after the warm-up")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of load before measuring")
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="seconds per database call")
+    parser.add_argument("--preset", default="gthread", help="server_launch preset")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = run_load_test(args.mix, args.concurrency, args.duration, args.warmup, args.storage_latency, args.preset,
+                           args.seed)
+
+    print(f"{args.mix} mix, {args.concurrency} clients, {args.duration:g} s, "
+          f"{args.storage_latency * 1000:g} ms per storage call, {args.preset}")
+    print(f"{'route':<34} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, result in report['routes'].items():
+        print(f"{route:<34} {result['requests']:9d} {result['errors']:7d} {result['rps']:8.1f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['p99_ms']:8.1f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
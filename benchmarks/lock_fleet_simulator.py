@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import resource
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lock_client_util import LOCK_PORT
+
+# Runs a fleet of simulated locks as asyncio TCP servers, to see how the server copes with thousands of locks without
+# the hardware. Each lock:
+#   - registers with /register-door-lock and reports in with /check-lock-registration-status, like the firmware,
+#     then keeps polling the status every --poll-interval seconds;
+#   - listens where the server will connect for remote sessions and answers each message (one read of up to 1024
+#     bytes) with "ACK <message>" after --latency, or injects a fault: no reply (--timeout-rate) or a closed
+#     connection (--disconnect-rate). --down-rate of the locks register but never listen.
+# The server connects to the IP it saw the lock register from, always on LOCK_PORT, so every lock gets its own
+# loopback address (127.1.0.1, 127.1.0.2, ...) sent as X-Forwarded-For. Linux routes all of 127.0.0.0/8 to the
+# loopback interface; elsewhere the addresses have to be added first.
+#
+# With --sessions, that many phones keep remote sessions open against random locks through /remote-connection, each
+# with --id-token formatted with its session number (the server keeps one lock socket per user and lock). Any server
+# works; load_test:app takes "token:<uid>" ID tokens and an in-memory database:
+#
+#   RATE_LIMIT_DISABLED=1 gunicorn -c python:server_launch --pythonpath benchmarks,tests load_test:app
+#   python benchmarks/lock_fleet_simulator.py --server http://127.0.0.1:8000 --locks 5000 --sessions 300
+#
+# The sessions all come from this host's address, hence RATE_LIMIT_DISABLED. Each lock and session holds sockets, so
+# the open file limit is raised to its hard limit; the server needs the same.
+
+BASE_IP = "127.1.0.1"
+REGISTRATION_CONCURRENCY = 64
+REPORT_INTERVAL = 5
+
+
+class FleetStats:
+
+    def __init__(self):
+        self.counters = Counter()
+        self.open_connections = 0
+        self.max_open_connections = 0
+        self.session_latencies = []
+
+    def connection_opened(self):
+        self.counters["connections"] += 1
+        self.open_connections += 1
+        self.max_open_connections = max(self.max_open_connections, self.open_connections)
+
+    def connection_closed(self):
+        self.open_connections -= 1
+
+    def summary(self):
+        latencies = sorted(self.session_latencies)
+        return {
+            **dict(sorted(self.counters.items())),
+            'open_connections': self.open_connections,
+            'max_open_connections': self.max_open_connections,
+            'session_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0,
+            'session_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else 0,
+        }
+
+
+class SimulatedLock:
+
+    def __init__(self, index, ip, certificate, stats, rng, latency=(0.005, 0.05), timeout_rate=0.0,
+                 disconnect_rate=0.0, down=False):
+        self.mac = "5A:" + ":".join(f"{byte:02X}" for byte in index.to_bytes(5, "big"))
+        self.ble = "5B" + self.mac[2:]
+        self.ip = ip
+        self.certificate = certificate
+        self.stats = stats
+        self.rng = rng
+        self.latency = latency
+        self.timeout_rate = timeout_rate
+        self.disconnect_rate = disconnect_rate
+        self.down = down
+
+        self._server = None
+        self._writers = set()
+
+    async def listen(self, port=LOCK_PORT):
+        if not self.down:
+            self._server = await asyncio.start_server(self._handle, self.ip, port)
+
+    def close(self):
+        if self._server:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        self.stats.connection_opened()
+        self._writers.add(writer)
+        try:
+            while True:
+                msg = await reader.read(1024)
+                if not msg:
+                    break
+                self.stats.counters["messages"] += 1
+
+                fault = self.rng.random()
+                if fault < self.disconnect_rate:
+                    self.stats.counters["injected_disconnects"] += 1
+                    break
+                if fault < self.disconnect_rate + self.timeout_rate:
+                    # the server gives up after LOCK_TIMEOUT and closes the connection
+                    self.stats.counters["injected_timeouts"] += 1
+                    continue
+
+                await asyncio.sleep(self.rng.uniform(*self.latency))
+                writer.write(b"ACK " + msg[:1000])
+                await writer.drain()
+                self.stats.counters["replies"] += 1
+        except ConnectionError:
+            self.stats.counters["connection_errors"] += 1
+        finally:
+            self.stats.connection_closed()
+            self._writers.discard(writer)
+            writer.close()
+
+    def _headers(self):
+        return {'X-Forwarded-For': self.ip}
+
+    async def register(self, client):
+        response = await client.post("/register-door-lock", headers=self._headers(),
+                                     json={'MAC': self.mac, 'BLE': self.ble, 'certificate': self.certificate})
+        if not response.json().get("success"):
+            return False
+        return await self.check_status(client)
+
+    async def check_status(self, client):
+        response = await client.get("/check-lock-registration-status", headers=self._headers(),
+                                    params={'MAC': self.mac})
+        return response.json().get("success") is True
+
+    async def poll(self, client, interval):
+        # spread over the interval so the fleet does not poll in lockstep
+        await asyncio.sleep(self.rng.uniform(0, interval))
+        while True:
+            try:
+                ok = await self.check_status(client)
+            except Exception:
+                ok = False
+            self.stats.counters["polls" if ok else "poll_errors"] += 1
+            await asyncio.sleep(interval)
+
+
+async def _run_session(client, locks, id_token, stats, rng, n_messages):
+    # one phone: a remote session of n_messages to a random lock, then the next one
+    while True:
+        lock = rng.choice(locks)
+        for i in range(n_messages):
+            start = time.perf_counter()
+            try:
+                response = (await client.post("/remote-connection", json={
+                    'id_token': id_token, 'lock_id': lock.mac, 'msg': f"msg {i}", 'close': i == n_messages - 1
+                })).json()
+            except Exception as e:
+                response = {'success': False, 'msg': type(e).__name__}
+            stats.session_latencies.append(time.perf_counter() - start)
+
+            if response.get("success"):
+                stats.counters["session_messages"] += 1
+            else:
+                stats.counters[f"session_error: {response.get('msg')}"] += 1
+                break
+
+
+async def _register_all(client, locks, stats):
+    semaphore = asyncio.Semaphore(REGISTRATION_CONCURRENCY)
+
+    async def register(lock):
+        async with semaphore:
+            try:
+                ok = await lock.register(client)
+            except Exception:
+                ok = False
+            stats.counters["registered" if ok else "registration_errors"] += 1
+
+    await asyncio.gather(*(register(lock) for lock in locks))
+
+
+def _raise_open_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+async def run_fleet(server, n_locks, duration, base_ip=BASE_IP, lock_port=LOCK_PORT, latency=(0.005, 0.05),
+                    timeout_rate=0.0, disconnect_rate=0.0, down_rate=0.0, poll_interval=30, sessions=0,
+                    session_messages=3, id_token="token:phone{session}", seed=0):
+    import httpx
+    from load_test import create_lock
+
+    rng = random.Random(seed)
+    stats = FleetStats()
+    # registration does not check the certificate, the fleet shares one
+    certificate = create_lock(0)['certificate']
+    first_ip = ipaddress.ip_address(base_ip)
+
+    locks = [SimulatedLock(i, str(first_ip + i), certificate, stats, random.Random(rng.random()), latency,
+                           timeout_rate, disconnect_rate, down=rng.random() < down_rate) for i in range(n_locks)]
+
+    start = time.monotonic()
+    await asyncio.gather(*(lock.listen(lock_port) for lock in locks))
+    print(f"{n_locks} locks listening in {time.monotonic() - start:.1f} s")
+
+    limits = httpx.Limits(max_connections=REGISTRATION_CONCURRENCY + sessions, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=server, limits=limits, timeout=30) as client:
+        start = time.monotonic()
+        await _register_all(client, locks, stats)
+        print(f"{stats.counters['registered']} locks registered in {time.monotonic() - start:.1f} s")
+
+        tasks = [asyncio.create_task(lock.poll(client, poll_interval)) for lock in locks] if poll_interval else []
+        tasks += [asyncio.create_task(_run_session(client, locks, id_token.format(session=i), stats,
+                                                   random.Random(rng.random()), session_messages))
+                  for i in range(sessions)]
+
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(REPORT_INTERVAL, deadline - time.monotonic()))
+            print(json.dumps(stats.summary()))
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    summary = stats.summary()
+    for lock in locks:
+        lock.close()
+    # let the connection handlers see the closed sockets
+    await asyncio.sleep(0.1)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated lock fleet for scale testing of remote sessions.")
+    parser.add_argument("--server", default="http://127.0.0.1:5000")
+    parser.add_argument("--locks", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--base-ip", default=BASE_IP, help="loopback address of the first lock")
+    parser.add_argument("--lock-port", type=int, default=LOCK_PORT, help="port the server connects to locks on")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.005, 0.05), metavar=("MIN", "MAX"),
+                        help="seconds before a lock replies")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of messages left unanswered")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="fraction of messages answered by closing")
+    parser.add_argument("--down-rate", type=float, default=0.0, help="fraction of locks that never listen")
+    parser.add_argument("--poll-interval", type=float, default=30, help="seconds between status polls, 0 to disable")
+    parser.add_argument("--sessions", type=int, default=0, help="phones keeping remote sessions open")
+    parser.add_argument("--session-messages", type=int, default=3)
+    parser.add_argument("--id-token", default="token:phone{session}",
+                        help="ID token the sessions are opened with, {session} is replaced by the session number")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the final counters to this JSON file")
+    args = parser.parse_args()
+
+    print(f"open file limit: {_raise_open_file_limit()}")
+
+    summary = asyncio.run(run_fleet(args.server, args.locks, args.duration, args.base_ip, args.lock_port,
+                                    tuple(args.latency), args.timeout_rate, args.disconnect_rate, args.down_rate,
+                                    args.poll_interval, args.sessions, args.session_messages, args.id_token,
+                                    args.seed))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+import rsa_util_tests
+from firebase_util import FirebaseUtil, generate_random_id
+from load_test import create_lock
+from memory_firebase_util import MemoryDb
+from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY, BACKEND_PYCRYPTODOME, get_rsa_key_from_x509_cert
+
+# pytest-benchmark suite for the primitives under the signed routes: RSA key loading, signatures and encryption with
+# both backends, certificate parsing, id generation, and FirebaseUtil (instrumentation included) on an in-memory
+# database. Needs benchmarks/requirements.txt. Once a baseline is saved, every run is compared with the latest one
+# and fails when a best time is more than 25% slower (see conftest.py):
+#
+#   python -m pytest benchmarks/primitives_benchmark_tests.py --benchmark-save=baseline
+#   python -m pytest benchmarks/primitives_benchmark_tests.py
+#
+# Baselines are kept per machine and Python version in benchmarks/.baselines; record one on the machine that runs the
+# comparison, and again after an intended change.
+
+MESSAGE = '{"smart_lock_MAC": "AA:00:AA:00:AA:00", "phone_id": "abcdefghijklmno"}'
+
+PRIVATE_KEY = rsa_util_tests.TestRSAUtilMethods.RSA_PRIV_KEY_STR
+PUBLIC_KEY = RSA_Util(key_str=PRIVATE_KEY).get_public_key().exportKey()
+
+BACKENDS = [BACKEND_CRYPTOGRAPHY, BACKEND_PYCRYPTODOME]
+
+N_INVITES = 1000
+
+
+@pytest.fixture(scope="module")
+def certificate():
+    body = create_lock(0)['certificate']
+    return f"-----BEGIN CERTIFICATE-----{body}-----END CERTIFICATE-----"
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def fb_util():
+    invites = {f"invite{i:04d}": {'type': 1, 'smart_lock_MAC': "AA:00:AA:00:AA:00", 'expiration': i}
+               for i in range(N_INVITES)}
+    return FirebaseUtil(db=MemoryDb({
+        'doors': {'AA:00:AA:00:AA:00': {'MAC': "AA:00:AA:00:AA:00", 'BLE': "BB:00:BB:00:BB:00"}},
+        'invites': invites,
+    }))
+
+
+def test_rsa_util_init_public_key(benchmark, backend):
+    benchmark(RSA_Util, key_str=PUBLIC_KEY, backend=backend)
+
+
+def test_rsa_util_init_private_key(benchmark, backend):
+    benchmark(RSA_Util, key_str=PRIVATE_KEY, backend=backend)
+
+
+def test_is_signature_valid(benchmark, backend):
+    signature_b64 = RSA_Util(key_str=PRIVATE_KEY, backend=backend).sign(MESSAGE)
+    rsa_public = RSA_Util(key_str=PUBLIC_KEY, backend=backend)
+
+    assert benchmark(rsa_public.is_signature_valid, MESSAGE, signature_b64)
+
+
+def test_encrypt_msg(benchmark, backend):
+    benchmark(RSA_Util(key_str=PUBLIC_KEY, backend=backend).encrypt_msg, MESSAGE)
+
+
+def test_decrypt_msg(benchmark, backend):
+    encrypted_b64 = RSA_Util(key_str=PUBLIC_KEY, backend=backend).encrypt_msg(MESSAGE)
+
+    assert benchmark(RSA_Util(key_str=PRIVATE_KEY, backend=backend).decrypt_msg, encrypted_b64) == MESSAGE.encode()
+
+
+def test_get_rsa_key_from_x509_cert(benchmark, certificate):
+    assert benchmark(get_rsa_key_from_x509_cert, certificate).startswith(b"-----BEGIN PUBLIC KEY-----")
+
+
+def test_generate_random_id(benchmark):
+    assert len(benchmark(generate_random_id, 32)) == 32
+
+
+def test_firebase_get_data(benchmark, fb_util):
+    assert benchmark(fb_util.get_data, "doors/AA:00:AA:00:AA:00")['BLE'] == "BB:00:BB:00:BB:00"
+
+
+def test_firebase_set_data(benchmark, fb_util):
+    assert benchmark(fb_util.set_data, "doors/AA:00:AA:00:AA:00", {'IP': "127.0.0.1"})
+
+
+def test_firebase_set_multiple_data(benchmark, fb_util):
+    updates = {f"invites/invite{i:04d}/expiration": i + 1 for i in range(100)}
+
+    assert benchmark(fb_util.set_multiple_data, updates)
+
+
+def test_firebase_claim_data(benchmark, fb_util):
+    invite_ids = iter(f"invite{i:04d}" for i in range(N_INVITES))
+
+    # one claim per round, every round claims a different invite
+    result = benchmark.pedantic(lambda: fb_util.claim_data(f"invites/{next(invite_ids)}"), rounds=N_INVITES // 2)
+    assert result['type'] == 1
+
+
+def test_firebase_get_data_where_child_between(benchmark, fb_util):
+    assert len(benchmark(fb_util.get_data_where_child_between, "invites", "expiration", 0, 500, 100)) == 100
@@ -0,0 +1,50 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY, BACKEND_PYCRYPTODOME
+from rsa_util_tests import TestRSAUtilMethods
+
+NUMBER = 200
+REPEAT = 5
+
+MESSAGE = '{"smart_lock_MAC": "AA:00:AA:00:AA:00", "phone_id": "abcdefghijklmno"}'
+
+
+def _best_of(stmt):
+    return min(timeit.repeat(stmt, number=NUMBER, repeat=REPEAT)) / NUMBER
+
+
+def bench_backend(backend):
+    private_key = TestRSAUtilMethods.RSA_PRIV_KEY_STR
+    public_key = RSA_Util(key_str=private_key).get_public_key().exportKey()
+
+    rsa_private = RSA_Util(key_str=private_key, backend=backend)
+    rsa_public = RSA_Util(key_str=public_key, backend=backend)
+    signature_b64 = rsa_private.sign(MESSAGE)
+    encrypted_b64 = rsa_public.encrypt_msg(MESSAGE)
+
+    return {
+        "init(key_str=public)": _best_of(lambda: RSA_Util(key_str=public_key, backend=backend)),
+        "is_signature_valid": _best_of(lambda: rsa_public.is_signature_valid(MESSAGE, signature_b64)),
+        "encrypt_msg": _best_of(lambda: rsa_public.encrypt_msg(MESSAGE)),
+        "decrypt_msg": _best_of(lambda: rsa_private.decrypt_msg(encrypted_b64)),
+        "sign": _best_of(lambda: rsa_private.sign(MESSAGE)),
+    }
+
+
+def main():
+    baseline = bench_backend(BACKEND_PYCRYPTODOME)
+    results = bench_backend(BACKEND_CRYPTOGRAPHY)
+
+    print(f"RSA-2048, best of {REPEAT} runs of {NUMBER}")
+    print(f"{'operation':<22} {BACKEND_PYCRYPTODOME:>14} {BACKEND_CRYPTOGRAPHY:>14}  speedup")
+    for name, seconds in results.items():
+        print(f"{name:<22} {baseline[name] * 1e6:11.1f} us {seconds * 1e6:11.1f} us  {baseline[name] / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
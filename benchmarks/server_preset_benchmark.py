@@ -0,0 +1,140 @@
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# Throughput of app:app under each server_launch preset. Firebase is replaced by a store that waits STORAGE_LATENCY
+# per call, so the numbers show how many requests a preset keeps in flight while they wait on the database.
+#
+#   python benchmarks/server_preset_benchmark.py [preset ...]
+#
+# Client threads run on the same machine as the server; compare presets within one run, not across machines.
+#
+# One run on a 1 CPU Linux VM (2 workers, 64 clients, 10 s, 20 ms per storage call, 3 storage calls per request):
+#
+#   preset       requests/s     p50 ms     p99 ms   errors
+#   sync               38.3     1997.4     2004.3        0
+#   gthread           260.5      249.1      274.0        0
+#   gevent            897.4       69.8      100.6        0
+#
+# sync is bound by workers / (3 x 20 ms); gthread by its 2 x 16 threads sharing one CPU.
+
+PORT = 5055
+STORAGE_LATENCY = 0.02
+CONCURRENCY = 64
+DURATION = 10
+WORKERS = 2
+
+PATH = "/check-lock-registration-status?MAC=AA:00:AA:00:AA:00"
+
+
+class LatencyStorage:
+    # stands in for FirebaseUtil: every call takes one database round trip and finds a registered lock
+
+    def get_data(self, path):
+        time.sleep(STORAGE_LATENCY)
+        return {"MAC": "AA:00:AA:00:AA:00"}
+
+    def set_data(self, path, data):
+        time.sleep(STORAGE_LATENCY)
+        return True
+
+    def get_data_where_child_between(self, path, child, start, end, limit):
+        # the invite sweeper of one worker; there is nothing to sweep
+        time.sleep(STORAGE_LATENCY)
+        return {}
+
+
+def _create_app():
+    import app as app_module
+    app_module.create_fb_util(LatencyStorage())
+    return app_module.app
+
+
+if __name__ != "__main__":
+    # imported by gunicorn as server_preset_benchmark:app
+    app = _create_app()
+
+
+def _wait_until_up(timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=1)
+            connection.request("GET", "/get-all-icons")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def _client(stop_at, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+    while time.time() < stop_at:
+        start = time.perf_counter()
+        try:
+            connection.request("GET", PATH)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", PORT, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def bench_preset(preset):
+    env = {**os.environ, "SERVER_PRESET": preset, "PORT": str(PORT), "WEB_CONCURRENCY": str(WORKERS)}
+    server = subprocess.Popen(["gunicorn", "-c", "python:server_launch", "--pythonpath", "benchmarks",
+                               "--log-level", "warning", "server_preset_benchmark:app"],
+                              cwd=ROOT, env=env)
+    try:
+        _wait_until_up()
+
+        latencies, errors = [], []
+        stop_at = time.time() + DURATION
+        clients = [threading.Thread(target=_client, args=(stop_at, latencies, errors)) for _ in range(CONCURRENCY)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    latencies.sort()
+    return {
+        "requests/s": len(latencies) / DURATION,
+        "p50 ms": latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def main():
+    from server_launch import PRESETS
+
+    presets = sys.argv[1:] or list(PRESETS)
+
+    print(f"{WORKERS} workers, {CONCURRENCY} clients, {DURATION} s, {STORAGE_LATENCY * 1000:.0f} ms per storage call")
+    print(f"{'preset':<10} {'requests/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for preset in presets:
+        result = bench_preset(preset)
+        print(f"{preset:<10} {result['requests/s']:12.1f} {result['p50 ms']:10.1f} {result['p99 ms']:10.1f} "
+              f"{result['errors']:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,203 @@
 import json
 import os
-
-import firebase_admin
-from firebase_admin import credentials, auth, db
-from firebase_admin.auth import InvalidIdTokenError, InvalidSessionCookieError
-from firebase_admin.exceptions import FirebaseError
-import random
+import threading
 import string
+from functools import wraps
+
+from health_util import latency_tracker
+from logging_util import set_log_uid
+from metrics_util import dependency_timer, DEPENDENCY_CALLS_COALESCED
+from single_flight import SingleFlight
+from tracing_util import start_span, set_attributes
+from id_util import generate_id
 
 characters = string.ascii_letters + string.digits
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CREDENTIALS_FILE = os.path.join(BASE_DIR, "firebase_credentials.json")
+DATABASE_URL = 'https://smartdoorlock-16418-default-rtdb.europe-west1.firebasedatabase.app'
+
+# firebase_admin is imported and initialised on first use, not when this module is imported
+_firebase_app = None
+_firebase_app_lock = threading.Lock()
+
+
+def get_firebase_app():
+    global _firebase_app
+    if _firebase_app is None:
+        import firebase_admin
+        from firebase_admin import credentials
+
+        with _firebase_app_lock:
+            if _firebase_app is None:
+                try:
+                    _firebase_app = firebase_admin.get_app()
+                except ValueError:
+                    _firebase_app = firebase_admin.initialize_app(credentials.Certificate(CREDENTIALS_FILE), {
+                        'databaseURL': DATABASE_URL
+                    })
+    return _firebase_app
+
+
+def _instrumented(func):
+    # metrics and a trace span, with the RTDB path, for each FirebaseUtil call
+    operation = func.__name__
+
+    @wraps(func)
+    def wrapper(self, path, *args, **kwargs):
+        attributes = {'rtdb.path': path} if isinstance(path, str) else {}
+        with dependency_timer("firebase", operation), start_span(f"firebase.{operation}", **attributes):
+            return func(self, path, *args, **kwargs)
+
+    return wrapper
+
+
+def _coalesced(func):
+    # identical reads in flight at the same time make a single database call and share its result
+    operation = func.__name__
+
+    @wraps(func)
+    def wrapper(self, *args):
+        if self.reads is None:
+            return func(self, *args)
+
+        result, shared = self.reads.do((operation, *args), func, self, *args)
+        if shared:
+            DEPENDENCY_CALLS_COALESCED.labels("firebase", operation).inc()
+            set_attributes(**{'rtdb.coalesced': True})
+        return result
+
+    return wrapper
+
+
+def _mirrored(func):
+    # reads of the trees a mirror holds are answered from it while it is in sync, without a database call
+    operation = func.__name__
+
+    @wraps(func)
+    def wrapper(self, *args):
+        if self.mirror is not None:
+            found, result = getattr(self.mirror, operation)(*args)
+            if found:
+                return result
+        return func(self, *args)
+
+    return wrapper
+
+
+def _invalidates_reads(func):
+    # reads started after a write returns do not join reads that may have started before it
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if self.reads is not None:
+                self.reads.forget()
+
+    return wrapper
+
 
 class FirebaseUtil:
 
-    def __init__(self):
-        _cred = credentials.Certificate("firebase_credentials.json")
-        firebase_admin.initialize_app(_cred, {
-            'databaseURL': 'https://smartdoorlock-16418-default-rtdb.europe-west1.firebasedatabase.app'
-        })
+    def __init__(self, db=None, coalesce_reads=True, mirror_trees=()):
+        # db is firebase_admin.db, or an object with the same reference() (e.g. memory_firebase_util.MemoryDb).
+        # mirror_trees are kept in an in-process mirror (see rtdb_mirror).
+        if db is None:
+            from firebase_admin import db
+
+            get_firebase_app()
 
         self.db = db
+        self.reads = SingleFlight() if coalesce_reads else None
+        self.mirror = None
+
+        if mirror_trees:
+            from rtdb_mirror import start_mirror
 
+            self.mirror = start_mirror(db, mirror_trees)
+
+    @_mirrored
+    @_instrumented
+    @_coalesced
     def get_data(self, path):
         ref = self.db.reference(path)
         return ref.get()
 
+    @_instrumented
+    @_invalidates_reads
     def set_data(self, path, data):
         ref = self.db.reference(path)
         ref.update(data)
+        if self.mirror is not None:
+            self.mirror.apply_update(path, data)
+        return True
+
+    @_instrumented
+    @_invalidates_reads
+    def set_multiple_data(self, data_by_path):
+        ref = self.db.reference()
+        ref.update(data_by_path)
+        if self.mirror is not None:
+            self.mirror.apply_update("", data_by_path)
         return True
 
+    @_instrumented
+    @_invalidates_reads
     def delete_key(self, path):
         ref = self.db.reference(path)
         ref.delete()
+        if self.mirror is not None:
+            self.mirror.apply_set(path, None)
         return True
 
+    @_instrumented
+    @_invalidates_reads
+    def claim_data(self, path):
+        ref = self.db.reference(path)
+        data = _claim_ref(ref)
+        if self.mirror is not None:
+            self.mirror.apply_set(path, None)
+        return data
+
+    @_instrumented
+    @_invalidates_reads
+    def delete_data_if(self, path, condition):
+        ref = self.db.reference(path)
+        data = _delete_ref_if(ref, condition)
+        if data is not None and self.mirror is not None:
+            self.mirror.apply_set(path, None)
+        return data
+
+    @_instrumented
+    @_invalidates_reads
     def add_data_to_path(self, path, data):
-        ref = self.db.reference(f"{path}/{generate_random_id(8)}")
+        path = f"{path}/{generate_random_id(8)}"
+        ref = self.db.reference(path)
         ref.update(data)
+        if self.mirror is not None:
+            self.mirror.apply_update(path, data)
         return True
 
+    @_mirrored
+    @_instrumented
+    @_coalesced
     def get_data_where_child_equal_to(self, path, child, value):
         ref = self.db.reference(path)
         return ref.order_by_child(child).equal_to(value).limit_to_first(1).get()
 
+    @_instrumented
+    @_coalesced
+    def get_data_where_child_between(self, path, child, start, end, limit):
+        # start None has no lower bound: children without `child` (ordered first, as null) are included
+        query = self.db.reference(path).order_by_child(child)
+        if start is not None:
+            query = query.start_at(start)
+        return query.end_at(end).limit_to_first(limit).get()
+
+    @_instrumented
+    @_invalidates_reads
     def set_random_username(self, user_id):
         ref = self.db.reference(f"users/{user_id}")
         username = generate_random_id(15)
@@ -53,19 +207,82 @@ class FirebaseUtil:
         return username
 
 
+class LazyFirebaseUtil:
+    # Stands in for a FirebaseUtil and creates it on first attribute access, so importing and forking the app does not
+    # connect to Firebase.
+
+    def __init__(self, factory=FirebaseUtil):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return getattr(self._instance, name)
+
+
+def _claim_ref(ref, max_retries=25):
+    # Atomically read and delete the value at ref (ETag-conditional delete). Returns the value removed by this
+    # caller, or None if it was already gone, so exactly one of several concurrent callers gets the data.
+    return _delete_ref_if(ref, lambda data: True, max_retries)
+
+
+def _delete_ref_if(ref, condition, max_retries=25):
+    # Deletes the value at ref only while condition(value) holds, retrying when it changes in between (ETag-conditional
+    # delete). Returns the value removed, or None if it was gone or no longer met the condition.
+    # set_if_unchanged() does not take None; an empty object is not stored either, so writing {} deletes the node.
+    data, etag = ref.get(etag=True)
+    for _ in range(max_retries):
+        if data is None or not condition(data):
+            return None
+        success, current, etag = ref.set_if_unchanged(etag, {})
+        if success:
+            return data
+        data = current
+
+    from firebase_admin import db
+    raise db.TransactionAbortedError('Conditional delete aborted after failed retries.')
+
+
 def generate_random_id(n):
-    return ''.join(random.choice(characters) for _ in range(n))
+    return generate_id(n, characters)
+
+
+# Replaces firebase_admin.auth.verify_id_token when set, e.g. by the load test, which has no Firebase project
+_id_token_verifier = None
+
+
+def set_id_token_verifier(verifier):
+    global _id_token_verifier
+    _id_token_verifier = verifier
 
 
 def get_decoded_claims_id_token(id_token, **kwargs):
+    verify_id_token = _id_token_verifier
+
+    if verify_id_token is None:
+        from firebase_admin import auth
+
+        get_firebase_app()
+        verify_id_token = auth.verify_id_token
+
     try:
-        return auth.verify_id_token(id_token, **kwargs)
+        with latency_tracker.timed("token_verification"), dependency_timer("firebase_auth", "verify_id_token"), \
+                start_span("firebase.verify_id_token"):
+            claims = verify_id_token(id_token, **kwargs)
     except:
         return None
 
+    set_log_uid(claims.get('uid'))
+    return claims
+
 
 def check_if_admin(id_token):
-    return not not get_decoded_claims_id_token(id_token).get("admin")
+    claims = get_decoded_claims_id_token(id_token)
+    return not not claims and not not claims.get("admin")
 
 
 def check_if_user(id_token):
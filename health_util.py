@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LATENCY_WINDOW = 256
+
+
+class LatencyTracker:
+    # Keeps the last `window` durations (seconds) recorded under each name, for the readiness report.
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self):
+        with self._lock:
+            samples_by_name = {name: sorted(samples) for name, samples in self._samples.items()}
+
+        return {name: {
+            'count': len(samples),
+            'p50_ms': round(samples[len(samples) // 2] * 1000, 2),
+            'p99_ms': round(samples[int(len(samples) * 0.99)] * 1000, 2),
+            'max_ms': round(samples[-1] * 1000, 2),
+        } for name, samples in samples_by_name.items() if samples}
+
+
+latency_tracker = LatencyTracker()
+
+
+class CachedProbe:
+    # Runs probe() at most once per `interval` seconds. Callers in between, and callers that arrive while a probe is
+    # running, get the last result instead of waiting, so readiness checks never pile up on a slow dependency.
+
+    def __init__(self, name, probe, interval=10, max_latency=2):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self.max_latency = max_latency
+
+        self._result = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def check(self, now=None):
+        now = time.time() if now is None else now
+
+        if (self._checked_at is None or now - self._checked_at >= self.interval) and self._lock.acquire(False):
+            try:
+                self._result = self._run()
+                self._checked_at = now
+            finally:
+                self._lock.release()
+
+        return self._result or {'ok': False, 'error': 'Not checked yet'}
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.probe()
+        except Exception as e:
+            return {'ok': False, 'error': type(e).__name__, 'latency_ms': None}
+
+        latency = time.perf_counter() - start
+        latency_tracker.record(self.name, latency)
+
+        result = {'ok': True, 'latency_ms': round(latency * 1000, 2)}
+        if latency > self.max_latency:
+            result.update(ok=False, error='Too slow')
+        return result
@@ -0,0 +1,77 @@
+import os
+import string
+import threading
+from collections import deque
+
+DEFAULT_ALPHABET = string.ascii_letters + string.digits
+URL_SAFE_ALPHABET = string.ascii_letters + string.digits + "-_"
+
+_tables = {}
+
+
+def _get_table(alphabet):
+    # Maps every random byte to an alphabet character in one bytes.translate call. Bytes past the largest multiple
+    # of len(alphabet) are deleted instead of wrapped, which keeps every character equally likely.
+    table = _tables.get(alphabet)
+    if table is None:
+        if not 1 < len(alphabet) <= 256 or len(set(alphabet)) != len(alphabet):
+            raise ValueError("alphabet must have between 2 and 256 unique characters")
+
+        limit = 256 - 256 % len(alphabet)
+        encoded = alphabet.encode("latin-1")
+        table = (bytes(encoded[i % len(alphabet)] for i in range(256)), bytes(range(limit, 256)))
+        _tables[alphabet] = table
+    return table
+
+
+def _random_chars(n, alphabet):
+    translation, rejected = _get_table(alphabet)
+    chars = b""
+    while len(chars) < n:
+        # over-ask a little so the rejected bytes rarely need a second read
+        chars += os.urandom(n + n // 4 + 8).translate(translation, rejected)
+    return chars[:n]
+
+
+def generate_id(n, alphabet=DEFAULT_ALPHABET):
+    if n <= 0:
+        return ""
+    return _random_chars(n, alphabet).decode("latin-1")
+
+
+def generate_ids(count, n, alphabet=DEFAULT_ALPHABET):
+    if count <= 0:
+        return []
+    if n <= 0:
+        return [""] * count
+
+    chars = _random_chars(count * n, alphabet).decode("latin-1")
+    return [chars[i:i + n] for i in range(0, count * n, n)]
+
+
+class IdPool:
+
+    def __init__(self, n, size=256, alphabet=DEFAULT_ALPHABET):
+        self.n = n
+        self.size = size
+        self.alphabet = alphabet
+        self._ids = deque()
+        self._refill_lock = threading.Lock()
+
+    def get(self):
+        while True:
+            try:
+                return self._ids.popleft()
+            except IndexError:
+                self.refill()
+
+    def get_many(self, count):
+        if count > len(self._ids):
+            return generate_ids(count, self.n, self.alphabet)
+        return [self.get() for _ in range(count)]
+
+    def refill(self):
+        with self._refill_lock:
+            missing = self.size - len(self._ids)
+            if missing > 0:
+                self._ids.extend(generate_ids(missing, self.n, self.alphabet))
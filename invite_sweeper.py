@@ -0,0 +1,218 @@
+import fcntl
+import os
+import threading
+import time
+
+from authorization_util import compile_authorization, is_expired, ONE_DAY_IN_SEC
+from logging_util import log_event
+from request_validation_util import is_valid_key
+
+INVITE_DEFAULT_TTL = 7 * 24 * 60 * 60  # 7 days
+
+# The lock's time zone is not known here, so authorizations are removed a day after they expire in UTC: a one-day or
+# weekday authorization is never removed while it can still be valid where the lock is.
+AUTHORIZATION_EXPIRY_GRACE = ONE_DAY_IN_SEC
+
+# set once sweep_saved_invites() has run
+SAVED_INVITES_SWEPT = "sweeper/saved_invites_swept"
+
+
+def get_invite_removal_updates(fb_util, invite_id):
+    # Multi-path update that removes an invite together with every users/*/locks/*/saved_invite pointing at it.
+    # invite_saves/{invite_id} is the reverse index written by /save-user-invite, so no user scan is needed.
+    return invite_removal_updates(invite_id, fb_util.get_data(f"invite_saves/{invite_id}"))
+
+
+def invite_removal_updates(invite_id, saves):
+    updates = {
+        f"invites/{invite_id}": None,
+        f"invite_saves/{invite_id}": None
+    }
+
+    for user_id, lock_id in (saves or {}).items():
+        updates[f"users/{user_id}/locks/{lock_id}/saved_invite"] = None
+
+    return updates
+
+
+def is_removable_authorization(authorization, now, grace=AUTHORIZATION_EXPIRY_GRACE):
+    # expired for longer than grace
+    return is_expired(compile_authorization(authorization), now - grace)
+
+
+def get_expired_authorization_paths(authorizations, now, grace=AUTHORIZATION_EXPIRY_GRACE):
+    # The paths of the authorizations (the authorizations tree) expired for longer than grace
+    paths = []
+
+    for mac, phone_authorizations in (authorizations or {}).items():
+        if not isinstance(phone_authorizations, dict):
+            continue
+        for phone_id, authorization in phone_authorizations.items():
+            if is_removable_authorization(authorization, now, grace):
+                paths.append(f"authorizations/{mac}/{phone_id}")
+
+    return paths
+
+
+class InviteSweeper:
+    # Removes expired invites every interval and expired authorizations every authorization_interval; the latter
+    # reads the whole authorizations tree. With lock_file, of all the processes of the host started with the same file
+    # only the one holding its lock sweeps; the others try to take it every interval, so a new process takes over
+    # when the sweeping one exits. The first leader also runs sweep_saved_invites() if it has never run.
+
+    def __init__(self, fb_util, interval=5 * 60, batch_size=100, authorization_interval=60 * 60, lock_file=None):
+        self.fb_util = fb_util
+        self.interval = interval
+        self.batch_size = batch_size
+        self.authorization_interval = authorization_interval
+        self.lock_file = lock_file
+        self.last_report = None
+        self.last_authorization_sweep = 0
+        self.saved_invites_swept = False
+
+        self._lock_fd = None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def sweep(self, now=None):
+        now = int(now if now is not None else time.time())
+        report = {'timestamp': now, 'invites': [], 'saved_invites': 0, 'backfilled': []}
+
+        while True:
+            # needs ".indexOn": ["expiration"] on invites in the database rules. There is no lower bound, so invites
+            # without an expiration (created before invites expired) come first; they get INVITE_DEFAULT_TTL from now.
+            expired = self.fb_util.get_data_where_child_between("invites", "expiration", None, now, self.batch_size)
+
+            if not expired:
+                break
+
+            # invite_saves only holds the saves of live invites, it is read once per batch rather than per invite
+            saves = self.fb_util.get_data("invite_saves") or {}
+
+            updates = {}
+            for invite_id, invite in expired.items():
+                if isinstance(invite, dict) and not isinstance(invite.get("expiration"), (int, float)):
+                    updates[f"invites/{invite_id}/expiration"] = now + INVITE_DEFAULT_TTL
+                    report['backfilled'].append(invite_id)
+                    continue
+
+                invite_updates = invite_removal_updates(invite_id, saves.get(invite_id))
+                report['saved_invites'] += len(invite_updates) - 2
+                report['invites'].append(invite_id)
+                updates.update(invite_updates)
+
+            self.fb_util.set_multiple_data(updates)
+
+            if len(expired) < self.batch_size:
+                break
+
+        self.last_report = report
+        return report
+
+    def sweep_authorizations(self, now=None):
+        now = int(now if now is not None else time.time())
+        self.last_authorization_sweep = now
+
+        removed = []
+        for path in get_expired_authorization_paths(self.fb_util.get_data("authorizations"), now):
+            # conditional delete: an authorization redeemed again since the tree was read is kept
+            if self.fb_util.delete_data_if(path, lambda authorization: isinstance(authorization, dict)
+                                           and is_removable_authorization(authorization, now)) is not None:
+                removed.append(path.split("/", 1)[1])
+
+        return removed
+
+    def sweep_saved_invites(self):
+        # One-off: users/*/locks/*/saved_invite pointers written before the invite_saves index are added to it, so the
+        # removal of their invite clears them, and those whose invite is already gone are removed. Reads the whole
+        # users tree; it runs once, SAVED_INVITES_SWEPT marks it done.
+        report = {'indexed': 0, 'removed': 0}
+        saves = self.fb_util.get_data("invite_saves") or {}
+
+        for user_id, user in (self.fb_util.get_data("users") or {}).items():
+            locks = user.get("locks") if isinstance(user, dict) else None
+            for lock_id, lock in (locks if isinstance(locks, dict) else {}).items():
+                invite_id = lock.get("saved_invite") if isinstance(lock, dict) else None
+                if invite_id is None or (saves.get(invite_id) or {}).get(user_id) == lock_id:
+                    continue
+
+                path = f"users/{user_id}/locks/{lock_id}/saved_invite"
+                if is_valid_key(invite_id):
+                    # indexed before the invite is checked: a removal from now on clears the pointer itself
+                    self.fb_util.set_multiple_data({f"invite_saves/{invite_id}/{user_id}": lock_id})
+                    if self.fb_util.get_data(f"invites/{invite_id}") is not None:
+                        report['indexed'] += 1
+                        continue
+                    self.fb_util.delete_key(f"invite_saves/{invite_id}/{user_id}")
+
+                # a pointer saved again since the tree was read is kept
+                if self.fb_util.delete_data_if(path, lambda saved_invite: saved_invite == invite_id) is not None:
+                    report['removed'] += 1
+
+        self.fb_util.set_multiple_data({SAVED_INVITES_SWEPT: int(time.time())})
+        return report
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="invite-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def is_leader(self):
+        if not self.lock_file or self._lock_fd is not None:
+            return True
+
+        # the lock is released when the process exits, however it exits
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        self._lock_fd = fd
+        return True
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self.is_leader():
+                self._stop_event.wait(self.interval)
+                continue
+
+            if not self.saved_invites_swept:
+                try:
+                    if self.fb_util.get_data(SAVED_INVITES_SWEPT) is None:
+                        log_event("invite_sweeper", "saved_invites_swept", **self.sweep_saved_invites())
+                    self.saved_invites_swept = True
+                except Exception as e:
+                    log_event("invite_sweeper", "saved_invite_sweep_failed", error=e)
+
+            try:
+                report = self.sweep()
+                if report['invites']:
+                    log_event("invite_sweeper", "invites_removed", invites=len(report['invites']),
+                              saved_invites=report['saved_invites'])
+            except Exception as e:
+                log_event("invite_sweeper", "sweep_failed", error=e)
+
+            if time.time() - self.last_authorization_sweep >= self.authorization_interval:
+                try:
+                    removed = self.sweep_authorizations()
+                    if removed:
+                        log_event("invite_sweeper", "authorizations_removed", authorizations=len(removed))
+                except Exception as e:
+                    log_event("invite_sweeper", "authorization_sweep_failed", error=e)
+
+            self._stop_event.wait(self.interval)
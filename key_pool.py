@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from id_util import generate_id
+
+
+def generate_key_pem(bits=2048):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
+    return key.private_bytes(encoding=serialization.Encoding.PEM,
+                             format=serialization.PrivateFormat.TraditionalOpenSSL,
+                             encryption_algorithm=serialization.NoEncryption())
+
+
+class KeyPairPool:
+    # Keeps up to `size` RSA private keys (PEM) ready, generated in a background process so callers of get_pem() do
+    # not pay for key generation. With cache_dir, keys found there are used first and generated keys are saved there
+    # until it holds `size` keys, so test fixtures reuse the same keys across runs. Usable as RSA_Util's key_provider.
+
+    def __init__(self, size=4, bits=2048, cache_dir=None, max_workers=1):
+        self.size = size
+        self.bits = bits
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+
+        self._keys = deque()
+        self._pending = set()
+        self._executor = None
+        self._lock = threading.RLock()
+
+        if cache_dir:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            for filename in self._cached_files():
+                with open(os.path.join(cache_dir, filename), "rb") as file:
+                    self._keys.append(file.read())
+
+    def start(self):
+        with self._lock:
+            self._refill()
+        return self
+
+    def get_pem(self):
+        while True:
+            with self._lock:
+                if self._keys:
+                    pem = self._keys.popleft()
+                    self._refill()
+                    return pem
+
+                self._refill()
+                pending = set(self._pending)
+
+            if not pending:
+                return self._store(generate_key_pem(self.bits))
+
+            wait(pending, return_when=FIRST_COMPLETED)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._pending.clear()
+
+        # outside the lock: shutdown waits for done callbacks that take it
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _refill(self):
+        missing = self.size - len(self._keys) - len(self._pending)
+        if missing <= 0:
+            return
+
+        if not self._executor:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        for _ in range(missing):
+            future = self._executor.submit(generate_key_pem, self.bits)
+            self._pending.add(future)
+            future.add_done_callback(self._on_generated)
+
+    def _on_generated(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            if future.cancelled() or future.exception():
+                return
+            self._keys.append(self._store(future.result()))
+
+    def _store(self, pem):
+        if self.cache_dir and len(self._cached_files()) < self.size:
+            # private keys, readable by the owner only
+            fd = os.open(os.path.join(self.cache_dir, f"{generate_id(16)}.{self.bits}.pem"),
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as file:
+                file.write(pem)
+        return pem
+
+    def _cached_files(self):
+        return sorted(filename for filename in os.listdir(self.cache_dir) if filename.endswith(f".{self.bits}.pem"))
@@ -1,4 +1,21 @@
+import asyncio
+import os
 import socket
+import threading
+import time
+from collections import OrderedDict
+
+from health_util import latency_tracker
+from metrics_util import dependency_timer
+from tracing_util import start_span
+
+LOCK_PORT = 3333
+LOCK_TIMEOUT = 3
+
+# Open lock sockets per worker. Phones do not always end a session with close=true, so a client unused for
+# REMOTE_CONNECTION_IDLE_TIMEOUT seconds is closed, and at the cap the least recently used idle one makes room.
+MAX_REMOTE_CONNECTIONS = 256
+REMOTE_CONNECTION_IDLE_TIMEOUT = float(os.environ.get("REMOTE_CONNECTION_IDLE_TIMEOUT", 120))
 
 
 class LockClient:
@@ -6,22 +23,216 @@ class LockClient:
     def __init__(self, ip):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.ip = ip
+        self.connected = False
 
-        self._open_sock()
+        # one message in flight per connection, replies are not tagged
+        self._lock = threading.Lock()
 
     def _open_sock(self):
-        self.sock.connect((self.ip, 3333))
-        self.sock.settimeout(3)
+        self.sock.settimeout(LOCK_TIMEOUT)
+        with dependency_timer("lock", "connect"), start_span("lock.connect", **{'lock.ip': self.ip}):
+            self.sock.connect((self.ip, LOCK_PORT))
+        self.connected = True
 
     def send_msg_to_lock(self, msg):
-        try:
-            self.sock.send(msg.encode())
+        # the first message opens the socket, so a client can be created and shared before anything blocks on it
+        with self._lock:
+            try:
+                if not self.connected:
+                    self._open_sock()
 
-            res = self.sock.recv(1024)
-        except TimeoutError as toe:
-            return None
+                with dependency_timer("lock", "send"), start_span("lock.send", **{'lock.ip': self.ip}):
+                    self.sock.send(msg.encode())
+
+                with dependency_timer("lock", "recv"), start_span("lock.recv", **{'lock.ip': self.ip}):
+                    res = self.sock.recv(1024)
+            except OSError:
+                # timeouts, refused connections and sockets closed by another request
+                return None
 
         return res
 
     def close_sock(self):
         self.sock.close()
+
+
+class AsyncLockClient:
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.reader = None
+        self.writer = None
+        self.connected = False
+        self.closed = False
+
+        # one message in flight per connection, replies are not tagged
+        self._lock = asyncio.Lock()
+
+    async def _open_sock(self):
+        with dependency_timer("lock", "connect"), start_span("lock.connect", **{'lock.ip': self.ip}):
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.ip, LOCK_PORT),
+                                                              LOCK_TIMEOUT)
+        self.connected = True
+
+    async def send_msg_to_lock(self, msg):
+        # connects on the first message, like LockClient
+        async with self._lock:
+            try:
+                if self.closed:
+                    return None
+
+                if not self.connected:
+                    await self._open_sock()
+
+                    # closed by another request while connecting
+                    if self.closed:
+                        self.writer.close()
+                        return None
+
+                with dependency_timer("lock", "send"), start_span("lock.send", **{'lock.ip': self.ip}):
+                    self.writer.write(msg.encode())
+                    await self.writer.drain()
+
+                with dependency_timer("lock", "recv"), start_span("lock.recv", **{'lock.ip': self.ip}):
+                    res = await asyncio.wait_for(self.reader.read(1024), LOCK_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                return None
+
+        return res
+
+    def close_sock(self):
+        self.closed = True
+        if self.writer:
+            self.writer.close()
+
+
+class LockGateway:
+    # The lock sockets of a worker: one client per key, e.g. (user, lock), and at most max_connections of them. A
+    # client is created and counted under the lock and connects on its first message, outside it. Clients are kept in
+    # least recently used order; idle ones are closed when a client is asked for, and a client with a message in
+    # flight is never closed to make room.
+
+    client_class = LockClient
+
+    def __init__(self, max_connections=MAX_REMOTE_CONNECTIONS, idle_timeout=REMOTE_CONNECTION_IDLE_TIMEOUT):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.clients = OrderedDict()
+        self._last_used = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.clients)
+
+    def _pop(self, key):
+        # under the lock
+        self._last_used.pop(key, None)
+        self._in_flight.pop(key, None)
+        return self.clients.pop(key)
+
+    def _evict(self, now, room=0):
+        # under the lock: the idle clients, then the least recently used ones not in use until `room` are free
+        evicted = []
+        for key in list(self.clients):
+            if self._in_flight.get(key):
+                continue
+            if now - self._last_used[key] >= self.idle_timeout or len(self.clients) + room > self.max_connections:
+                evicted.append(self._pop(key))
+        return evicted
+
+    def evict_idle(self, now=None):
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            evicted = self._evict(now)
+
+        for lock_client in evicted:
+            lock_client.close_sock()
+
+    def get_client(self, key, ip, now=None):
+        # None when max_connections clients all have a message in flight
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            lock_client = self.clients.get(key)
+
+            if lock_client is None:
+                evicted = self._evict(now, room=1)
+                if len(self.clients) < self.max_connections:
+                    lock_client = self.clients[key] = self.client_class(ip)
+            else:
+                evicted = []
+                self.clients.move_to_end(key)
+
+            if lock_client is not None:
+                self._last_used[key] = now
+
+        for evicted_client in evicted:
+            evicted_client.close_sock()
+
+        return lock_client
+
+    def close_client(self, key, lock_client):
+        with self._lock:
+            # another request may have replaced it already
+            if self.clients.get(key) is lock_client:
+                self._pop(key)
+
+        lock_client.close_sock()
+
+    def _start_msg(self, key, lock_client):
+        with self._lock:
+            if self.clients.get(key) is lock_client:
+                self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _end_msg(self, key, lock_client, response, close):
+        # the client is closed after the message when asked to, or when the lock did not answer
+        with self._lock:
+            if self.clients.get(key) is lock_client:
+                self._in_flight[key] = max(self._in_flight.get(key, 0) - 1, 0)
+                self._last_used[key] = time.monotonic()
+                self.clients.move_to_end(key)
+
+        if close or not response:
+            self.close_client(key, lock_client)
+
+    def send_msg(self, key, lock_client, msg, close=False):
+        self._start_msg(key, lock_client)
+        response = None
+        try:
+            with latency_tracker.timed("lock_gateway"):
+                response = lock_client.send_msg_to_lock(msg)
+        finally:
+            self._end_msg(key, lock_client, response, close)
+
+        return response
+
+    def close_all(self):
+        with self._lock:
+            lock_clients = list(self.clients.values())
+            self.clients.clear()
+            self._last_used.clear()
+            self._in_flight.clear()
+
+        for lock_client in lock_clients:
+            lock_client.close_sock()
+
+
+class AsyncLockGateway(LockGateway):
+    # LockGateway of AsyncLockClients, on one event loop. get_client awaits nothing, so no other request runs between
+    # its check and its insert and two requests for one key share one client.
+
+    client_class = AsyncLockClient
+
+    async def get_client(self, key, ip, now=None):
+        return super().get_client(key, ip, now)
+
+    async def send_msg(self, key, lock_client, msg, close=False):
+        self._start_msg(key, lock_client)
+        response = None
+        try:
+            with latency_tracker.timed("lock_gateway"):
+                response = await lock_client.send_msg_to_lock(msg)
+        finally:
+            self._end_msg(key, lock_client, response, close)
+
+        return response
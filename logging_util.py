@@ -0,0 +1,218 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from request_hooks import request_globals, request_hook
+
+# Structured JSON logs, one object per line:
+#   {"log": "access", ...}  one per request: route, status, result code, latency, lock MAC, uid hash, stage timings
+#   {"log": "audit", ...}   invite creation and redemption, remote lock commands
+#   {"log": "event", ...}   reports and errors of the background threads (invite sweeper, RTDB mirror)
+# Requests only put records on a queue; a background thread writes them to the file in batches and rotates it.
+# Configured from the environment:
+#   LOG_FILE           write the logs to this file. "{pid}" is replaced by the process id, for one file per gunicorn
+#                      worker. When it is not set only the events are logged, to the logging module.
+#   LOG_MAX_BYTES      rotate the file at this size, 50 MB by default
+#   LOG_BACKUP_COUNT   rotated files kept, 5 by default
+#   LOG_UID_SALT       mixed into the uid hashes
+
+ACCESS_LOG = "access"
+AUDIT_LOG = "audit"
+EVENT_LOG = "event"
+
+_request_fields = contextvars.ContextVar("request_log_fields", default=None)
+
+
+class BatchFileWriter:
+    # Appends records to `filename` as JSON lines from a background thread, every `interval` seconds or `batch_size`
+    # records, in a single write; serializing them is left to that thread too. When the queue is full new records are
+    # dropped (and counted) rather than blocking the caller.
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, backup_count=5, interval=1, batch_size=1024,
+                 max_queue_size=65536):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.interval = interval
+        self.batch_size = batch_size
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._batch_ready = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+
+    def write(self, record):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def flush(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        if not records:
+            return
+
+        lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+
+        filename = self.filename.format(pid=os.getpid())
+        with self._write_lock:
+            try:
+                with open(filename, "a") as file:
+                    file.write(lines)
+                    size = file.tell()
+                if self.max_bytes and size >= self.max_bytes:
+                    self._rotate(filename)
+            except OSError:
+                self.dropped += len(records)
+
+    def _rotate(self, filename):
+        # filename -> filename.1 -> ... -> filename.<backup_count>, the oldest is removed
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{filename}.{i}"):
+                os.replace(f"{filename}.{i}", f"{filename}.{i + 1}")
+        if self.backup_count:
+            os.replace(filename, f"{filename}.1")
+        else:
+            os.remove(filename)
+
+    def _ensure_thread(self):
+        # started lazily, and again after a fork (e.g. gunicorn --preload)
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._batch_ready = threading.Event()
+                    threading.Thread(target=self._run, args=(self._batch_ready,), daemon=True).start()
+                    self._pid = pid
+
+    def _run(self, batch_ready):
+        while True:
+            batch_ready.wait(self.interval)
+            batch_ready.clear()
+            self.flush()
+
+
+def _writer_from_env():
+    if not os.environ.get("LOG_FILE"):
+        return None
+    return BatchFileWriter(os.environ["LOG_FILE"], max_bytes=int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 * 1024)),
+                           backup_count=int(os.environ.get("LOG_BACKUP_COUNT", 5)))
+
+
+writer = _writer_from_env()
+
+
+def hash_id(value):
+    # uids and invite ids are not written as they are; the hash still tells requests of the same user apart
+    salt = os.environ.get("LOG_UID_SALT", "")
+    return hashlib.sha256(f"{salt}{value}".encode()).hexdigest()[:16]
+
+
+def log(stream, **fields):
+    if writer is not None:
+        writer.write({'log': stream, 'ts': round(time.time(), 3), **fields})
+
+
+def audit(event, **fields):
+    # the lock MAC and uid hash of the current request are added when known
+    if writer is not None:
+        request_fields = _request_fields.get() or {}
+        context = {key: request_fields[key] for key in ('lock_mac', 'uid_hash') if key in request_fields}
+        log(AUDIT_LOG, event=event, **{**context, **fields})
+
+
+def log_event(source, event, error=None, **fields):
+    # Without LOG_FILE the event goes to the logger named after source, as a warning when it carries an error, so
+    # failures of background threads are not lost.
+    if error is not None:
+        fields['error'] = f"{type(error).__name__}: {error}"
+    if writer is not None:
+        log(EVENT_LOG, source=source, event=event, **fields)
+    else:
+        level = logging.WARNING if error is not None else logging.INFO
+        logging.getLogger(source).log(level, "%s %s", event, json.dumps(fields, default=str))
+
+
+def add_log_fields(**fields):
+    # adds fields to the access log line of the current request
+    request_fields = _request_fields.get()
+    if request_fields is not None:
+        request_fields.update(fields)
+
+
+def log_result(response):
+    # adds the result code of a failed JSON response ({'success': False, 'code': ...}) to the access log line
+    if writer is not None and isinstance(response, dict) and response.get('success') is False:
+        add_log_fields(code=response.get('code'))
+
+
+def set_log_uid(uid):
+    if writer is not None and uid:
+        add_log_fields(uid_hash=hash_id(uid))
+
+
+def record_stage(stage, seconds):
+    # time spent in a dependency (firebase, rsa, lock, ...) during the current request, added up per stage
+    request_fields = _request_fields.get()
+    if request_fields is not None:
+        stages = request_fields.setdefault('stages_ms', {})
+        stages[stage] = round(stages.get(stage, 0) + seconds * 1000, 3)
+
+
+def log_app(app):
+    # one access log line per request, queued when the request ends
+    request, g = request_globals(app)
+    hook = request_hook(app)
+
+    @app.before_request
+    @hook
+    def _start_request_log():
+        if writer is not None:
+            g.log_start = time.perf_counter()
+            g.log_token = _request_fields.set({})
+
+    @app.after_request
+    @hook
+    def _record_status(response):
+        # the result code comes from the view (log_result), so response bodies are not parsed again here
+        request_fields = _request_fields.get()
+        if request_fields is not None:
+            request_fields['status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    @hook
+    def _end_request_log(exc):
+        if "log_start" not in g:
+            return
+
+        request_fields = _request_fields.get() or {}
+        _request_fields.reset(g.log_token)
+
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        if exc is not None:
+            request_fields['status'] = 500
+            request_fields['error'] = type(exc).__name__
+
+        log(ACCESS_LOG, method=request.method, route=route,
+            latency_ms=round((time.perf_counter() - g.log_start) * 1000, 3), **request_fields)
+
+    return app
@@ -0,0 +1,104 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, \
+    generate_latest, multiprocess
+
+from logging_util import record_stage
+from request_hooks import request_globals, request_hook
+
+# When PROMETHEUS_MULTIPROC_DIR is set (server_launch does it for gunicorn), each worker writes its samples to that
+# directory and generate_metrics() adds up all workers.
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Request latency per route.", ["method", "route"])
+REQUESTS = Counter("http_requests_total", "Responses per route and status code.", ["method", "route", "status"])
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled per route.", ["method", "route"],
+                             multiprocess_mode="livesum")
+
+DEPENDENCY_DURATION = Histogram("dependency_call_duration_seconds", "Latency of calls to Firebase, token "
+                                "verification, RSA verification and locks.", ["dependency", "operation"])
+DEPENDENCY_ERRORS = Counter("dependency_call_errors_total", "Dependency calls that raised.",
+                            ["dependency", "operation"])
+DEPENDENCY_CALLS_COALESCED = Counter("dependency_calls_coalesced_total", "Dependency calls answered by an identical "
+                                     "call already in flight.", ["dependency", "operation"])
+
+MIRROR_LAG = Gauge("rtdb_mirror_lag_seconds", "Time for a database write to reach the in-process mirror.",
+                   multiprocess_mode="livemax")
+MIRROR_READS = Counter("rtdb_mirror_reads_total", "Reads of mirrored trees, answered by the mirror (hit) or by the "
+                       "database (miss).", ["tree", "result"])
+MIRROR_RESYNCS = Counter("rtdb_mirror_resyncs_total", "Mirror listeners reopened, with the full tree sent again.",
+                         ["tree", "reason"])
+
+
+@contextmanager
+def dependency_timer(dependency, operation):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DEPENDENCY_ERRORS.labels(dependency, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_DURATION.labels(dependency, operation).observe(elapsed)
+        record_stage(dependency, elapsed)
+
+
+def timed(dependency, operation=None):
+    # decorator version of dependency_timer, the operation defaults to the function name
+    def decorator(func):
+        func_operation = operation or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with dependency_timer(dependency, func_operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_app(app):
+    request, g = request_globals(app)
+    hook = request_hook(app)
+
+    def _labels():
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        return request.method, route
+
+    @app.before_request
+    @hook
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.labels(*_labels()).inc()
+
+    @app.after_request
+    @hook
+    def _record_request(response):
+        if "metrics_start" in g:
+            method, route = _labels()
+            REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - g.metrics_start)
+            REQUESTS.labels(method, route, response.status_code).inc()
+        return response
+
+    @app.teardown_request
+    @hook
+    def _end_request(exc):
+        if "metrics_start" in g:
+            REQUESTS_IN_PROGRESS.labels(*_labels()).dec()
+
+    return app
+
+
+def generate_metrics():
+    # Returns (body, content_type) in the Prometheus text format
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
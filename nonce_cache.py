@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class NonceCache:
+    # Remembers the nonces of signed requests for as long as their timestamps are fresh. Nonces are kept in buckets
+    # by the (signed) timestamp of their request, so a replay always lands in the same bucket and is found with a
+    # single set lookup, and expired buckets are dropped whole. When max_entries is reached older buckets are dropped
+    # early and requests from their time are rejected as stale from then on; if that is not enough, new nonces are
+    # refused until the window moves on.
+
+    def __init__(self, window=5 * 60, bucket_seconds=30, max_entries=100000):
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.max_entries = max_entries
+
+        self._buckets = {}
+        self._size = 0
+        self._min_bucket = None
+        self._lock = threading.Lock()
+
+    def is_fresh(self, timestamp, now=None):
+        now = now if now is not None else time.time()
+        if abs(now - timestamp) > self.window:
+            return False
+        return self._min_bucket is None or self._bucket(timestamp) >= self._min_bucket
+
+    def contains(self, key, timestamp):
+        bucket = self._buckets.get(self._bucket(timestamp))
+        return bucket is not None and key in bucket
+
+    def check_and_add(self, key, timestamp, now=None):
+        # Returns False if the request is stale or key was already seen, otherwise records key and returns True.
+        now = now if now is not None else time.time()
+        if not self.is_fresh(timestamp, now):
+            return False
+
+        bucket_id = self._bucket(timestamp)
+        with self._lock:
+            self._expire(now)
+
+            if self._min_bucket is not None and bucket_id < self._min_bucket:
+                return False
+
+            bucket = self._buckets.setdefault(bucket_id, set())
+            if key in bucket:
+                return False
+
+            while self._size >= self.max_entries and min(self._buckets) < bucket_id:
+                self._drop(min(self._buckets))
+
+            if self._size >= self.max_entries:
+                return False
+
+            bucket.add(key)
+            self._size += 1
+
+        return True
+
+    def __len__(self):
+        return self._size
+
+    def _bucket(self, timestamp):
+        return int(timestamp // self.bucket_seconds)
+
+    def _expire(self, now):
+        oldest = self._bucket(now - self.window)
+        for bucket_id in [bucket_id for bucket_id in self._buckets if bucket_id < oldest]:
+            self._drop(bucket_id)
+
+    def _drop(self, bucket_id):
+        self._size -= len(self._buckets.pop(bucket_id))
+        if self._min_bucket is None or self._min_bucket <= bucket_id:
+            self._min_bucket = bucket_id + 1
+
+
+class SqliteNonceCache:
+    # NonceCache shared by the worker processes of one host through a SQLite file (on local disk or tmpfs), so a
+    # request replayed to another worker is found too. Nonces are kept until their timestamp leaves the window, and
+    # every PRUNE_EVERY adds the older ones are deleted. While the file stays locked longer than `timeout`, nonces are
+    # checked and recorded in this process only.
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, filename, window=5 * 60, timeout=0.05):
+        self.filename = filename
+        self.window = window
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._adds = 0
+        self._fallback = NonceCache(window=window)
+
+    def is_fresh(self, timestamp, now=None):
+        now = now if now is not None else time.time()
+        return abs(now - timestamp) <= self.window
+
+    def contains(self, key, timestamp):
+        try:
+            row = self._connection().execute("SELECT 1 FROM nonces WHERE key = ?", (_key_text(key),)).fetchone()
+        except sqlite3.Error:
+            return self._fallback.contains(key, timestamp)
+        return row is not None or self._fallback.contains(key, timestamp)
+
+    def check_and_add(self, key, timestamp, now=None):
+        # Returns False if the request is stale or key was already seen, otherwise records key and returns True.
+        now = now if now is not None else time.time()
+        if not self.is_fresh(timestamp, now):
+            return False
+
+        try:
+            connection = self._connection()
+            try:
+                connection.execute("INSERT INTO nonces VALUES (?, ?)", (_key_text(key), timestamp))
+            except sqlite3.IntegrityError:
+                return False
+
+            self._adds += 1
+            if self._adds % self.PRUNE_EVERY == 0:
+                connection.execute("DELETE FROM nonces WHERE timestamp < ?", (now - self.window,))
+        except sqlite3.Error:
+            return self._fallback.check_and_add(key, timestamp, now)
+
+        return True
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM nonces").fetchone()[0]
+
+    def _connection(self):
+        # one connection per thread, opened again after a fork
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("CREATE TABLE IF NOT EXISTS nonces (key TEXT PRIMARY KEY, timestamp REAL)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+
+def _key_text(key):
+    return json.dumps(key)
+
+
+def nonce_cache_from_env():
+    # NONCE_DB is the SQLite file of a SqliteNonceCache (server_launch sets one for gunicorn); without it the nonces
+    # are kept in this process, which only catches replays sent to the same worker.
+    if os.environ.get("NONCE_DB"):
+        return SqliteNonceCache(os.environ["NONCE_DB"])
+    return NonceCache()
@@ -0,0 +1,120 @@
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Statistical (wall-clock) profiler: a background thread reads the stack of every other thread every `interval`
+# seconds and counts them as collapsed stacks, "module:function;module:function count" per line, root first, the
+# input of flamegraph.pl and speedscope. Under gevent only the stacks of real threads are seen.
+
+DEFAULT_INTERVAL = 0.01
+PROFILE_SIGNAL = signal.SIGUSR2
+PROFILE_SIGNAL_SECONDS = 30
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+
+        self._counts = Counter()
+        self._thread = None
+        self._stop_event = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None, exclude_thread_ids=(), on_done=None, interval=None):
+        # Returns False if a profile is already running. on_done(collapsed) is called from the sampling thread when
+        # the profile ends, after `duration` seconds or on stop().
+        with self._lock:
+            if self.running:
+                return False
+
+            self.interval = interval or self.interval
+            self._counts = Counter()
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True,
+                                            args=(self._stop_event, duration, set(exclude_thread_ids), on_done))
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            thread, stop_event = self._thread, self._stop_event
+
+        if thread is not None:
+            stop_event.set()
+            thread.join()
+
+        return self.collapsed()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+
+    def _run(self, stop_event, duration, exclude_thread_ids, on_done):
+        exclude_thread_ids.add(threading.get_ident())
+        deadline = None if duration is None else time.monotonic() + duration
+
+        while not stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in exclude_thread_ids:
+                    self._counts[_collapse(frame)] += 1
+
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+        if on_done:
+            on_done(self.collapsed())
+
+
+profiler = SamplingProfiler()
+
+
+def profile(seconds, interval=DEFAULT_INTERVAL):
+    # Profiles the other threads of this process for `seconds` and returns the collapsed stacks, or None if a profile
+    # is already running.
+    results = []
+    done = threading.Event()
+
+    def on_done(collapsed):
+        results.append(collapsed)
+        done.set()
+
+    if not profiler.start(seconds, exclude_thread_ids=[threading.get_ident()], on_done=on_done, interval=interval):
+        return None
+
+    done.wait()
+    return results[0]
+
+
+def install_signal_handler(signum=PROFILE_SIGNAL, seconds=PROFILE_SIGNAL_SECONDS, output_dir=None):
+    # The first signal starts a profile of `seconds`, a second one ends it early. The result is written to
+    # output_dir (PROFILE_DIR or the temp directory) as profile-<pid>-<timestamp>.collapsed.
+    output_dir = output_dir or os.environ.get("PROFILE_DIR") or tempfile.gettempdir()
+
+    def write_profile(collapsed):
+        filename = os.path.join(output_dir, f"profile-{os.getpid()}-{int(time.time())}.collapsed")
+        with open(filename, "w") as file:
+            file.write(collapsed)
+
+    def handle_signal(signum, frame):
+        if profiler.running:
+            threading.Thread(target=profiler.stop, daemon=True).start()
+        else:
+            profiler.start(seconds, on_done=write_profile)
+
+    signal.signal(signum, handle_signal)
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Token buckets in front of the expensive routes. A bucket holds up to `burst` tokens and refills at `rate` tokens per
+# second; a request takes one token from each of its buckets (client IP, lock, user) or is answered with 429 and the
+# seconds until a token is back. Configured from the environment:
+#   RATE_LIMIT_DB        SQLite file the buckets are kept in, shared by all the workers of the host. Without it every
+#                        worker keeps its own buckets in memory, so a client gets up to one burst per worker.
+#   RATE_LIMIT_DISABLED  set to 1 to let every request through (load tests)
+
+
+def _take(tokens, updated, rate, burst, now):
+    # Returns the tokens left and 0, or the tokens and the seconds until one is available when the bucket is empty.
+    tokens = min(burst, tokens + max(0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBucketStore:
+    # The buckets of this process. Beyond max_keys the least recently used bucket is dropped; it would start full again.
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, retry_after = _take(tokens, updated, rate, burst, now)
+            self._buckets[key] = (tokens, now)
+
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SqliteBucketStore:
+    # Buckets shared by the worker processes of one host through a SQLite file (on local disk or tmpfs). Each take is
+    # one short write transaction. When the file stays locked longer than `timeout` the request is let through rather
+    # than held up. Buckets untouched for max_idle seconds (longer than any bucket takes to refill) are deleted.
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, filename, timeout=0.05, max_idle=60 * 60):
+        self.filename = filename
+        self.timeout = timeout
+        self.max_idle = max_idle
+
+        self._local = threading.local()
+        self._takes = 0
+
+    def take(self, key, rate, burst, now):
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, retry_after = _take(*(row or (burst, now)), rate, burst, now)
+                connection.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (key, tokens, now))
+
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    connection.execute("DELETE FROM buckets WHERE updated < ?", (now - self.max_idle,))
+
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            return 0
+
+        return retry_after
+
+    def _connection(self):
+        # one connection per thread, opened again after a fork
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.filename, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+
+def _store_from_env():
+    if os.environ.get("RATE_LIMIT_DISABLED") == "1":
+        return None
+    if os.environ.get("RATE_LIMIT_DB"):
+        return SqliteBucketStore(os.environ["RATE_LIMIT_DB"])
+    return MemoryBucketStore()
+
+
+store = _store_from_env()
+
+
+class RateLimiter:
+    # One bucket per key for each kind of key in `limits`, e.g. {'ip': (5, 20)} for 5 requests per second per client
+    # IP with bursts of 20. check() takes a request's keys in order and stops at the first empty bucket, so a client
+    # that is already limited does not also use up the tokens of the lock or user it names.
+
+    def __init__(self, name, limits, bucket_store=None):
+        self.name = name
+        self.limits = limits
+        self.bucket_store = bucket_store
+
+    def check(self, now=None, **keys):
+        # Returns 0 when the request is allowed, otherwise the seconds until it would be. None keys are skipped.
+        bucket_store = self.bucket_store if self.bucket_store is not None else store
+        if bucket_store is None:
+            return 0
+
+        now = now if now is not None else time.time()
+        for kind, key in keys.items():
+            if key is None:
+                continue
+            rate, burst = self.limits[kind]
+            retry_after = bucket_store.take(f"{self.name}:{kind}:{key}", rate, burst, now)
+            if retry_after:
+                return retry_after
+        return 0
+
+
+def token_key(id_token):
+    # The uid of an ID token is only known once the token is verified, which is what the limit runs before; each token
+    # stands for its user instead (it is reused until it expires). Hashed to keep the keys short.
+    if not isinstance(id_token, str) or not id_token:
+        return None
+    return hashlib.sha256(id_token.encode()).hexdigest()[:32]
+
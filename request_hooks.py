@@ -0,0 +1,35 @@
+import sys
+from functools import wraps
+
+# instrument_app, trace_app and log_app register the same request hooks on Flask apps (app.py) and Quart apps
+# (async_app.py). Quart is only looked at when it has been imported, by an async app.
+
+
+def is_async_app(app):
+    quart = sys.modules.get("quart")
+    return quart is not None and isinstance(app, quart.Quart)
+
+
+def request_globals(app):
+    # request and g of the app's framework
+    if is_async_app(app):
+        from quart import request, g
+    else:
+        from flask import request, g
+    return request, g
+
+
+def request_hook(app):
+    # Quart runs plain functions in a worker thread, where the context variables a hook sets would be lost, so they
+    # are registered as coroutines there
+    def decorator(func):
+        if not is_async_app(app):
+            return func
+
+        @wraps(func)
+        async def hook(*args):
+            return func(*args)
+
+        return hook
+
+    return decorator
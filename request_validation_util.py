@@ -0,0 +1,78 @@
+import json
+import re
+
+MAX_DATA_LENGTH = 128 * 1024
+MAX_SIGNATURE_LENGTH = 1024
+
+MAX_KEY_LENGTH = 768
+
+# seconds east of UTC a lock's clock may be set to (UTC-12:00 to UTC+14:00)
+MIN_UTC_OFFSET = -12 * 60 * 60
+MAX_UTC_OFFSET = 14 * 60 * 60
+
+MAC_PATTERN = re.compile(r"^[0-9A-F]{2}(:[0-9A-F]{2}){5}$")
+# characters the Realtime Database does not allow in keys, plus "/" so a value cannot address another path and "?",
+# which firebase_admin does not allow in paths
+FORBIDDEN_KEY_CHARACTERS = re.compile(r"[./#$?\[\]]")
+
+
+def is_valid_mac(mac):
+    return isinstance(mac, str) and MAC_PATTERN.match(mac.upper()) is not None
+
+
+def is_valid_key(key):
+    return isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH and not FORBIDDEN_KEY_CHARACTERS.search(key)
+
+
+def is_valid_utc_offset(utc_offset):
+    return type(utc_offset) is int and MIN_UTC_OFFSET <= utc_offset <= MAX_UTC_OFFSET
+
+
+def get_client_ip(remote_addr, forwarded_for, trusted_proxy_hops=0):
+    # Every proxy appends the address it got the request from to X-Forwarded-For, so only the last trusted_proxy_hops
+    # entries were written by our proxies; anything left of them comes from the client. Without trusted proxies, or
+    # when the request did not pass through all of them, the socket peer is the client.
+    if trusted_proxy_hops <= 0 or not forwarded_for:
+        return remote_addr
+
+    hops = [hop.strip() for hop in forwarded_for.split(",")]
+
+    if len(hops) < trusted_proxy_hops or not hops[-trusted_proxy_hops]:
+        return remote_addr
+
+    return hops[-trusted_proxy_hops]
+
+
+def validate_signed_request(args):
+    # Shape checks for a signed request, run before any database read or signature verification.
+    # Returns (error_response, None) or (None, data_dict) with smart_lock_MAC upper-cased.
+    if not isinstance(args, dict):
+        return {'success': False, 'code': 400, 'msg': 'Invalid request'}, None
+
+    signature = args.get("signature") if args.get("signature") else None
+
+    if not signature:
+        return {'success': False, 'code': 403, 'msg': 'Message not signed'}, None
+
+    if not isinstance(signature, str) or len(signature) > MAX_SIGNATURE_LENGTH:
+        return {'success': False, 'code': 403, 'msg': 'Invalid signature'}, None
+
+    data = args.get("data") if args.get("data") else None
+
+    if not data or not isinstance(data, str) or len(data) > MAX_DATA_LENGTH:
+        return {'success': False, 'code': 400, 'msg': 'Invalid data'}, None
+
+    try:
+        data_dict = json.loads(data)
+    except ValueError:
+        return {'success': False, 'code': 400, 'msg': 'Invalid data'}, None
+
+    if not isinstance(data_dict, dict):
+        return {'success': False, 'code': 400, 'msg': 'Invalid data'}, None
+
+    if not is_valid_mac(data_dict.get("smart_lock_MAC")):
+        return {'success': False, 'code': 400, 'msg': 'Invalid smart_lock_MAC'}, None
+
+    data_dict["smart_lock_MAC"] = data_dict["smart_lock_MAC"].upper()
+
+    return None, data_dict
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def _canonical_json(data):
+    return json.dumps(data, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseSigner:
+    # Signs authorization verdicts with the server key. The signed payload holds the authorization, the verdict
+    # (allowed, allowed_until) and issued_at/expires, so a lock can reject a changed verdict and, once it expires, an
+    # old one replayed after a revocation. expires is at most ttl after issued_at, and never after allowed_until.
+    # The signature per (mac, phone_id) is reused while the verdict, whose digest is the version, is unchanged and
+    # at least half of its ttl is left; older versions are replaced rather than kept. At most max_entries (least
+    # recently used first out) are kept.
+
+    def __init__(self, rsa_util, ttl=5 * 60, max_entries=10000):
+        self.rsa_util = rsa_util
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._signed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sign_authorization(self, mac, phone_id, authorization, allowed, allowed_until, now=None):
+        # Returns (signed_data, signature_b64); signed_data is the exact string the signature covers.
+        now = int(now if now is not None else time.time())
+        verdict_json = _canonical_json({'data': authorization, 'allowed': allowed, 'allowed_until': allowed_until})
+        version = hashlib.sha256(verdict_json.encode()).hexdigest()
+        key = (mac, phone_id)
+
+        with self._lock:
+            cached = self._signed.get(key)
+            if cached and cached[0] == version and now < cached[1]:
+                self._signed.move_to_end(key)
+                return cached[2], cached[3]
+
+        expires = now + self.ttl
+        if allowed_until is not None:
+            expires = min(expires, int(allowed_until))
+
+        signed_data = _canonical_json({'smart_lock_MAC': mac, 'phone_id': phone_id, 'version': version,
+                                       'data': authorization, 'allowed': allowed, 'allowed_until': allowed_until,
+                                       'issued_at': now, 'expires': expires})
+        signature = self.rsa_util.sign(signed_data).decode()
+
+        with self._lock:
+            self._signed[key] = (version, min(now + self.ttl // 2, expires), signed_data, signature)
+            self._signed.move_to_end(key)
+            while len(self._signed) > self.max_entries:
+                self._signed.popitem(last=False)
+
+        return signed_data, signature
+
+    def __len__(self):
+        return len(self._signed)
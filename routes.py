@@ -0,0 +1,914 @@
+import base64
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from cachetools import TTLCache
+
+from authorization_util import compile_authorization, is_allowed, is_expired, verdict_valid_until, uses_local_days
+from firebase_util import BASE_DIR, get_decoded_claims_id_token
+from health_util import latency_tracker
+from id_util import IdPool
+from invite_sweeper import INVITE_DEFAULT_TTL, invite_removal_updates
+from logging_util import add_log_fields, audit, hash_id
+from lock_client_util import MAX_REMOTE_CONNECTIONS
+from profiler_util import profile
+from rate_limit_util import RateLimiter, token_key
+from request_validation_util import validate_signed_request, is_valid_key, is_valid_utc_offset
+from response_signer import ResponseSigner
+from tracing_util import start_span, set_attributes
+
+# The routes of app.py (Flask) and async_app.py (Quart). Each route is a coroutine that takes the request's arguments
+# and client IP and returns the JSON response as a dict; the front-ends only read the request and write the response.
+# The I/O is the front-end's: app.py passes blocking objects wrapped in Blocking and runs the routes with
+# run_blocking(), async_app.py passes coroutines and awaits them (see AsyncRoutes).
+
+ICONS_DIR = os.path.join(BASE_DIR, "lock_icons")
+
+# Trees each worker keeps a live copy of and reads from, e.g. RTDB_MIRROR_TREES=doors,authorizations,invites (see
+# rtdb_mirror). Every worker downloads them whole on start. Reads from the copy are only eventually consistent:
+#   - a write made by another worker is read once its stream event arrives, usually within a second. Until then, e.g.
+#     /get-door-certificate right after /register-door-lock went to another worker can answer from the old tree;
+#   - this worker's own writes are applied at once, and a stream event from before the write that arrives after it
+#     briefly puts the previous value back, until the event of the write itself follows;
+#   - a lagging stream is read from for up to RTDB_MIRROR_STALE_AFTER seconds (30 by default) before reads go back to
+#     the database, so a revoked authorization or redeemed invite can take that long to apply. Lower it, or leave
+#     authorizations and invites out, where that is too long.
+MIRROR_TREES = [tree for tree in os.environ.get("RTDB_MIRROR_TREES", "").split(",") if tree]
+
+# Readiness reads this (small) path at most every STORAGE_PROBE_INTERVAL seconds, whatever the polling rate
+HEALTH_PROBE_PATH = "health_probe"
+STORAGE_PROBE_INTERVAL = 10
+
+# Unless REQUIRE_FRESH_SIGNED_REQUESTS=1, signed requests without timestamp and nonce (older lock firmware) are still
+# accepted
+REQUIRE_FRESH_SIGNED_REQUESTS = os.environ.get("REQUIRE_FRESH_SIGNED_REQUESTS") == "1"
+
+# Private key the server signs authorization responses with; responses are not signed when it is not set
+SERVER_PRIVATE_KEY_FILE = os.environ.get("SERVER_PRIVATE_KEY_FILE")
+
+# (requests per second, burst) per client IP, lock and ID token, checked before any token or signature verification.
+# The lock a request names is not verified yet at that point, so lock limits are above the IP limit: a single client
+# cannot use up a lock's tokens.
+AUTHORIZATION_RATE_LIMITS = {'ip': (5, 20), 'lock': (10, 40)}
+REMOTE_CONNECTION_RATE_LIMITS = {'ip': (5, 20), 'user': (2, 10), 'lock': (10, 40)}
+
+# Number of proxies in front of the app that append to X-Forwarded-For (1 behind the Heroku router, see the Procfile).
+# Client IPs key the rate limits, so with the default of 0 X-Forwarded-For is not trusted at all.
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+MAX_INVITES_PER_BATCH = 500
+INVITE_LOCK_STRIPES = 64
+
+# A profile blocks its request thread, so it is limited well below the worker timeout
+MAX_PROFILE_SECONDS = 20
+
+# (rule, method, Routes method) of the JSON routes. GET routes take the query string, POST routes the JSON body.
+JSON_ROUTES = [
+    ("/", 'GET', 'ping'),
+    ("/livez", 'GET', 'livez'),
+    ("/get-all-icons", 'GET', 'get_all_icons'),
+    ("/register-phone-id", 'POST', 'register_phone_id'),
+    ("/check-lock-registration-status", 'GET', 'check_lock_registration_status'),
+    ("/register-door-lock", 'POST', 'register_door_lock'),
+    ("/get-door-certificate", 'GET', 'get_door_certificate'),
+    ("/register-invite", 'POST', 'register_invite'),
+    ("/register-invites", 'POST', 'register_invites'),
+    ("/request-authorization", 'POST', 'request_authorization'),
+    ("/redeem-invite", 'POST', 'redeem_invite'),
+    ("/redeem-user-invite", 'POST', 'redeem_user_invite'),
+    ("/save-user-invite", 'POST', 'save_user_invite'),
+    ("/check-user-invite", 'GET', 'check_user_invite'),
+    ("/get-user-locks", 'GET', 'get_user_locks'),
+    ("/set-user-locks", 'POST', 'set_user_locks'),
+    ("/delete-user-lock", 'POST', 'delete_user_lock'),
+    ("/get-lock-mac", 'GET', 'get_lock_mac'),
+    ("/remote-connection", 'POST', 'remote_connection'),
+]
+
+
+class Blocking:
+    # The awaitable interface the routes use, over an object with blocking methods (FirebaseUtil, LockGateway). The
+    # method runs when its coroutine is awaited and nothing suspends, so run_blocking() runs a route in one step.
+
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+def run_blocking(coroutine):
+    # Runs a route of Routes (not AsyncRoutes) in the calling thread and returns its response
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+
+    coroutine.close()
+    raise RuntimeError("A route of the blocking front-end awaited a suspending call")
+
+
+def rate_limited(retry_after):
+    return {'success': False, 'code': 429, 'msg': 'Too many requests', 'retry_after': math.ceil(retry_after)}
+
+
+def readiness(storage, open_connections):
+    # /readyz response; the front-end answers 503 when it is not a success. Open lock connections are only reported:
+    # idle ones make room for new ones (see LockGateway), and a worker out of the load balancer is never recycled.
+    lock_gateway = {
+        'open_connections': open_connections,
+        'max_connections': MAX_REMOTE_CONNECTIONS
+    }
+
+    ready = storage['ok']
+
+    response = {'success': ready, 'storage': storage, 'lock_gateway': lock_gateway,
+                'latencies': latency_tracker.summary()}
+
+    if not ready:
+        response['code'] = 503
+
+    return response
+
+
+@lru_cache(maxsize=None)
+def get_icon_ids():
+    # the icons ship with the app, so the directory is listed once, on first use
+    files = sorted(os.listdir(ICONS_DIR))
+
+    icon_ids = []
+
+    for file in files:
+        if ".png" in file:
+            file = file.replace(".png", "")
+            icon_ids.append(file)
+
+    return tuple(icon_ids)
+
+
+def get_icon_path(icon_id):
+    # (path, None), or (None, the 404 message)
+    if not icon_id:
+        return None, "icon_id not provided"
+
+    if icon_id not in get_icon_ids():
+        return None, f"Icon with ID \"{icon_id}\" does no exist"
+
+    return os.path.join(ICONS_DIR, f"{icon_id}.png"), None
+
+
+@lru_cache(maxsize=1024)
+def _load_certificate_key(certificate):
+    # parsed once per certificate; a lock that registers again gets its new certificate parsed
+    from rsa_util import get_public_key_from_x509_cert
+
+    with start_span("rsa.load_certificate"):
+        return get_public_key_from_x509_cert(f"-----BEGIN CERTIFICATE-----{certificate}-----END CERTIFICATE-----")
+
+
+def _normalize_invite(invite):
+    if invite.get("weekdays_str"):
+        invite["weekdays"] = [int(i) for i in invite["weekdays_str"]]
+        del invite["weekdays_str"]
+
+    if not isinstance(invite.get("expiration"), (int, float)):
+        invite["expiration"] = int(time.time()) + INVITE_DEFAULT_TTL
+
+    return invite
+
+
+def _is_invite_expired(invite):
+    return isinstance(invite.get("expiration"), (int, float)) and invite["expiration"] < time.time()
+
+
+def _get_utc_offset(args):
+    # the optional utc_offset of a lock request, a number or a query string: None when missing, False when invalid
+    utc_offset = args.get("utc_offset")
+    if utc_offset is None or utc_offset == "":
+        return None
+    if isinstance(utc_offset, str):
+        try:
+            utc_offset = int(utc_offset)
+        except ValueError:
+            return False
+    return utc_offset if is_valid_utc_offset(utc_offset) else False
+
+
+def _get_invite_code(invite_id, smart_lock_mac, ble_addr):
+    return base64.b64encode(f'{invite_id} {smart_lock_mac} {ble_addr}'.encode()).decode()
+
+
+class Routes:
+
+    def __init__(self, fb_util, lock_gateway, signature_verifier, nonce_cache):
+        # fb_util and lock_gateway have awaitable methods (see Blocking)
+        self.fb_util = fb_util
+        self.lock_gateway = lock_gateway
+        self.signature_verifier = signature_verifier
+        self.nonce_cache = nonce_cache
+
+        self.invite_id_pool = IdPool(32)
+        self.authorization_limiter = RateLimiter("request_authorization", AUTHORIZATION_RATE_LIMITS)
+        self.remote_connection_limiter = RateLimiter("remote_connection", REMOTE_CONNECTION_RATE_LIMITS)
+
+        # MACs without a registered certificate, so floods for unknown locks do not reach the database
+        self.unknown_locks = TTLCache(maxsize=10000, ttl=60)
+        self._unknown_locks_lock = threading.Lock()
+
+        self._response_signer = None
+        self._response_signer_lock = threading.Lock()
+
+        self._invite_locks = [threading.Lock() for _ in range(INVITE_LOCK_STRIPES)]
+
+    # I/O outside fb_util and lock_gateway, blocking here and awaited in AsyncRoutes
+
+    async def gather(self, *awaitables):
+        return [await awaitable for awaitable in awaitables]
+
+    async def get_decoded_claims(self, id_token):
+        return get_decoded_claims_id_token(id_token)
+
+    async def verify_signature(self, key, data, signature):
+        return self.signature_verifier.verify(key, data, signature)
+
+    async def sign_authorization(self, signer, *args):
+        return signer.sign_authorization(*args)
+
+    async def profile(self, seconds):
+        return profile(seconds)
+
+    @asynccontextmanager
+    async def invite_lock(self, invite_id):
+        with self._invite_locks[hash(invite_id) % INVITE_LOCK_STRIPES]:
+            yield
+
+    # Open routes
+
+    async def ping(self, args, remote_ip):
+        if not self.fb_util:
+            return {'success': False, 'msg': 'fb_util is null'}
+        return {'success': True}
+
+    async def livez(self, args, remote_ip):
+        return {'success': True}
+
+    async def get_all_icons(self, args, remote_ip):
+        return {'success': True, 'icons': list(get_icon_ids())}
+
+    # Lock routes
+
+    async def register_phone_id(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        phone_id = args.get("phone_id") if args.get("phone_id") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not phone_id:
+            return {'success': False, 'code': 403, 'msg': 'No Phone Id'}
+
+        phone_ids = await self.fb_util.get_data(f"users/{claims.get('uid')}/phone_ids")
+
+        if not phone_ids:
+            phone_ids = []
+
+        if phone_id not in phone_ids:
+            phone_ids.append(phone_id)
+            await self.fb_util.set_data(f"users/{claims.get('uid')}", {"phone_ids": phone_ids})
+
+        return {'success': True}
+
+    async def check_lock_registration_status(self, args, remote_ip):
+        # locks call this as they start, with their current utc_offset (seconds east of UTC) when they know it
+        mac = args.get("MAC") if args.get("MAC") else None
+        utc_offset = _get_utc_offset(args)
+
+        if not mac:
+            return {'success': False, 'code': 400, 'msg': 'Missing argument MAC.'}
+
+        mac = mac.upper()
+
+        if not is_valid_key(mac):
+            return {'success': False, 'code': 400, 'msg': 'Invalid argument MAC.'}
+
+        if utc_offset is False:
+            return {'success': False, 'code': 400, 'msg': 'Invalid argument utc_offset.'}
+
+        door, authorizations = await self.gather(self.fb_util.get_data(f"doors/{mac}"),
+                                                 self.fb_util.get_data(f"authorizations/{mac}"))
+        lock_registered = not not door
+        lock_with_auths = not not authorizations
+
+        if lock_registered:
+            update = {"IP": remote_ip}
+            if utc_offset is not None:
+                update["utc_offset"] = utc_offset
+            await self.fb_util.set_data(f"doors/{mac}", update)
+
+        if lock_registered and lock_with_auths:
+            return {'success': True, 'status': 2}  # registered and with auths
+        elif lock_registered and not lock_with_auths:
+            return {'success': True, 'status': 1}  # just registered
+        elif not lock_registered and not lock_with_auths:
+            return {'success': True, 'status': 0}  # just not registered
+        else:
+            return {'success': False, 'code': 500, 'msg': 'Unknown state'}  # just not registered
+
+    async def register_door_lock(self, args, remote_ip):
+        mac = args.get("MAC") if args.get("MAC") else None
+        ble = args.get("BLE") if args.get("BLE") else None
+        certificate = args.get("certificate") if args.get("certificate") else None
+        utc_offset = _get_utc_offset(args)
+
+        if not mac or not certificate or not ble:
+            return {'success': False, 'code': 400, 'msg': 'Missing arguments.'}
+
+        if utc_offset is False:
+            return {'success': False, 'code': 400, 'msg': 'Invalid utc_offset.'}
+
+        mac = mac.upper()
+        ble = ble.upper()
+
+        if not is_valid_key(mac):
+            return {'success': False, 'code': 400, 'msg': 'Invalid arguments.'}
+
+        door = {
+            "MAC": mac,
+            "BLE": ble,
+            "certificate": certificate,
+            "IP": remote_ip
+        }
+
+        if utc_offset is not None:
+            door["utc_offset"] = utc_offset
+
+        await self.fb_util.set_data(f"doors/{mac}", door)
+
+        with self._unknown_locks_lock:
+            self.unknown_locks.pop(mac, None)
+
+        return {'success': True}
+
+    async def get_door_certificate(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        smart_lock_mac = args.get("smart_lock_mac").upper() if args.get("smart_lock_mac") else None
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        if not await self.get_decoded_claims(id_token):
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not smart_lock_mac:
+            return {'success': False, 'code': 400, 'msg': 'No smart_lock_mac'}
+
+        if not is_valid_key(smart_lock_mac):
+            return {'success': False, 'code': 400, 'msg': 'Invalid smart_lock_mac'}
+
+        certificate = await self.fb_util.get_data(f"doors/{smart_lock_mac}/certificate")
+
+        if not certificate:
+            return {'success': False, 'code': 400, 'msg': 'Invalid smart_lock_mac'}
+
+        return {'success': True, 'certificate': certificate}
+
+    async def _get_lock_rsa_key(self, smart_lock_MAC):
+        certificate = await self.fb_util.get_data(f'doors/{smart_lock_MAC}/certificate')
+
+        if not certificate:
+            with self._unknown_locks_lock:
+                self.unknown_locks[smart_lock_MAC] = True
+            return None
+
+        return _load_certificate_key(certificate)
+
+    def _is_unknown_lock(self, smart_lock_MAC):
+        with self._unknown_locks_lock:
+            return smart_lock_MAC in self.unknown_locks
+
+    async def _validate_signature_and_get_data_dict(self, args, remote_ip, rate_limiter=None):
+        error_response, data_dict = validate_signed_request(args)
+
+        if error_response:
+            return error_response, None
+
+        if rate_limiter is not None:
+            retry_after = rate_limiter.check(ip=remote_ip, lock=data_dict["smart_lock_MAC"])
+            if retry_after:
+                return rate_limited(retry_after), None
+
+        set_attributes(**{'lock.mac': data_dict["smart_lock_MAC"]})
+        add_log_fields(lock_mac=data_dict["smart_lock_MAC"])
+
+        if self._is_unknown_lock(data_dict["smart_lock_MAC"]):
+            return {'success': False, 'code': 404, 'msg': 'Unknown smart_lock_MAC'}, None
+
+        # timestamp and nonce are part of the signed data, so they are checked before, and recorded after, the
+        # signature
+        timestamp = data_dict.pop("timestamp", None)
+        nonce = data_dict.pop("nonce", None)
+        nonce_key = (data_dict["smart_lock_MAC"], nonce)
+
+        if timestamp is None and nonce is None and not REQUIRE_FRESH_SIGNED_REQUESTS:
+            nonce_key = None
+        elif not isinstance(timestamp, (int, float)) or not isinstance(nonce, str) or not nonce:
+            return {'success': False, 'code': 400, 'msg': 'Invalid timestamp or nonce'}, None
+        elif not self.nonce_cache.is_fresh(timestamp):
+            return {'success': False, 'code': 403, 'msg': 'Request expired'}, None
+        elif self.nonce_cache.contains(nonce_key, timestamp):
+            return {'success': False, 'code': 403, 'msg': 'Request already used'}, None
+
+        lock_key = await self._get_lock_rsa_key(data_dict["smart_lock_MAC"])
+
+        if not lock_key:
+            return {'success': False, 'code': 404, 'msg': 'Unknown smart_lock_MAC'}, None
+
+        if not await self.verify_signature(lock_key, args["data"], args["signature"]):
+            return {'success': False, 'code': 403, 'msg': 'Invalid signature'}, None
+
+        if nonce_key and not self.nonce_cache.check_and_add(nonce_key, timestamp):
+            return {'success': False, 'code': 403, 'msg': 'Request already used'}, None
+
+        return {'success': True}, data_dict
+
+    async def register_invite(self, args, remote_ip):
+        response, data_dict = await self._validate_signature_and_get_data_dict(args, remote_ip)
+
+        if not response['success']:
+            return response
+
+        _normalize_invite(data_dict)
+
+        invite_id = self.invite_id_pool.get()
+
+        _, ble_addr = await self.gather(self.fb_util.set_data(f"invites/{invite_id}", data_dict),
+                                        self.fb_util.get_data(f"doors/{data_dict['smart_lock_MAC']}/BLE"))
+        audit("invite_created", invite_hash=hash_id(invite_id), type=data_dict.get("type"))
+
+        invite_code = _get_invite_code(invite_id, data_dict["smart_lock_MAC"], ble_addr)
+
+        return {'success': True, 'inviteID': invite_code}
+
+    async def register_invites(self, args, remote_ip):
+        response, data_dict = await self._validate_signature_and_get_data_dict(args, remote_ip)
+
+        if not response['success']:
+            return response
+
+        invites = data_dict.get("invites")
+
+        if not invites or not isinstance(invites, list) or not all(isinstance(invite, dict) for invite in invites):
+            return {'success': False, 'code': 400, 'msg': 'Invalid invites'}
+
+        if len(invites) > MAX_INVITES_PER_BATCH:
+            return {'success': False, 'code': 400, 'msg': f'Too many invites. Max is {MAX_INVITES_PER_BATCH}'}
+
+        smart_lock_mac = data_dict["smart_lock_MAC"]
+
+        # every invite is bound to the lock that signed the batch
+        invite_ids = self.invite_id_pool.get_many(len(invites))
+        updates = {}
+        for invite_id, invite in zip(invite_ids, invites):
+            invite["smart_lock_MAC"] = smart_lock_mac
+            updates[f"invites/{invite_id}"] = _normalize_invite(invite)
+
+        _, ble_addr = await self.gather(self.fb_util.set_multiple_data(updates),
+                                        self.fb_util.get_data(f"doors/{smart_lock_mac}/BLE"))
+        for invite_id, invite in zip(invite_ids, invites):
+            audit("invite_created", invite_hash=hash_id(invite_id), type=invite.get("type"))
+
+        invite_codes = [_get_invite_code(invite_id, smart_lock_mac, ble_addr) for invite_id in invite_ids]
+
+        return {'success': True, 'inviteIDs': invite_codes}
+
+    def _get_response_signer(self):
+        if self._response_signer is None and SERVER_PRIVATE_KEY_FILE:
+            from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+
+            with self._response_signer_lock:
+                if self._response_signer is None:
+                    key_file = os.path.join(BASE_DIR, SERVER_PRIVATE_KEY_FILE)
+                    self._response_signer = ResponseSigner(RSA_Util(filename=key_file, backend=BACKEND_CRYPTOGRAPHY))
+        return self._response_signer
+
+    async def request_authorization(self, args, remote_ip):
+        response, data_dict = await self._validate_signature_and_get_data_dict(args, remote_ip,
+                                                                               self.authorization_limiter)
+
+        if not response['success']:
+            return response
+
+        mac = data_dict["smart_lock_MAC"]
+        phone_id = data_dict.get("phone_id")
+
+        if not phone_id or not mac:
+            return {'success': False, 'code': 400, 'msg': 'No phone_id or mac'}
+
+        if not is_valid_key(phone_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid phone_id'}
+
+        response, utc_offset = await self.gather(self.fb_util.get_data(f'authorizations/{mac}/{phone_id}'),
+                                                 self.fb_util.get_data(f'doors/{mac}/utc_offset'))
+
+        # Days and weekdays are the lock's days, utc_offset seconds east of UTC (see check_lock_registration_status).
+        # Expired authorizations are no longer returned, but only the invite sweeper removes them, well after the
+        # lock's own day is over.
+        local_days_known = is_valid_utc_offset(utc_offset)
+        now = time.time()
+        compiled = compile_authorization(response, utc_offset if local_days_known else 0)
+
+        if is_expired(compiled, now):
+            response = None
+
+        allowed, allowed_until = is_allowed(compiled, now), verdict_valid_until(compiled, now)
+        result = {'success': True, 'data': response, 'allowed': allowed, 'allowed_until': allowed_until}
+
+        # Without the lock's utc_offset a weekday or one-day verdict is on UTC days, off near midnight: it is only
+        # advisory and not signed. With a server key, locks act on the verdict in signed_data, not on the unsigned
+        # fields next to it.
+        signer = self._get_response_signer()
+        if uses_local_days(response) and not local_days_known:
+            result['advisory'] = True
+        elif signer is not None:
+            result['signed_data'], result['signature'] = await self.sign_authorization(signer, mac, phone_id, response,
+                                                                                       allowed, allowed_until, now)
+
+        return result
+
+    async def redeem_invite(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        invite_id = args.get("invite_id") if args.get("invite_id") else None
+        phone_id = args.get("phone_id") if args.get("phone_id") else None
+
+        master_key_encrypted_lock = args.get("master_key_encrypted_lock") if args.get(
+            "master_key_encrypted_lock") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not invite_id:
+            return {'success': False, 'code': 400, 'msg': 'No invite id'}
+
+        if not is_valid_key(invite_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid invite'}
+
+        return await self._redeem_invite_aux(claims, invite_id, phone_id, master_key_encrypted_lock)
+
+    async def redeem_user_invite(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        phone_id = args.get("phone_id") if args.get("phone_id") else None
+        lock_id = args.get("lock_id") if args.get("lock_id") else None
+        master_key_encrypted_lock = args.get("master_key_encrypted_lock") if args.get(
+            "master_key_encrypted_lock") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        if not phone_id:
+            return {'success': False, 'code': 403, 'msg': 'No Phone Id'}
+
+        if not lock_id:
+            return {'success': False, 'code': 400, 'msg': 'No lock id'}
+
+        if not is_valid_key(lock_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid lock id'}
+
+        if not master_key_encrypted_lock:
+            return {'success': False, 'code': 403, 'msg': 'No Master Key'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        saved_invite_id = await self.fb_util.get_data(f"users/{claims.get('uid')}/locks/{lock_id}/saved_invite")
+
+        if not saved_invite_id or not is_valid_key(saved_invite_id):
+            return {'success': False, 'code': 500, 'msg': 'Can\'t get user saved invite.'}
+
+        response = await self._redeem_invite_aux(claims, saved_invite_id, phone_id, master_key_encrypted_lock)
+
+        if response.get("success"):
+            await self.fb_util.delete_key(f"users/{claims.get('uid')}/locks/{lock_id}/saved_invite")
+
+        return response
+
+    async def _redeem_invite_aux(self, claims, invite_id, phone_id, master_key_encrypted_lock):
+        invite, phone_ids = await self.gather(self.fb_util.get_data(f"invites/{invite_id}"),
+                                              self.fb_util.get_data(f"users/{claims.get('uid')}/phone_ids"))
+
+        if not invite:
+            return {'success': False, 'code': 400, 'msg': 'Invalid invite'}
+
+        if _is_invite_expired(invite):
+            return {'success': False, 'code': 400, 'msg': 'Invite expired'}
+
+        if invite.get("email_locked") and invite.get("email_locked") != claims.get('email'):
+            return {'success': False, 'code': 403, 'msg': 'No permissions. This invite is user locked!'}
+
+        if phone_id not in (phone_ids or []):
+            return {'success': False, 'code': 403, 'msg': 'Invalid Phone Id!'}
+
+        # The checks above run on an unlocked read; claiming the invite is the only step that decides who redeems it.
+        # The in-process lock keeps requests of this worker off the database, the conditional delete covers other
+        # workers.
+        async with self.invite_lock(invite_id):
+            invite = await self.fb_util.claim_data(f"invites/{invite_id}")
+
+            if not invite:
+                return {'success': False, 'code': 400, 'msg': 'Invalid invite'}
+
+            authorization = {
+                "phone_id": phone_id,
+                "smart_lock_MAC": invite["smart_lock_MAC"],
+                "type": invite["type"],
+                "master_key_encrypted_lock": master_key_encrypted_lock
+            }
+
+            if invite["type"] == 2 or invite["type"] == 3:
+                authorization["valid_from"] = invite["valid_from"]
+                authorization["valid_until"] = invite["valid_until"]
+
+            if invite["type"] == 3:
+                authorization["weekdays"] = invite["weekdays"]
+
+            if invite["type"] == 4:
+                authorization["one_day"] = invite["one_day"]
+
+            try:
+                await self.fb_util.set_data(f"authorizations/{authorization['smart_lock_MAC']}/{phone_id}",
+                                            authorization)
+            except Exception:
+                # put the invite back so the redemption can be retried
+                await self.fb_util.set_data(f"invites/{invite_id}", invite)
+                raise
+
+        audit("invite_redeemed", invite_hash=hash_id(invite_id), lock_mac=invite["smart_lock_MAC"],
+              type=invite["type"])
+
+        # drop the saved_invite pointers other users kept for this invite
+        saves = await self.fb_util.get_data(f"invite_saves/{invite_id}")
+        await self.fb_util.set_multiple_data(invite_removal_updates(invite_id, saves))
+
+        return {'success': True}
+
+    async def save_user_invite(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        lock_id = args.get("lock_id") if args.get("lock_id") else None
+        invite_id = args.get("invite_id") if args.get("invite_id") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not invite_id:
+            return {'success': False, 'code': 400, 'msg': 'No invite id'}
+
+        if not lock_id:
+            return {'success': False, 'code': 400, 'msg': 'No lock id'}
+
+        if not is_valid_key(invite_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid invite'}
+
+        if not is_valid_key(lock_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid lock id'}
+
+        invite = await self.fb_util.get_data(f"invites/{invite_id}")
+
+        if not invite:
+            return {'success': False, 'code': 400, 'msg': 'Invalid invite'}
+
+        if _is_invite_expired(invite):
+            return {'success': False, 'code': 400, 'msg': 'Invite expired'}
+
+        if invite.get("email_locked") and invite.get("email_locked") != claims.get('email'):
+            return {'success': False, 'code': 403, 'msg': 'No permissions. This invite is user locked!'}
+
+        user_id = claims.get('uid')
+
+        await self.fb_util.set_multiple_data({
+            f"users/{user_id}/locks/{lock_id}/saved_invite": invite_id,
+            f"invite_saves/{invite_id}/{user_id}": lock_id
+        })
+
+        return {'success': True}
+
+    async def check_user_invite(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        lock_id = args.get("lock_id") if args.get("lock_id") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not lock_id:
+            return {'success': False, 'code': 400, 'msg': 'No lock id'}
+
+        if not is_valid_key(lock_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid lock id'}
+
+        saved_invite = await self.fb_util.get_data(f"users/{claims.get('uid')}/locks/{lock_id}/saved_invite")
+
+        return {'success': True, "got_invite": not not saved_invite}
+
+    async def get_user_locks(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        locks = await self.fb_util.get_data(f"users/{claims.get('uid')}/locks")
+
+        if not locks:
+            return {'success': True, 'locks': []}
+
+        return {'success': True, 'locks': list(locks.values())}
+
+    async def set_user_locks(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        lock = args.get("lock") if args.get("lock") else {}
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        user_id = claims.get('uid')
+
+        if not lock:
+            return {'success': False, 'code': 403, 'msg': 'Lock information not provided'}
+
+        lock["BLE"] = lock.get("BLE").upper() if lock.get("BLE") else ""
+        lock["MAC"] = lock.get("MAC").upper() if lock.get("MAC") else ""
+        lock["id"] = lock.get("id").upper() if lock.get("id") else ""
+
+        if not is_valid_key(lock["id"]):
+            return {'success': False, 'code': 400, 'msg': 'Invalid lock id'}
+
+        await self.fb_util.set_data(f"users/{user_id}/locks/{lock.get('id')}", lock)
+
+        return {'success': True}
+
+    async def delete_user_lock(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        lock_id = args.get("lock_id") if args.get("lock_id") else {}
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        if not lock_id:
+            return {'success': False, 'code': 400, 'msg': 'No Lock Id'}
+
+        if not is_valid_key(lock_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid Lock Id'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        user_id = claims.get('uid')
+
+        phone_ids = await self.fb_util.get_data(f"users/{user_id}/phone_ids")
+
+        if not phone_ids:
+            phone_ids = []
+
+        await self.gather(self.fb_util.delete_key(f"users/{user_id}/locks/{lock_id}"),
+                          *[self.fb_util.delete_key(f"authorizations/{lock_id}/{phone_id}") for phone_id in phone_ids])
+
+        return {'success': True}
+
+    async def get_lock_mac(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        ble_address = args.get("ble_address") if args.get("ble_address") else None
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        if not ble_address:
+            return {'success': False, 'code': 403, 'msg': 'No BLE address'}
+
+        if not await self.get_decoded_claims(id_token):
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        lock = await self.fb_util.get_data_where_child_equal_to(f"doors", "BLE", ble_address)
+
+        if not lock:
+            return {'success': False, 'code': 404, 'msg': f'Could not found Smart Lock with BLE address {ble_address}'}
+
+        return {'success': True, 'mac': lock["MAC"]}
+
+    async def remote_connection(self, args, remote_ip):
+        id_token = args.get("id_token") if args.get("id_token") else None
+        lock_id = args.get("lock_id") if args.get("lock_id") else None
+        msg = args.get("msg") if args.get("msg") else None
+        close = bool(args.get("close")) if args.get("close") else False
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        retry_after = self.remote_connection_limiter.check(ip=remote_ip, user=token_key(id_token),
+                                                           lock=lock_id if isinstance(lock_id, str) else None)
+        if retry_after:
+            return rate_limited(retry_after)
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims:
+            return {'success': False, 'code': 403, 'msg': 'Invalid Id Token'}
+
+        if not lock_id:
+            return {'success': False, 'code': 403, 'msg': 'No Lock id'}
+
+        if not is_valid_key(lock_id):
+            return {'success': False, 'code': 400, 'msg': 'Invalid Lock id'}
+
+        if not msg:
+            return {'success': False, 'code': 403, 'msg': 'No message'}
+
+        set_attributes(**{'lock.mac': lock_id})
+        add_log_fields(lock_mac=lock_id)
+
+        user_id = claims.get('uid')
+
+        lock = await self.fb_util.get_data(f"doors/{lock_id}")
+
+        if not lock:
+            return {'success': False, 'code': 404, 'msg': f'Could not found Smart Lock with id {lock_id}'}
+
+        if not lock.get("IP"):
+            return {'success': False, 'code': 500, 'msg': f'Smart Lock is not correctly registered in our systems.'}
+
+        lock_client = await self.lock_gateway.get_client((user_id, lock_id), lock.get("IP"))
+
+        if lock_client is None:
+            return {'success': False, 'code': 503, 'msg': 'Too many remote connections'}
+
+        response = await self.lock_gateway.send_msg((user_id, lock_id), lock_client, msg, close)
+
+        audit("remote_command", success=bool(response), close=close)
+
+        if response:
+            return {'success': True, 'response': response.decode()}
+        else:
+            return {'success': False, 'code': 500, 'msg': f'Error communicating with door.'}
+
+    # Admin routes
+
+    async def admin_profile(self, args, remote_ip):
+        # the collapsed stacks are in 'profile'; the front-ends send them as a text file
+        id_token = args.get("id_token") if args.get("id_token") else None
+        seconds = args.get("seconds") if args.get("seconds") else 10
+
+        if not id_token:
+            return {'success': False, 'code': 403, 'msg': 'No Id Token'}
+
+        claims = await self.get_decoded_claims(id_token)
+
+        if not claims or not claims.get("admin"):
+            return {'success': False, 'code': 403, 'msg': 'No permissions'}
+
+        if not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_PROFILE_SECONDS:
+            return {'success': False, 'code': 400, 'msg': f'seconds must be between 0 and {MAX_PROFILE_SECONDS}'}
+
+        collapsed = await self.profile(seconds)
+
+        if collapsed is None:
+            return {'success': False, 'code': 409, 'msg': 'A profile is already running'}
+
+        return {'success': True, 'profile': collapsed}
@@ -7,12 +7,24 @@ from Crypto.PublicKey import RSA
 from Crypto import Random
 
 from cryptography.x509 import load_pem_x509_certificate
-from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.exceptions import InvalidSignature
+
+BACKEND_PYCRYPTODOME = "pycryptodome"
+BACKEND_CRYPTOGRAPHY = "cryptography"
+
+# same parameters PyCryptodome uses by default: MGF1 with the message hash and a salt as long as the digest
+_PSS_PADDING = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=hashes.SHA256.digest_size)
+_OAEP_PADDING = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+
+
+def get_public_key_from_x509_cert(cert):
+    return load_pem_x509_certificate(cert.encode()).public_key()
 
 
 def get_rsa_key_from_x509_cert(cert):
-    cert_obj = load_pem_x509_certificate(cert.encode())
-    public_key_obj = cert_obj.public_key()
+    public_key_obj = get_public_key_from_x509_cert(cert)
 
     public_key = public_key_obj.public_bytes(
         encoding=serialization.Encoding.PEM,
@@ -22,9 +34,44 @@ def get_rsa_key_from_x509_cert(cert):
     return public_key
 
 
+# Object with a get_pem() method returning a new private key (e.g. key_pool.KeyPairPool), used by RSA_Util() when no
+# key is given. Without one, keys are generated synchronously.
+default_key_provider = None
+
+
+def set_default_key_provider(key_provider):
+    global default_key_provider
+    default_key_provider = key_provider
+
+
+def _load_cryptography_key(key_data):
+    if isinstance(key_data, str):
+        key_data = key_data.encode()
+
+    if b"PRIVATE KEY" in key_data:
+        return serialization.load_pem_private_key(key_data, password=None)
+    return serialization.load_pem_public_key(key_data)
+
+
 class RSA_Util:
-    def __init__(self, filename=None, key_str=None):
-        if filename:
+    def __init__(self, filename=None, key_str=None, backend=BACKEND_PYCRYPTODOME, key_obj=None, key_provider=None):
+        self.backend = backend
+
+        key_provider = key_provider or default_key_provider
+        if not filename and not key_str and not key_obj and key_provider:
+            key_str = key_provider.get_pem()
+
+        if backend == BACKEND_CRYPTOGRAPHY:
+            if key_obj:
+                self.key = key_obj
+            elif filename:
+                with open(filename, 'r') as file:
+                    self.key = _load_cryptography_key(file.read())
+            elif key_str:
+                self.key = _load_cryptography_key(key_str)
+            else:
+                self.key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        elif filename:
             with open(filename, 'r') as file:
                 key_data = file.read()
                 self.key = RSA.importKey(key_data)
@@ -33,13 +80,23 @@ class RSA_Util:
         else:
             random_generator = Random.new().read
             self.key = RSA.generate(2048, random_generator)
-            self.export_key_to_file("key")
+
+    def _is_private(self):
+        return isinstance(self.key, rsa.RSAPrivateKey)
 
     def get_public_key(self):
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            return self.key.public_key() if self._is_private() else self.key
         return self.key.publickey()
 
     def decrypt_msg(self, encrypted_msg_base64):
         encrypted_msg = base64.b64decode(encrypted_msg_base64)
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            try:
+                return self.key.decrypt(encrypted_msg, _OAEP_PADDING)
+            except:
+                return None
+
         cipher = PKCS1_OAEP.new(self.key, hashAlgo=SHA256)
         try:
             msg = cipher.decrypt(encrypted_msg)
@@ -48,6 +105,12 @@ class RSA_Util:
         return msg
 
     def encrypt_msg(self, plaintext):
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            try:
+                return base64.b64encode(self.get_public_key().encrypt(plaintext.encode(), _OAEP_PADDING))
+            except:
+                return None
+
         cipher = PKCS1_OAEP.new(self.key, hashAlgo=SHA256)
         try:
             encrypted = cipher.encrypt(plaintext.encode())
@@ -59,6 +122,13 @@ class RSA_Util:
     def is_signature_valid(self, msg, signature_b64):
         signature = base64.b64decode(signature_b64)
 
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            try:
+                self.get_public_key().verify(signature, msg.encode(), _PSS_PADDING, hashes.SHA256())
+                return True
+            except (InvalidSignature, ValueError):
+                return False
+
         h = SHA256.new(msg.encode())
         verifier = pss.new(self.key)
         try:
@@ -68,19 +138,42 @@ class RSA_Util:
             return False
 
     def sign(self, message):
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            return base64.b64encode(self.key.sign(message.encode(), _PSS_PADDING, hashes.SHA256()))
+
         signer = pss.new(self.key)
         digest = SHA256.new()
         digest.update(message.encode())
 
         return base64.b64encode(signer.sign(digest))
 
+    def _export_public_key(self, mode="PEM"):
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            if mode == "DER":
+                return self.get_public_key().public_bytes(encoding=serialization.Encoding.DER,
+                                                          format=serialization.PublicFormat.SubjectPublicKeyInfo)
+            # PyCryptodome writes PEM without the trailing newline
+            return self.get_public_key().public_bytes(encoding=serialization.Encoding.PEM,
+                                                      format=serialization.PublicFormat.SubjectPublicKeyInfo).rstrip()
+        return self.key.publickey().exportKey(mode)
+
     def get_public_key_base64(self, mode="DER"):
-        return base64.b64encode(self.key.publickey().exportKey(mode)).decode()
+        return base64.b64encode(self._export_public_key(mode)).decode()
 
     def export_public_key_to_file(self, filename):
         with open(filename, "wb") as file:
-            file.write(self.key.publickey().exportKey())
+            file.write(self._export_public_key())
 
     def export_key_to_file(self, filename):
+        if self.backend == BACKEND_CRYPTOGRAPHY:
+            if self._is_private():
+                key_data = self.key.private_bytes(encoding=serialization.Encoding.PEM,
+                                                  format=serialization.PrivateFormat.TraditionalOpenSSL,
+                                                  encryption_algorithm=serialization.NoEncryption()).rstrip()
+            else:
+                key_data = self._export_public_key()
+        else:
+            key_data = self.key.exportKey()
+
         with open(filename, "wb") as file:
-            file.write(self.key.exportKey())
+            file.write(key_data)
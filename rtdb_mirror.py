@@ -0,0 +1,294 @@
+import copy
+import os
+import socket
+import threading
+import time
+
+from logging_util import log_event
+from metrics_util import MIRROR_LAG, MIRROR_READS, MIRROR_RESYNCS
+
+# In-process copy of whole Realtime Database trees (e.g. doors, authorizations, invites), kept current by the
+# database's streaming API (Reference.listen), so reads of those trees need no database call. A listener starts with
+# the whole tree and gets it again after every reconnect, so opening a listener is also the resync. A supervisor
+# thread:
+#   - reopens the listeners whose stream has ended (firebase_admin stops listening when a reconnect fails);
+#   - every heartbeat_interval writes the time to mirror_heartbeats/<mirror id>, which it listens to as well. The time
+#     for the write to come back is the lag (rtdb_mirror_lag_seconds); while a heartbeat is outstanding the lag is
+#     the time since it was written. Past stale_after the streams, which share the connection and credentials, are
+#     taken to be stuck and all reopened.
+# A tree is read from the database until its listener has delivered the tree, and while the mirror is stale.
+
+HEARTBEAT_PATH = "mirror_heartbeats"
+
+# Seconds a lagging stream is still read from before the mirror counts as stale. A revoked authorization or deleted
+# invite written by another process can be read for up to this long.
+STALE_AFTER = float(os.environ.get("RTDB_MIRROR_STALE_AFTER", 30))
+
+
+def _split(path):
+    return [part for part in path.split("/") if part]
+
+
+def _prune(value):
+    # the Realtime Database does not keep empty objects
+    if isinstance(value, dict):
+        value = {key: _prune(child) for key, child in value.items()}
+        value = {key: child for key, child in value.items() if child is not None}
+        return value or None
+    return value
+
+
+def _set(node, parts, value):
+    # node after writing value at parts below it; None deletes and objects left empty are removed
+    if not parts:
+        return value
+    node = node if isinstance(node, dict) else {}
+    child = _set(node.get(parts[0]), parts[1:], value)
+    if child is None:
+        node.pop(parts[0], None)
+    else:
+        node[parts[0]] = child
+    return node or None
+
+
+class RtdbMirror:
+
+    def __init__(self, db, trees, heartbeat_interval=5, stale_after=STALE_AFTER, retry_interval=5):
+        self.db = db
+        self.trees = list(trees)
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.retry_interval = retry_interval
+        self.mirror_id = f"{socket.gethostname()}-{os.getpid()}".replace(".", "-")
+
+        self._data = {}
+        self._synced = set()
+        self._lock = threading.Lock()
+
+        self._listeners = {}
+        self._generations = {}
+        self._next_attempts = {}
+        self._failed = set()
+
+        self._last_heartbeat = 0
+        self._heartbeat_pending_since = None
+        self._last_round_trip = 0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def _heartbeat_path(self):
+        return f"{HEARTBEAT_PATH}/{self.mirror_id}"
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="rtdb-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # the firebase_admin listener threads are not daemons, a process only exits once they are closed
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        for path in list(self._listeners):
+            self._close(path)
+        try:
+            self.db.reference(HEARTBEAT_PATH).update({self.mirror_id: None})
+        except Exception:
+            pass
+
+    def lag(self, now=None):
+        now = now if now is not None else time.time()
+        if self._heartbeat_pending_since is not None:
+            return max(self._last_round_trip, now - self._heartbeat_pending_since)
+        return self._last_round_trip
+
+    def is_synced(self, tree):
+        return tree in self._synced and self.lag() <= self.stale_after
+
+    def _tree_of(self, parts):
+        if parts and parts[0] in self.trees:
+            return parts[0]
+        return None
+
+    # Reads, as (True, value) when the mirror has the answer and (False, None) when the database has to be asked
+
+    def get_data(self, path):
+        parts = _split(path)
+        tree = self._tree_of(parts)
+        if tree is None:
+            return False, None
+        if not self.is_synced(tree):
+            MIRROR_READS.labels(tree, "miss").inc()
+            return False, None
+
+        with self._lock:
+            node = self._data.get(tree)
+            for part in parts[1:]:
+                node = node.get(part) if isinstance(node, dict) else None
+            value = copy.deepcopy(node)
+
+        MIRROR_READS.labels(tree, "hit").inc()
+        return True, value
+
+    def get_data_where_child_equal_to(self, path, child, value):
+        # whole trees only (e.g. doors by BLE); the first match by key, like limit_to_first(1)
+        parts = _split(path)
+        tree = self._tree_of(parts)
+        if tree is None or len(parts) != 1:
+            return False, None
+        if not self.is_synced(tree):
+            MIRROR_READS.labels(tree, "miss").inc()
+            return False, None
+
+        with self._lock:
+            nodes = self._data.get(tree) or {}
+            key = min((key for key, node in nodes.items() if isinstance(node, dict) and node.get(child) == value),
+                      default=None)
+            result = {key: copy.deepcopy(nodes[key])} if key is not None else {}
+
+        MIRROR_READS.labels(tree, "hit").inc()
+        return True, result
+
+    # Writes made by this process, applied as soon as the database has taken them so the process reads its own
+    # writes; the stream's event for the write follows and sets the same value. Events are not ordered against these
+    # writes: an event from before the write that arrives after it puts the old value back until the write's event.
+
+    def apply_update(self, path, data):
+        for key, value in data.items():
+            self.apply_set(f"{path}/{key}", value)
+
+    def apply_set(self, path, value):
+        parts = _split(path)
+        tree = self._tree_of(parts)
+        if tree is not None:
+            with self._lock:
+                self._data[tree] = _set(self._data.get(tree), parts[1:], _prune(copy.deepcopy(value)))
+
+    # Listeners
+
+    def _apply_event(self, tree, event):
+        parts = _split(event.path)
+        with self._lock:
+            if event.event_type == "put":
+                self._data[tree] = _set(self._data.get(tree), parts, _prune(event.data))
+                if not parts:
+                    self._synced.add(tree)
+            elif event.event_type == "patch":
+                for key, value in event.data.items():
+                    self._data[tree] = _set(self._data.get(tree), parts + _split(key), _prune(value))
+
+    def _apply_heartbeat(self, event):
+        if event.event_type != "put" or _split(event.path) or not isinstance(event.data, (int, float)):
+            return
+
+        sent = self._heartbeat_pending_since
+        if sent is not None and event.data >= sent:
+            self._last_round_trip = time.time() - event.data
+            self._heartbeat_pending_since = None
+            MIRROR_LAG.set(self._last_round_trip)
+
+    def _open(self, path, on_event, now):
+        generation = self._generations.get(path, 0) + 1
+        self._generations[path] = generation
+
+        def callback(event):
+            # events still arriving from a listener that has been replaced are dropped
+            if self._generations.get(path) != generation:
+                return
+            try:
+                on_event(event)
+            except Exception as e:
+                log_event("rtdb_mirror", "event_failed", error=e, path=path)
+                self._synced.discard(path)
+                self._failed.add(path)
+
+        try:
+            self._listeners[path] = self.db.reference(path).listen(callback)
+        except Exception as e:
+            log_event("rtdb_mirror", "listen_failed", error=e, path=path)
+            self._next_attempts[path] = now + self.retry_interval
+            return
+
+        self._next_attempts[path] = 0
+
+    def _close(self, path):
+        self._generations[path] = self._generations.get(path, 0) + 1
+        self._synced.discard(path)
+        self._failed.discard(path)
+        listener = self._listeners.pop(path, None)
+        if listener is not None:
+            try:
+                listener.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(listener):
+        # ListenerRegistration keeps its thread to itself; the thread ends when the stream cannot reconnect
+        thread = getattr(listener, "_thread", None)
+        return thread is None or thread.is_alive()
+
+    def _resync(self, path, reason):
+        MIRROR_RESYNCS.labels(path if path in self.trees else HEARTBEAT_PATH, reason).inc()
+        self._close(path)
+
+    def check(self, now=None):
+        # one round of the supervisor: heartbeat, stale streams, ended listeners, (re)opening
+        now = now if now is not None else time.time()
+        paths = {tree: (lambda event, tree=tree: self._apply_event(tree, event)) for tree in self.trees}
+        paths[self._heartbeat_path] = self._apply_heartbeat
+
+        if self.lag(now) > self.stale_after:
+            for path in list(self._listeners):
+                self._resync(path, "stale")
+            self._heartbeat_pending_since = None
+
+        for path, listener in list(self._listeners.items()):
+            if path in self._failed:
+                self._resync(path, "error")
+            elif not self._is_alive(listener):
+                self._resync(path, "ended")
+
+        for path, on_event in paths.items():
+            if path not in self._listeners and self._next_attempts.get(path, 0) <= now:
+                self._open(path, on_event, now)
+
+        if now - self._last_heartbeat >= self.heartbeat_interval:
+            self._last_heartbeat = now
+            if self._heartbeat_pending_since is None:
+                self._heartbeat_pending_since = now
+            try:
+                self.db.reference(HEARTBEAT_PATH).update({self.mirror_id: now})
+            except Exception as e:
+                log_event("rtdb_mirror", "heartbeat_failed", error=e)
+
+        MIRROR_LAG.set(self.lag(now))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:
+                log_event("rtdb_mirror", "check_failed", error=e)
+            self._stop_event.wait(1)
+
+
+_mirrors = set()
+
+
+def start_mirror(db, trees, **kwargs):
+    mirror = RtdbMirror(db, trees, **kwargs)
+    mirror.start()
+    _mirrors.add(mirror)
+    return mirror
+
+
+def stop_mirrors():
+    for mirror in list(_mirrors):
+        mirror.stop()
+        _mirrors.discard(mirror)
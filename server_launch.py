@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Gunicorn settings for app:app, e.g. `gunicorn -c python:server_launch app:app`.
+# The preset is picked with SERVER_PRESET; WEB_CONCURRENCY and PORT override the worker count and port.
+
+# Workers write their Prometheus samples here and /metrics adds them up. prometheus_client reads this when it is first
+# imported, so it is set before importing anything from the app.
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                                    os.path.join(tempfile.gettempdir(), "smartlock_metrics"))
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+# Nonces of signed requests are shared by the workers through this file, so a request replayed to another worker is
+# rejected too (see nonce_cache)
+NONCE_DB = os.environ.setdefault("NONCE_DB", os.path.join(tempfile.gettempdir(), "smartlock_nonces.db"))
+
+INVITE_SWEEPER_LOCK_FILE = os.path.join(tempfile.gettempdir(), "smartlock_invite_sweeper.lock")
+
+from lock_client_util import LOCK_TIMEOUT
+
+# Throughput of the presets is measured by benchmarks/server_preset_benchmark.py, which keeps its last results
+DEFAULT_PRESET = "gthread"
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+# A remote-connection request can wait LOCK_TIMEOUT to connect and LOCK_TIMEOUT for the reply, plus its database calls
+REQUEST_TIMEOUT = 2 * LOCK_TIMEOUT + 24
+# Long enough for an in-flight lock exchange to finish on shutdown
+GRACEFUL_TIMEOUT = 2 * LOCK_TIMEOUT + 4
+
+COMMON_SETTINGS = {
+    "preload_app": True,
+    "max_requests": 10000,
+    "max_requests_jitter": 1000,
+    "timeout": REQUEST_TIMEOUT,
+    "graceful_timeout": GRACEFUL_TIMEOUT,
+    "keepalive": 5,
+}
+
+PRESETS = {
+    # one request at a time per process, as the Procfile used to run
+    "sync": {
+        "worker_class": "sync",
+        "workers": 2 * CPU_COUNT + 1,
+    },
+    # requests mostly wait on Firebase and lock sockets, threads share the process caches and pools
+    "gthread": {
+        "worker_class": "gthread",
+        "workers": CPU_COUNT + 1,
+        "threads": 16,
+    },
+    # the app is imported after gevent patches the worker, so it is not preloaded
+    "gevent": {
+        "worker_class": "gevent",
+        "workers": CPU_COUNT,
+        "worker_connections": 1000,
+        "preload_app": False,
+    },
+}
+
+
+def get_server_config(preset=None):
+    preset = preset or os.environ.get("SERVER_PRESET", DEFAULT_PRESET)
+
+    if preset not in PRESETS:
+        raise ValueError(f"Unknown server preset {preset!r}, expected one of {', '.join(PRESETS)}")
+
+    config = {**COMMON_SETTINGS, **PRESETS[preset]}
+    config["bind"] = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+    if os.environ.get("WEB_CONCURRENCY"):
+        config["workers"] = int(os.environ["WEB_CONCURRENCY"])
+
+    return config
+
+
+def on_starting(server):
+    # samples left by a previous run would be added to this one
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+
+def post_worker_init(worker):
+    import app
+    from profiler_util import install_signal_handler
+
+    # `kill -USR2 <worker pid>` profiles that worker, see profiler_util
+    install_signal_handler()
+
+    # every worker runs a sweeper thread, the one holding the lock of INVITE_SWEEPER_LOCK_FILE sweeps
+    app.start_invite_sweeper(lock_file=INVITE_SWEEPER_LOCK_FILE)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    import app
+    import logging_util
+    import rtdb_mirror
+
+    app.lock_gateway.close_all()
+
+    app.signature_verifier.close()
+
+    # database listeners of the RTDB mirror run on threads the worker would otherwise wait for
+    rtdb_mirror.stop_mirrors()
+
+    # access and audit records still queued
+    if logging_util.writer is not None:
+        logging_util.writer.flush()
+
+
+globals().update(get_server_config())
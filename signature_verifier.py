@@ -0,0 +1,153 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from metrics_util import timed
+from tracing_util import traced
+
+
+@lru_cache(maxsize=256)
+def _load_rsa_util(key_str, backend):
+    # imported on first verification, so importing this module does not load the crypto libraries
+    from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+
+    return RSA_Util(key_str=key_str, backend=backend or BACKEND_CRYPTOGRAPHY)
+
+
+def _get_rsa_util(key, backend):
+    # keys are PEM strings or cryptography public key objects (e.g. from get_public_key_from_x509_cert)
+    if isinstance(key, (str, bytes)):
+        return _load_rsa_util(key, backend)
+
+    from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+
+    return RSA_Util(key_obj=key, backend=BACKEND_CRYPTOGRAPHY)
+
+
+def _key_str(key):
+    # key objects cannot be pickled, the pool gets them as PEM
+    if isinstance(key, (str, bytes)):
+        return key
+
+    from cryptography.hazmat.primitives import serialization
+
+    return key.public_bytes(encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def _verify(key, msg, signature_b64, backend):
+    try:
+        return _get_rsa_util(key, backend).is_signature_valid(msg, signature_b64)
+    except Exception:
+        return False
+
+
+def _verify_batch(batch, backend):
+    return [_verify(key, msg, signature_b64, backend) for key, msg, signature_b64 in batch]
+
+
+def workers_from_env():
+    # SIGNATURE_VERIFIER_WORKERS=<n> verifies in a pool of n processes per web worker, "auto" in one process per CPU.
+    # Unset or 0, signatures are verified inline.
+    workers = os.environ.get("SIGNATURE_VERIFIER_WORKERS", "0")
+    return None if workers == "auto" else int(workers)
+
+
+class SignatureVerifier:
+    # Verifies RSA-PSS signatures, inline on the calling thread by default: with the cryptography backend a
+    # verification takes tens of microseconds. With max_workers (None for one per CPU) they run in a process pool
+    # instead, so they do not hold the GIL of the request threads; requests that arrive within batch_window of each
+    # other are sent to the pool together, up to max_batch_size per dispatch. backend defaults to the cryptography one.
+
+    def __init__(self, max_workers=0, max_batch_size=32, batch_window=0.002, backend=None):
+        self.max_workers = max_workers
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pool = None
+        self._pending = None
+        self._dispatcher = None
+
+    def verify(self, key, msg, signature_b64):
+        return self.verify_many([(key, msg, signature_b64)])[0]
+
+    @timed("rsa", "verify")
+    @traced("rsa.verify")
+    def verify_many(self, items):
+        if self.max_workers == 0:
+            return _verify_batch(items, self.backend)
+
+        pending = self._get_pending()
+        futures = []
+        for key, msg, signature_b64 in items:
+            future = Future()
+            pending.put(((_key_str(key), msg, signature_b64), future))
+            futures.append(future)
+
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            if self._pending and self._pid == os.getpid():
+                self._pending.put(None)
+                self._dispatcher.join()
+                self._pool.shutdown()
+            self._pid = None
+
+    def _get_pending(self):
+        # the pool and dispatcher thread are created lazily and again after a fork (e.g. gunicorn --preload)
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+                    self._pending = queue.SimpleQueue()
+                    self._dispatcher = threading.Thread(target=self._dispatch, args=(self._pending,),
+                                                        name="signature-verifier", daemon=True)
+                    self._dispatcher.start()
+                    self._pid = pid
+        return self._pending
+
+    def _dispatch(self, pending):
+        while True:
+            first = pending.get()
+            if first is None:
+                return
+
+            batch = [first]
+            while len(batch) < self.max_batch_size:
+                try:
+                    entry = pending.get(timeout=self.batch_window)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    pending.put(None)
+                    break
+                batch.append(entry)
+
+            self._submit(batch)
+
+    def _submit(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            pool_future = self._pool.submit(_verify_batch, items, self.backend)
+        except (BrokenProcessPool, RuntimeError):
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            pool_future = self._pool.submit(_verify_batch, items, self.backend)
+
+        def _done(done_future):
+            try:
+                results = done_future.result()
+            except Exception:
+                # a dead worker must not leave request threads waiting forever
+                results = _verify_batch(items, self.backend)
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+        pool_future.add_done_callback(_done)
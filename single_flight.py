@@ -0,0 +1,104 @@
+import asyncio
+import copy
+import threading
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one call: the first caller makes it and the others wait for its result,
+    # or its exception. Once several callers share a result each gets its own deep copy, so none can change what the
+    # others see. Nothing is kept after the call returns.
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        # Returns (result, shared), shared is True when other callers got the same result
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        try:
+            call.result = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                followers = call.followers
+            call.done.set()
+
+        if followers:
+            return copy.deepcopy(call.result), True
+        return call.result, False
+
+    def forget(self):
+        # calls from now on start afresh instead of joining the ones in flight, e.g. after a write
+        with self._lock:
+            self._calls.clear()
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class _AsyncCall:
+
+    def __init__(self, task):
+        self.task = task
+        self.followers = 0
+
+
+class AsyncSingleFlight:
+    # SingleFlight for coroutines on one event loop. The call runs as a task of its own, so a caller that is cancelled
+    # does not cancel it for the others.
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, *args):
+        # Returns (result, shared), like SingleFlight.do
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(func(*args)))
+            call.task.add_done_callback(lambda task: self._done(key, call))
+        else:
+            call.followers += 1
+
+        result = await asyncio.shield(call.task)
+
+        # the callers resume after _done, so nobody joins once they look at followers
+        if call.followers:
+            return copy.deepcopy(result), True
+        return result, False
+
+    def _done(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def forget(self):
+        self._calls.clear()
+
+    def __len__(self):
+        return len(self._calls)
@@ -7,8 +7,10 @@ import requests
 from firebase_admin import auth
 
 import rsa_util
-from app import app, create_fb_util, _get_lock_rsa_key
-from firebase_util import generate_random_id
+from app import app, create_fb_util, routes
+from firebase_util import generate_random_id, set_id_token_verifier
+from memory_firebase_util import MemoryFirebaseUtil, verify_test_id_token
+from rate_limit_util import MemoryBucketStore
 from rsa_util import RSA_Util
 from tests.firebase_util_for_tests import FirebaseUtilForTests
 
@@ -41,8 +43,13 @@ MfmAKSUHB7O9aWbdBsjO5b3tXHbk6p7J9nSEsXQ7Pn8KXqpVotuK
 -----END RSA PRIVATE KEY-----'''
 
 ONE_HOUR_IN_SEC = 60 * 60
+ONE_DAY_IN_SEC = 24 * ONE_HOUR_IN_SEC
 
 TEST_USER_UID = "abcde1234"
+TEST_USER_EMAIL = "python_test_user@test.com"
+
+# default id_token of _aux_test_redeem_invite, the test user's
+_TEST_USER_ID_TOKEN = object()
 
 
 def _get_test_user_id_token():
@@ -59,13 +66,19 @@ def _get_user_id_token(uid):
     return resp.json().get('idToken')
 
 
-class AppTestCase(unittest.TestCase):
-    fb_util = FirebaseUtilForTests()
-    create_fb_util(fb_util)
-    client = app.test_client()
-    rsa = RSA_Util(key_str=RSA_PRIV_KEY_STR)
+def verify_memory_id_token(id_token, **kwargs):
+    # ID tokens of the in-memory test cases ("token:<uid>", see memory_firebase_util); the test user has the email of
+    # the Firebase test user, which the user locked invites below name
+    claims = verify_test_id_token(id_token, **kwargs)
+    if claims['uid'] == TEST_USER_UID:
+        claims['email'] = TEST_USER_EMAIL
+    return claims
 
-    test_user_id_token = _get_test_user_id_token()
+
+class AppChecks:
+    # The checks of the app's routes. A test case provides client, a test client of the app, fb_util, the storage the
+    # app uses, read and written directly, and test_user_id_token, an ID token of TEST_USER_UID.
+    rsa = RSA_Util(key_str=RSA_PRIV_KEY_STR)
 
     def setUp(self):
         self.fb_util.delete_key("")
@@ -92,6 +105,21 @@ class AppTestCase(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.assertEqual(expected_response, response.json)
 
+    def test_livez(self):
+        response = self.client.get("/livez")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'success': True}, response.json)
+
+    def test_readyz(self):
+        response = self.client.get("/readyz")
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.json['success'])
+        self.assertTrue(response.json['storage']['ok'])
+        self.assertEqual(0, response.json['lock_gateway']['open_connections'])
+        self.assertIn('storage', response.json['latencies'])
+
     def test_get_all_icons(self):
         expected_response = {
             'icons': ['bed', 'briefcase', 'building', 'car-rear', 'car-side', 'car', 'caravan', 'computer', 'couch',
@@ -197,6 +225,24 @@ class AppTestCase(unittest.TestCase):
         self.assertEqual(self.door1, self.fb_util.get_data(f'doors/{self.door1["MAC"]}'))
         self.fb_util.delete_key(f'doors/{self.door1["MAC"]}')
 
+    def test_register_door_lock_utc_offset(self):
+        post_data = {
+            'MAC': self.door1['MAC'],
+            'BLE': self.door1['BLE'],
+            'certificate': self.door1['certificate'],
+            'utc_offset': 3600
+        }
+
+        response = self.client.post(f"/register-door-lock", json=post_data)
+
+        self.assertEqual({'success': True}, response.json)
+        self.assertEqual(3600, self.fb_util.get_data(f'doors/{self.door1["MAC"]}/utc_offset'))
+
+        response = self.client.post(f"/register-door-lock", json={**post_data, 'utc_offset': "UTC"})
+
+        self.assertEqual({'success': False, 'code': 400, 'msg': 'Invalid utc_offset.'}, response.json)
+        self.fb_util.delete_key(f'doors/{self.door1["MAC"]}')
+
     def test_register_door_lock_invalid_post_data(self):
         expected_response = {'success': False, 'code': 400, 'msg': 'Missing arguments.'}
 
@@ -416,14 +462,88 @@ class AppTestCase(unittest.TestCase):
         self.assertEqual({'success': False, 'code': 403, 'msg': 'Invalid signature'}, response.json)
         self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
 
+    def test_register_invites_ok(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+        invites = [
+            {
+                'type': 1,  # owner
+                'expiration': int(time.time()) + ONE_HOUR_IN_SEC
+            },
+            {
+                'type': 3,  # periodic_user
+                'expiration': int(time.time()) + ONE_HOUR_IN_SEC,
+                'weekdays_str': "234",
+                'valid_from': int(time.time()),
+                'valid_until': int(time.time()) + 30 * 24 + ONE_HOUR_IN_SEC
+            }
+        ]
+
+        data_str = json.dumps({'smart_lock_MAC': self.door1['MAC'], 'invites': invites})
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        response = self.client.post(f"/register-invites", json=post_data)
+
+        self.assertTrue(response.json['success'])
+        self.assertEqual(len(invites), len(response.json['inviteIDs']))
+
+        for invite, invite_code in zip(invites, response.json['inviteIDs']):
+            invite_id, mac, ble = base64.b64decode(invite_code).decode().split(" ")
+            self.assertEqual(self.door1['MAC'], mac)
+            self.assertEqual(self.door1['BLE'], ble)
+
+            invite['smart_lock_MAC'] = self.door1['MAC']
+            if invite.get("weekdays_str"):
+                invite["weekdays"] = [int(i) for i in invite["weekdays_str"]]
+                del invite["weekdays_str"]
+            self.assertEqual(invite, self.fb_util.get_data(f"invites/{invite_id}"))
+            self.fb_util.delete_key(f"invites/{invite_id}")
+
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
+    def test_register_invites_no_invites(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+
+        data_str = json.dumps({'smart_lock_MAC': self.door1['MAC'], 'invites': []})
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        response = self.client.post(f"/register-invites", json=post_data)
+
+        self.assertEqual({'success': False, 'code': 400, 'msg': 'Invalid invites'}, response.json)
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
+    def test_register_invites_invalid_signature(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+        invites = [{'type': 1, 'expiration': int(time.time()) + ONE_HOUR_IN_SEC}]
+
+        post_data = {
+            'signature': "INVALID SIGNATURE",
+            'data': json.dumps({'smart_lock_MAC': self.door1['MAC'], 'invites': invites})
+        }
+
+        response = self.client.post(f"/register-invites", json=post_data)
+
+        self.assertEqual({'success': False, 'code': 403, 'msg': 'Invalid signature'}, response.json)
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
     def _aux_test_redeem_invite(self,
                                 expected_response,
                                 invite=None,
                                 phone_id=generate_random_id(15),
                                 master_key="Xe3XKOcYrVHa4sUokx8lhrDDG2b1sgx1qc6F9++8R08=",
-                                id_token=_get_test_user_id_token(),
+                                id_token=_TEST_USER_ID_TOKEN,
                                 redeem_invite_id=None,
                                 redeem_phone_id=None):
+        if id_token is _TEST_USER_ID_TOKEN:
+            id_token = self.test_user_id_token
+
         post_data = {}
         invite_id = None
         if invite:
@@ -583,6 +703,18 @@ class AppTestCase(unittest.TestCase):
             redeem_invite_id="INVALID_INVITE_ID"
         )
 
+    def test_redeem_invite_invite_id_with_path(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+
+        self._aux_test_redeem_invite(
+            expected_response={'success': False, 'code': 400, 'msg': 'Invalid invite'},
+            redeem_invite_id=f"../doors/{self.door1['MAC']}",
+            invite={'smart_lock_MAC': self.door1['MAC'], 'type': 0, 'expiration': int(time.time()) + ONE_HOUR_IN_SEC}
+        )
+
+        self.assertEqual(self.door1, self.fb_util.get_data(f"doors/{self.door1['MAC']}"))
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
     def test_redeem_invite_invalid_phone_id(self):
         invite = {
             'smart_lock_MAC': self.door1['MAC'],
@@ -1189,12 +1321,117 @@ class AppTestCase(unittest.TestCase):
             'data': data_str
         }
 
-        expected_response = {'success': True, 'data': authorization}
+        expected_response = {'success': True, 'data': authorization, 'allowed': True, 'allowed_until': None}
         response = self.client.post('/request-authorization', json=post_data)
         self.assertEqual(expected_response, response.json)
         self.fb_util.delete_key(f'authorizations/{self.door1["MAC"]}/{phone_id}')
         self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
 
+    def _request_one_day_authorization(self, utc_offset=None):
+        door = dict(self.door1, utc_offset=utc_offset) if utc_offset is not None else self.door1
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", door)
+
+        phone_id = generate_random_id(15)
+        authorization = {'phone_id': phone_id, 'smart_lock_MAC': self.door1['MAC'], 'type': 4,
+                         'one_day': int(time.time()), 'master_key_encrypted_lock': "key"}
+        self.fb_util.set_data(f'authorizations/{self.door1["MAC"]}/{phone_id}', authorization)
+
+        data_str = json.dumps({'smart_lock_MAC': self.door1['MAC'], 'phone_id': phone_id})
+        post_data = {'signature': self.rsa.sign(data_str).decode(), 'data': data_str}
+        response = self.client.post('/request-authorization', json=post_data)
+
+        self.fb_util.delete_key(f'authorizations/{self.door1["MAC"]}')
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+        return response
+
+    def test_request_authorization_lock_days(self):
+        # the one day ends at the lock's midnight
+        now = int(time.time())
+        response = self._request_one_day_authorization(utc_offset=3600)
+
+        self.assertTrue(response.json['allowed'])
+        self.assertEqual(now - (now + 3600) % ONE_DAY_IN_SEC + ONE_DAY_IN_SEC, response.json['allowed_until'])
+        self.assertNotIn('advisory', response.json)
+
+    def test_request_authorization_lock_days_unknown(self):
+        # without the lock's utc_offset the verdict is on UTC days and only advisory
+        response = self._request_one_day_authorization()
+
+        self.assertTrue(response.json['allowed'])
+        self.assertTrue(response.json['advisory'])
+        self.assertNotIn('signature', response.json)
+
+    def test_request_authorization_replayed(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+
+        data = {
+            'smart_lock_MAC': self.door1['MAC'],
+            'phone_id': generate_random_id(15),
+            'timestamp': int(time.time()),
+            'nonce': generate_random_id(16)
+        }
+
+        data_str = json.dumps(data)
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        response = self.client.post('/request-authorization', json=post_data)
+        self.assertTrue(response.json['success'])
+
+        expected_response = {'success': False, 'code': 403, 'msg': 'Request already used'}
+        response = self.client.post('/request-authorization', json=post_data)
+        self.assertEqual(expected_response, response.json)
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
+    def test_request_authorization_expired(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+
+        data = {
+            'smart_lock_MAC': self.door1['MAC'],
+            'phone_id': generate_random_id(15),
+            'timestamp': int(time.time()) - ONE_HOUR_IN_SEC,
+            'nonce': generate_random_id(16)
+        }
+
+        data_str = json.dumps(data)
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        expected_response = {'success': False, 'code': 403, 'msg': 'Request expired'}
+        response = self.client.post('/request-authorization', json=post_data)
+        self.assertEqual(expected_response, response.json)
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
+    def test_request_authorization_unknown_lock(self):
+        data_str = json.dumps({'smart_lock_MAC': self.door2['MAC'], 'phone_id': generate_random_id(15)})
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        expected_response = {'success': False, 'code': 404, 'msg': 'Unknown smart_lock_MAC'}
+        response = self.client.post('/request-authorization', json=post_data)
+        self.assertEqual(expected_response, response.json)
+
+    def test_request_authorization_invalid_mac(self):
+        data_str = json.dumps({'smart_lock_MAC': "INVALID MAC", 'phone_id': generate_random_id(15)})
+
+        post_data = {
+            'signature': self.rsa.sign(data_str).decode(),
+            'data': data_str
+        }
+
+        expected_response = {'success': False, 'code': 400, 'msg': 'Invalid smart_lock_MAC'}
+        response = self.client.post('/request-authorization', json=post_data)
+        self.assertEqual(expected_response, response.json)
+
     def test_request_authorization_not_signed(self):
         self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
 
@@ -1332,6 +1569,15 @@ class AppTestCase(unittest.TestCase):
         response = self.client.get(f'check-lock-registration-status?MAC={self.door1["MAC"]}')
         self.assertEqual(expected_response, response.json)
 
+    def test_check_lock_registration_status_utc_offset(self):
+        self.fb_util.set_data(f"doors/{self.door1['MAC']}", self.door1)
+
+        response = self.client.get(f'/check-lock-registration-status?MAC={self.door1["MAC"]}&utc_offset=-7200')
+
+        self.assertEqual({'success': True, 'status': 1}, response.json)
+        self.assertEqual(-7200, self.fb_util.get_data(f"doors/{self.door1['MAC']}/utc_offset"))
+        self.fb_util.delete_key(f"doors/{self.door1['MAC']}")
+
     def test_check_lock_registration_status_no_mac(self):
         expected_response = {'success': False, 'code': 400, 'msg': 'Missing argument MAC.'}
         response = self.client.get(f'check-lock-registration-status')
@@ -1649,5 +1895,38 @@ class AppTestCase(unittest.TestCase):
         self.assertEqual(expected_response, response.json)
 
 
+
+class AppTestCase(AppChecks, unittest.TestCase):
+    # the Flask app on the Firebase project of CREDENTIALS_FILE
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fb_util = FirebaseUtilForTests()
+        create_fb_util(cls.fb_util)
+        cls.client = app.test_client()
+        cls.test_user_id_token = _get_test_user_id_token()
+
+
+class TestAppMemoryMethods(AppChecks, unittest.TestCase):
+    # the Flask app on the in-memory backend
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fb_util = MemoryFirebaseUtil()
+        create_fb_util(cls.fb_util)
+        set_id_token_verifier(verify_memory_id_token)
+        cls.client = app.test_client()
+        cls.test_user_id_token = f"token:{TEST_USER_UID}"
+
+    @classmethod
+    def tearDownClass(cls):
+        set_id_token_verifier(None)
+
+    def setUp(self):
+        super().setUp()
+        # every check starts with full request-authorization buckets
+        routes.authorization_limiter.bucket_store = MemoryBucketStore()
+
+
 if __name__ == "__main__":
     unittest.main()
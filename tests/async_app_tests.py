@@ -0,0 +1,94 @@
+import asyncio
+import json
+import unittest
+
+from app_tests import AppChecks, TEST_USER_UID, verify_memory_id_token
+from async_app import app, create_fb_util, routes
+from async_firebase_util import AsyncFirebaseUtil
+from firebase_util import set_id_token_verifier
+from memory_firebase_util import MemoryFirebaseUtil, MemoryCredential, memory_rest_transport
+from rate_limit_util import MemoryBucketStore
+
+
+class _Response:
+    # the parts of a Flask test response the checks read, from a Quart one
+
+    def __init__(self, response, data):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.mimetype = response.mimetype
+        self.data = data
+        self.json = json.loads(data) if response.mimetype == "application/json" else None
+
+    @property
+    def text(self):
+        return self.data.decode()
+
+
+class _Client:
+    # Quart test client with the synchronous interface of Flask's, run on the test case's event loop, requests coming
+    # from 127.0.0.1 like Flask's; fetch() is the coroutine for requests that run together
+
+    def __init__(self, client, loop):
+        self.client = client
+        self.loop = loop
+
+    def get(self, path, **kwargs):
+        return self.loop.run_until_complete(self.fetch("GET", path, **kwargs))
+
+    def post(self, path, **kwargs):
+        return self.loop.run_until_complete(self.fetch("POST", path, **kwargs))
+
+    async def fetch(self, method, path, **kwargs):
+        response = await self.client.open("/" + path.lstrip("/"), method=method,
+                                         scope_base={'client': ("127.0.0.1", 0)}, **kwargs)
+        return _Response(response, await response.get_data())
+
+
+class TestAsyncAppMethods(AppChecks, unittest.TestCase):
+    # async_app on the in-memory backend, reached over the REST API AsyncFirebaseUtil uses
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.fb_util = MemoryFirebaseUtil()
+        create_fb_util(AsyncFirebaseUtil(credential=MemoryCredential(), transport=memory_rest_transport(cls.fb_util)))
+        set_id_token_verifier(verify_memory_id_token)
+
+        cls.test_app = app.test_app()
+        cls.loop.run_until_complete(cls.test_app.startup())
+        cls.client = _Client(cls.test_app.test_client(), cls.loop)
+        cls.test_user_id_token = f"token:{TEST_USER_UID}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.run_until_complete(cls.test_app.shutdown())
+        cls.loop.close()
+        set_id_token_verifier(None)
+
+    def setUp(self):
+        super().setUp()
+        # every check starts with full request-authorization buckets
+        routes.authorization_limiter.bucket_store = MemoryBucketStore()
+
+    def test_concurrent_redeems_of_one_invite(self):
+        # only one of the redeems that run together gets the authorization
+        self.fb_util.set_data("invites/i1", {'smart_lock_MAC': self.door1['MAC'], 'type': 1,
+                                             'expiration': 2 ** 40})
+        self.fb_util.set_data(f"users/{TEST_USER_UID}", {'phone_ids': ["p1"]})
+        post_data = {'id_token': self.test_user_id_token, 'invite_id': "i1", 'phone_id': "p1",
+                     'master_key_encrypted_lock': "key"}
+
+        async def redeem_all():
+            return await asyncio.gather(*[self.client.fetch("POST", "/redeem-invite", json=post_data)
+                                          for _ in range(5)])
+
+        responses = self.loop.run_until_complete(redeem_all())
+
+        self.assertEqual(1, sum(response.json['success'] for response in responses))
+        self.assertIsNone(self.fb_util.get_data("invites/i1"))
+        self.assertEqual("p1", self.fb_util.get_data(f"authorizations/{self.door1['MAC']}/p1/phone_id"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import time
+import unittest
+
+from async_firebase_util import AsyncFirebaseUtil
+from memory_firebase_util import MemoryFirebaseUtil, MemoryDb, MemoryCredential, memory_rest_transport
+
+
+class _CountingStore(MemoryFirebaseUtil):
+    # counts the reads the REST API answers
+
+    def __init__(self, data=None):
+        super().__init__(data)
+        self.reads = 0
+
+    def get_data(self, path):
+        self.reads += 1
+        return super().get_data(path)
+
+
+def _fb_util(store, latency=0, **kwargs):
+    return AsyncFirebaseUtil(credential=MemoryCredential(), transport=memory_rest_transport(store, latency), **kwargs)
+
+
+class TestAsyncFirebaseUtilMethods(unittest.TestCase):
+
+    def test_reads_and_writes(self):
+        store = MemoryFirebaseUtil({'doors': {'AA': {'MAC': "AA", 'BLE': "BB"}},
+                                    'invites': {'i1': {'expiration': 30}, 'i2': {'expiration': 10}}})
+
+        async def run():
+            fb_util = _fb_util(store)
+            try:
+                await fb_util.set_data("doors/AA", {'IP': "127.0.0.1"})
+                self.assertEqual(await fb_util.get_data("doors/AA"), {'MAC': "AA", 'BLE': "BB", 'IP': "127.0.0.1"})
+                self.assertIsNone(await fb_util.get_data("doors/CC"))
+                self.assertEqual(await fb_util.get_data_where_child_equal_to("doors", "BLE", "BB"),
+                                 {'AA': {'MAC': "AA", 'BLE': "BB", 'IP': "127.0.0.1"}})
+                self.assertEqual(list(await fb_util.get_data_where_child_between("invites", "expiration", 0, 25, 10)),
+                                 ["i2"])
+
+                await fb_util.set_multiple_data({"invites/i2": None, "users/u1/locks/AA/id": "AA"})
+                await fb_util.delete_key("doors/AA")
+            finally:
+                await fb_util.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(store.get_data(""), {'invites': {'i1': {'expiration': 30}},
+                                              'users': {'u1': {'locks': {'AA': {'id': "AA"}}}}})
+
+    def test_paths_cannot_leave_their_segments(self):
+        # "..", "?" and the other characters firebase_admin rejects would address another path in the URL
+        store = MemoryFirebaseUtil({'doors': {'AA': {'MAC': "AA"}}, 'invites': {'i1': {'type': 1}}})
+
+        async def run():
+            fb_util = _fb_util(store)
+            try:
+                for path in ["invites/../doors/AA", "invites/..", "invites/i1?x=1", "invites/i1#", "invites/$i1",
+                             "invites/[i1]"]:
+                    with self.assertRaises(ValueError):
+                        await fb_util.claim_data(path)
+                    with self.assertRaises(ValueError):
+                        await fb_util.get_data(path)
+
+                # other characters are percent-encoded into a single segment
+                await fb_util.set_data("users/a b%2Fc", {'username': "user1"})
+                self.assertEqual(await fb_util.get_data("users/a b%2Fc/username"), "user1")
+            finally:
+                await fb_util.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(store.get_data("doors/AA"), {'MAC': "AA"})
+        self.assertEqual(store.get_data("invites/i1"), {'type': 1})
+        self.assertEqual(store.get_data("users"), {'a b%2Fc': {'username': "user1"}})
+
+    def test_claim_data_has_one_winner(self):
+        store = MemoryFirebaseUtil({'invites': {'i1': {'type': 1}}})
+
+        async def run():
+            fb_util = _fb_util(store, latency=0.01)
+            try:
+                return await asyncio.gather(*[fb_util.claim_data("invites/i1") for _ in range(5)])
+            finally:
+                await fb_util.close()
+
+        results = asyncio.run(run())
+
+        self.assertEqual([result for result in results if result is not None], [{'type': 1}])
+        self.assertIsNone(store.get_data("invites/i1"))
+
+    def test_concurrent_reads_are_coalesced(self):
+        store = _CountingStore({'doors': {'AA': {'MAC': "AA"}}})
+
+        async def run():
+            fb_util = _fb_util(store, latency=0.05)
+            try:
+                results = await asyncio.gather(*[fb_util.get_data("doors/AA") for _ in range(8)])
+                # a write lets the next read through
+                await fb_util.set_data("doors/AA", {'BLE': "BB"})
+                results.append(await fb_util.get_data("doors/AA"))
+                return results
+            finally:
+                await fb_util.close()
+
+        results = asyncio.run(run())
+
+        self.assertEqual(results, [{'MAC': "AA"}] * 8 + [{'MAC': "AA", 'BLE': "BB"}])
+        self.assertEqual(store.reads, 2)
+        results[0]['MAC'] = "CC"
+        self.assertEqual(results[1]['MAC'], "AA")
+
+    def test_mirrored_reads(self):
+        db = MemoryDb()
+        store = db.store = _CountingStore({'doors': {'AA': {'MAC': "AA", 'BLE': "BB"}},
+                                           'users': {'u1': {'username': "user1"}}})
+
+        async def run():
+            fb_util = _fb_util(store, mirror_trees=["doors"], mirror_db=db)
+            try:
+                deadline = time.time() + 5
+                while not fb_util.mirror.is_synced("doors"):
+                    self.assertLess(time.time(), deadline)
+                    await asyncio.sleep(0.005)
+                reads = store.reads
+
+                self.assertEqual(await fb_util.get_data("doors/AA"), {'MAC': "AA", 'BLE': "BB"})
+                self.assertEqual(await fb_util.get_data_where_child_equal_to("doors", "BLE", "BB"),
+                                 {'AA': {'MAC': "AA", 'BLE': "BB"}})
+                self.assertEqual(store.reads, reads)
+
+                # the process reads its own writes
+                await fb_util.delete_key("doors/AA")
+                self.assertIsNone(await fb_util.get_data("doors/AA"))
+
+                self.assertEqual(await fb_util.get_data("users/u1/username"), "user1")
+                self.assertEqual(store.reads, reads + 1)
+            finally:
+                await fb_util.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from authorization_util import compile_authorization, is_allowed, is_expired, verdict_valid_until, uses_local_days
+
+ONE_DAY_IN_SEC = 24 * 60 * 60
+
+# Monday 2022-05-02 00:00:00 UTC
+MONDAY = 1651449600
+
+
+class TestAuthorizationUtilMethods(unittest.TestCase):
+
+    def test_admin_always_allowed(self):
+        compiled = compile_authorization({'type': 0})
+
+        self.assertTrue(is_allowed(compiled, MONDAY))
+        self.assertFalse(is_expired(compiled, MONDAY))
+        self.assertEqual(verdict_valid_until(compiled, MONDAY), None)
+
+    def test_tenant_window(self):
+        compiled = compile_authorization({'type': 2, 'valid_from': MONDAY, 'valid_until': MONDAY + ONE_DAY_IN_SEC})
+
+        self.assertFalse(is_allowed(compiled, MONDAY - 1))
+        self.assertEqual(verdict_valid_until(compiled, MONDAY - 1), MONDAY)
+        self.assertTrue(is_allowed(compiled, MONDAY + 10))
+        self.assertEqual(verdict_valid_until(compiled, MONDAY + 10), MONDAY + ONE_DAY_IN_SEC)
+        self.assertFalse(is_allowed(compiled, MONDAY + ONE_DAY_IN_SEC))
+        self.assertTrue(is_expired(compiled, MONDAY + ONE_DAY_IN_SEC))
+
+    def test_periodic_user_weekdays(self):
+        authorization = {
+            'type': 3,
+            'weekdays': [1, 2],  # Tuesday and Wednesday
+            'valid_from': MONDAY,
+            'valid_until': MONDAY + 14 * ONE_DAY_IN_SEC
+        }
+        compiled = compile_authorization(authorization)
+
+        self.assertFalse(is_allowed(compiled, MONDAY + 60))
+        self.assertEqual(verdict_valid_until(compiled, MONDAY + 60), MONDAY + ONE_DAY_IN_SEC)
+        self.assertTrue(is_allowed(compiled, MONDAY + ONE_DAY_IN_SEC + 60))
+        self.assertTrue(is_allowed(compiled, MONDAY + 2 * ONE_DAY_IN_SEC + 60))
+        self.assertEqual(verdict_valid_until(compiled, MONDAY + ONE_DAY_IN_SEC), MONDAY + 3 * ONE_DAY_IN_SEC)
+        self.assertFalse(is_allowed(compiled, MONDAY + 3 * ONE_DAY_IN_SEC + 60))
+
+    def test_one_time_user_day(self):
+        compiled = compile_authorization({'type': 4, 'one_day': MONDAY + 12 * 60 * 60})
+
+        self.assertTrue(is_allowed(compiled, MONDAY))
+        self.assertTrue(is_allowed(compiled, MONDAY + ONE_DAY_IN_SEC - 1))
+        self.assertFalse(is_allowed(compiled, MONDAY + ONE_DAY_IN_SEC))
+        self.assertTrue(is_expired(compiled, MONDAY + ONE_DAY_IN_SEC))
+
+    def test_one_time_user_day_with_utc_offset(self):
+        compiled = compile_authorization({'type': 4, 'one_day': MONDAY}, utc_offset=60 * 60)
+
+        self.assertTrue(is_allowed(compiled, MONDAY - 60))
+        self.assertFalse(is_allowed(compiled, MONDAY + ONE_DAY_IN_SEC))
+
+    def test_uses_local_days(self):
+        self.assertFalse(uses_local_days({'type': 0}))
+        self.assertFalse(uses_local_days({'type': 2, 'valid_from': 0, 'valid_until': 10}))
+        self.assertTrue(uses_local_days({'type': 3, 'weekdays': [0]}))
+        self.assertTrue(uses_local_days({'type': 4, 'one_day': MONDAY}))
+        self.assertFalse(uses_local_days(None))
+
+    def test_malformed_authorization(self):
+        compiled = compile_authorization({'type': 2})
+
+        self.assertEqual(compiled, None)
+        self.assertFalse(is_allowed(compiled, MONDAY))
+        self.assertFalse(is_expired(compiled, MONDAY))
+
+    def test_no_authorization(self):
+        self.assertFalse(is_allowed(compile_authorization(None), MONDAY))
+
+
+if __name__ == '__main__':
+    unittest.main()
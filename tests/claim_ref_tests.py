@@ -0,0 +1,63 @@
+import unittest
+
+from firebase_util import _claim_ref, _delete_ref_if
+
+
+class _ConditionalRef:
+    # firebase_admin.db.Reference get(etag=True) and set_if_unchanged(), including its refusal of None. The first
+    # conditional write loses to a concurrent change when changed_by_other is set.
+
+    def __init__(self, value, changed_by_other=None):
+        self.value = value
+        self.etag = 0
+        self.changed_by_other = changed_by_other
+
+    def get(self, etag=False):
+        return self.value, str(self.etag)
+
+    def set_if_unchanged(self, expected_etag, value):
+        if value is None:
+            raise ValueError('Value must not be none.')
+        if self.changed_by_other is not None:
+            self.value, self.changed_by_other = self.changed_by_other, None
+            self.etag += 1
+        if expected_etag != str(self.etag):
+            return False, self.value, str(self.etag)
+        self.value = value or None
+        self.etag += 1
+        return True, value, str(self.etag)
+
+
+class TestClaimRefMethods(unittest.TestCase):
+
+    def test_claim_ref(self):
+        ref = _ConditionalRef({'type': 1})
+
+        self.assertEqual(_claim_ref(ref), {'type': 1})
+        self.assertIsNone(ref.value)
+        self.assertIsNone(_claim_ref(ref))
+
+    def test_claim_ref_retries_changed_value(self):
+        ref = _ConditionalRef({'type': 1}, changed_by_other={'type': 2})
+
+        self.assertEqual(_claim_ref(ref), {'type': 2})
+        self.assertIsNone(ref.value)
+
+    def test_delete_ref_if(self):
+        ref = _ConditionalRef({'type': 1})
+
+        self.assertIsNone(_delete_ref_if(ref, lambda data: data['type'] == 2))
+        self.assertEqual(ref.value, {'type': 1})
+        self.assertEqual(_delete_ref_if(ref, lambda data: data['type'] == 1), {'type': 1})
+        self.assertIsNone(ref.value)
+
+    def test_delete_ref_if_rechecks_changed_value(self):
+        # the value written in between no longer meets the condition, it is kept
+        ref = _ConditionalRef({'type': 1}, changed_by_other={'type': 2})
+
+        self.assertIsNone(_delete_ref_if(ref, lambda data: data['type'] == 1))
+        self.assertEqual(ref.value, {'type': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,7 @@
-import firebase_admin
-from firebase_admin import credentials, db
+from firebase_admin import db
 import string
 
-from firebase_util import generate_random_id
+from firebase_util import generate_random_id, _claim_ref, _delete_ref_if, get_firebase_app
 
 characters = string.ascii_letters + string.digits
 
@@ -15,10 +14,7 @@ ID_TOKEN_NOT_VALID = "ID_TOKEN_NOT_VALID"
 class FirebaseUtilForTests:
 
     def __init__(self):
-        _cred = credentials.Certificate("firebase_credentials.json")
-        firebase_admin.initialize_app(_cred, {
-            'databaseURL': 'https://smartdoorlock-16418-default-rtdb.europe-west1.firebasedatabase.app'
-        })
+        get_firebase_app()
 
         self.db = db
 
@@ -31,11 +27,24 @@ class FirebaseUtilForTests:
         ref.update(data)
         return True
 
+    def set_multiple_data(self, data_by_path):
+        ref = self.db.reference(TEST_ENV_PATH)
+        ref.update(data_by_path)
+        return True
+
     def delete_key(self, path):
         ref = self.db.reference(TEST_ENV_PATH + path)
         ref.delete()
         return True
 
+    def claim_data(self, path):
+        ref = self.db.reference(TEST_ENV_PATH + path)
+        return _claim_ref(ref)
+
+    def delete_data_if(self, path, condition):
+        ref = self.db.reference(TEST_ENV_PATH + path)
+        return _delete_ref_if(ref, condition)
+
     def add_data_to_path(self, path, data):
         ref = self.db.reference(f"{TEST_ENV_PATH}{path}/{generate_random_id(8)}")
         ref.update(data)
@@ -45,6 +54,12 @@ class FirebaseUtilForTests:
         ref = self.db.reference(TEST_ENV_PATH + path)
         return ref.order_by_child(child).equal_to(value).limit_to_first(1).get()
 
+    def get_data_where_child_between(self, path, child, start, end, limit):
+        query = self.db.reference(TEST_ENV_PATH + path).order_by_child(child)
+        if start is not None:
+            query = query.start_at(start)
+        return query.end_at(end).limit_to_first(limit).get()
+
     def set_random_username(self, user_id):
         ref = self.db.reference(f"{TEST_ENV_PATH}users/{user_id}")
         username = generate_random_id(15)
@@ -44,6 +44,30 @@ class TestFirebaseUtilMethods(unittest.TestCase):
         self.fb_util.delete_key(f"path/key")
         self.assertEqual(self.fb_util.get_data(f"path/key"), None)
 
+    def test_claim_data_ok(self):
+        data = {
+            'arg_string': "string",
+            'arg_bool': False,
+            'arg_int': 1,
+            'arg_float': 0.5,
+        }
+
+        self.fb_util.set_data("path/key", data)
+        self.assertEqual(self.fb_util.claim_data("path/key"), data)
+        self.assertEqual(self.fb_util.get_data("path/key"), None)
+
+    def test_claim_data_already_claimed(self):
+        data = {
+            'arg_string': "string",
+            'arg_bool': False,
+            'arg_int': 1,
+            'arg_float': 0.5,
+        }
+
+        self.fb_util.set_data("path/key", data)
+        self.fb_util.claim_data("path/key")
+        self.assertEqual(self.fb_util.claim_data("path/key"), None)
+
     def test_add_data_to_path_ok(self):
         data = {
             'arg_string': "string",
@@ -56,6 +80,15 @@ class TestFirebaseUtilMethods(unittest.TestCase):
         self.assertEqual(list(self.fb_util.get_data("path").values())[0], data)
         self.fb_util.delete_key(f"path")
 
+    def test_get_data_where_child_between_ok(self):
+        self.fb_util.set_data("path/key1", {'arg_int': 1})
+        self.fb_util.set_data("path/key2", {'arg_int': 5})
+        self.fb_util.set_data("path/key3", {'arg_int': 10})
+
+        self.assertEqual(self.fb_util.get_data_where_child_between("path", "arg_int", 0, 5, 10),
+                         {'key1': {'arg_int': 1}, 'key2': {'arg_int': 5}})
+        self.fb_util.delete_key(f"path")
+
     # def test_get_data_where_child_equal_to_ok(self):
     #     data = {
     #         'arg_string': "string",
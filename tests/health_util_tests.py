@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from health_util import LatencyTracker, CachedProbe
+
+NOW = 1651449600
+
+
+class TestHealthUtilMethods(unittest.TestCase):
+
+    def test_latency_summary(self):
+        tracker = LatencyTracker(window=100)
+
+        for i in range(1, 101):
+            tracker.record("storage", i / 1000)
+
+        summary = tracker.summary()["storage"]
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["p50_ms"], 51)
+        self.assertEqual(summary["p99_ms"], 100)
+        self.assertEqual(summary["max_ms"], 100)
+
+    def test_latency_window(self):
+        tracker = LatencyTracker(window=10)
+
+        for i in range(100):
+            tracker.record("storage", i)
+
+        self.assertEqual(tracker.summary()["storage"]["count"], 10)
+
+    def test_timed(self):
+        tracker = LatencyTracker()
+
+        with self.assertRaises(ValueError):
+            with tracker.timed("token_verification"):
+                raise ValueError()
+
+        self.assertEqual(tracker.summary()["token_verification"]["count"], 1)
+
+    def test_probe_cached(self):
+        calls = []
+        probe = CachedProbe("storage", lambda: calls.append(1), interval=10)
+
+        self.assertTrue(probe.check(now=NOW)["ok"])
+        self.assertTrue(probe.check(now=NOW + 5)["ok"])
+        self.assertEqual(len(calls), 1)
+
+        probe.check(now=NOW + 10)
+        self.assertEqual(len(calls), 2)
+
+    def test_probe_failure(self):
+        def fail():
+            raise ConnectionError()
+
+        result = CachedProbe("storage", fail).check(now=NOW)
+
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["error"], "ConnectionError")
+
+    def test_probe_too_slow(self):
+        result = CachedProbe("storage", lambda: None, max_latency=-1).check(now=NOW)
+
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["error"], "Too slow")
+
+    def test_probe_not_blocking_while_running(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+
+        probe = CachedProbe("storage", slow)
+        thread = threading.Thread(target=probe.check, kwargs={"now": NOW})
+        thread.start()
+        started.wait()
+
+        self.assertFalse(probe.check(now=NOW)["ok"])
+
+        release.set()
+        thread.join()
+        self.assertTrue(probe.check(now=NOW)["ok"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from id_util import IdPool, URL_SAFE_ALPHABET, generate_id, generate_ids
+
+
+class TestIdUtilMethods(unittest.TestCase):
+
+    def test_generate_id_length(self):
+        rand_id = generate_id(32)
+
+        self.assertIsInstance(rand_id, str)
+        self.assertEqual(len(rand_id), 32)
+
+    def test_generate_id_n_equal_to_0(self):
+        self.assertEqual(generate_id(0), "")
+
+    def test_generate_id_negative_n(self):
+        self.assertEqual(generate_id(-1), "")
+
+    def test_generate_id_custom_alphabet(self):
+        rand_id = generate_id(1000, "ab")
+
+        self.assertEqual(set(rand_id), {"a", "b"})
+
+    def test_generate_id_url_safe_alphabet(self):
+        rand_id = generate_id(1000, URL_SAFE_ALPHABET)
+
+        self.assertTrue(set(rand_id) <= set(URL_SAFE_ALPHABET))
+
+    def test_generate_id_invalid_alphabet(self):
+        self.assertRaises(ValueError, generate_id, 10, "a")
+        self.assertRaises(ValueError, generate_id, 10, "aab")
+
+    def test_generate_ids(self):
+        ids = generate_ids(100, 32)
+
+        self.assertEqual(len(ids), 100)
+        self.assertTrue(all(len(rand_id) == 32 for rand_id in ids))
+        self.assertEqual(len(set(ids)), 100)
+
+    def test_id_pool_get(self):
+        pool = IdPool(32, size=4)
+        ids = [pool.get() for _ in range(10)]
+
+        self.assertTrue(all(len(rand_id) == 32 for rand_id in ids))
+        self.assertEqual(len(set(ids)), 10)
+
+    def test_id_pool_get_many(self):
+        pool = IdPool(16, size=4)
+
+        self.assertEqual(len(pool.get_many(3)), 3)
+        self.assertEqual(len(pool.get_many(50)), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# seconds `import app` may take in a fresh interpreter, the first thing a new dyno does before it can answer "/"
+IMPORT_TIME_BUDGET = 1.0
+
+# loaded on first use only
+LAZY_MODULES = ("firebase_admin", "Crypto", "cryptography")
+
+IMPORT_APP = """
+import json, os, sys, time
+cwd = os.getcwd()
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "cwd_changed": os.getcwd() != cwd, "modules": list(sys.modules)}))
+"""
+
+
+class TestImportTimeMethods(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        env = {**os.environ, "PYTHONPATH": ROOT}
+        output = subprocess.run([sys.executable, "-c", IMPORT_APP], env=env, cwd=os.path.dirname(ROOT),
+                                capture_output=True, text=True, check=True).stdout
+        cls.result = json.loads(output)
+
+    def test_import_time_budget(self):
+        self.assertLess(self.result["elapsed"], IMPORT_TIME_BUDGET)
+
+    def test_lazy_modules_not_imported(self):
+        imported = [module for module in LAZY_MODULES if module in self.result["modules"]]
+        self.assertEqual(imported, [])
+
+    def test_cwd_not_changed(self):
+        self.assertFalse(self.result["cwd_changed"])
+
+
+if __name__ == '__main__':
+    unittest.main()
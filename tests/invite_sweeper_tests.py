@@ -0,0 +1,160 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from firebase_util_for_tests import FirebaseUtilForTests
+from invite_sweeper import InviteSweeper, AUTHORIZATION_EXPIRY_GRACE, INVITE_DEFAULT_TTL, SAVED_INVITES_SWEPT
+from memory_firebase_util import MemoryFirebaseUtil
+
+ONE_DAY_IN_SEC = 24 * 60 * 60
+
+
+class TestInviteSweeperMethods(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fb_util = FirebaseUtilForTests()
+
+    def setUp(self):
+        self.fb_util.delete_key("")
+        self.sweeper = InviteSweeper(self.fb_util, batch_size=2)
+
+    def test_sweep_removes_expired_invites(self):
+        now = int(time.time())
+        self.fb_util.set_data("invites/expired1", {'type': 1, 'expiration': now - 10})
+        self.fb_util.set_data("invites/expired2", {'type': 1, 'expiration': now - 5})
+        self.fb_util.set_data("invites/expired3", {'type': 1, 'expiration': now - 1})
+        self.fb_util.set_data("invites/valid", {'type': 1, 'expiration': now + 60})
+
+        report = self.sweeper.sweep(now)
+
+        self.assertEqual(sorted(report['invites']), ["expired1", "expired2", "expired3"])
+        self.assertEqual(list(self.fb_util.get_data("invites").keys()), ["valid"])
+        self.fb_util.delete_key("invites")
+
+    def test_sweep_removes_saved_invites(self):
+        now = int(time.time())
+        self.fb_util.set_data("invites/expired", {'type': 1, 'expiration': now - 10})
+        self.fb_util.set_multiple_data({
+            "users/user1/locks/lock1/saved_invite": "expired",
+            "users/user1/locks/lock1/name": "Home",
+            "invite_saves/expired/user1": "lock1"
+        })
+
+        report = self.sweeper.sweep(now)
+
+        self.assertEqual(report['saved_invites'], 1)
+        self.assertEqual(self.fb_util.get_data("users/user1/locks/lock1"), {"name": "Home"})
+        self.assertEqual(self.fb_util.get_data("invite_saves"), None)
+        self.fb_util.delete_key("users")
+
+    def test_sweep_reads_saves_once_per_batch(self):
+        now = int(time.time())
+        for i in range(4):
+            self.fb_util.set_data(f"invites/expired{i}", {'type': 1, 'expiration': now - 10})
+
+        with mock.patch.object(self.fb_util, "get_data", wraps=self.fb_util.get_data) as get_data:
+            report = self.sweeper.sweep(now)
+
+        self.assertEqual(len(report['invites']), 4)
+        # batch_size is 2: two full batches and the empty query that ends the sweep
+        self.assertEqual(get_data.call_count, 2)
+
+    def test_sweep_backfills_invites_without_expiration(self):
+        now = int(time.time())
+        self.fb_util.set_data("invites/old", {'type': 1})
+        self.fb_util.set_data("invites/expired", {'type': 1, 'expiration': now - 10})
+
+        report = self.sweeper.sweep(now)
+
+        self.assertEqual(report['backfilled'], ["old"])
+        self.assertEqual(report['invites'], ["expired"])
+        self.assertEqual(self.fb_util.get_data("invites/old/expiration"), now + INVITE_DEFAULT_TTL)
+
+        # swept once the ttl it was given is over
+        self.assertEqual(self.sweeper.sweep(now + INVITE_DEFAULT_TTL + 1)['invites'], ["old"])
+
+    def test_one_leader_per_lock_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lock_file = os.path.join(directory, "sweeper.lock")
+            first = InviteSweeper(self.fb_util, lock_file=lock_file)
+            second = InviteSweeper(self.fb_util, lock_file=lock_file)
+
+            self.assertTrue(first.is_leader())
+            self.assertFalse(second.is_leader())
+
+            first.stop()
+            self.assertTrue(second.is_leader())
+            second.stop()
+
+    def test_sweep_authorizations(self):
+        now = int(time.time())
+        self.fb_util.set_data("authorizations/AA", {
+            'owner': {'type': 1},
+            'tenant': {'type': 2, 'valid_from': now - 10 * ONE_DAY_IN_SEC, 'valid_until': now + 60},
+            'expired': {'type': 2, 'valid_from': now - 10 * ONE_DAY_IN_SEC,
+                        'valid_until': now - AUTHORIZATION_EXPIRY_GRACE - 1},
+            # expired in UTC, but maybe not yet where the lock is
+            'one_day': {'type': 4, 'one_day': now - ONE_DAY_IN_SEC}
+        })
+
+        self.assertEqual(self.sweeper.sweep_authorizations(now), ["AA/expired"])
+        self.assertEqual(sorted(self.fb_util.get_data("authorizations/AA").keys()), ["one_day", "owner", "tenant"])
+        self.fb_util.delete_key("authorizations")
+
+    def test_sweep_authorizations_keeps_renewed_authorization(self):
+        # an authorization redeemed again after the tree was read is not removed
+        now = int(time.time())
+        expired = {'type': 2, 'valid_from': now - 10 * ONE_DAY_IN_SEC,
+                   'valid_until': now - AUTHORIZATION_EXPIRY_GRACE - 1}
+        self.fb_util.set_data("authorizations/AA/phone", expired)
+        renewed = {'type': 2, 'valid_from': now, 'valid_until': now + 60}
+        read = self.fb_util.get_data
+
+        def get_data(path):
+            data = read(path)
+            self.fb_util.set_data("authorizations/AA/phone", renewed)
+            return data
+
+        with mock.patch.object(self.sweeper.fb_util, "get_data", side_effect=get_data):
+            self.assertEqual(self.sweeper.sweep_authorizations(now), [])
+        self.assertEqual(self.fb_util.get_data("authorizations/AA/phone"), renewed)
+        self.fb_util.delete_key("authorizations")
+
+    def test_sweep_saved_invites(self):
+        now = int(time.time())
+        self.fb_util.set_data("invites/live", {'type': 1, 'expiration': now + 60})
+        self.fb_util.set_multiple_data({
+            # written before the invite_saves index
+            "users/user1/locks/lock1/saved_invite": "live",
+            "users/user1/locks/lock2/saved_invite": "gone",
+            "users/user1/locks/lock2/name": "Home",
+            "users/user2/locks/lock1/saved_invite": "live",
+            "invite_saves/live/user2": "lock1"
+        })
+
+        self.assertEqual(self.sweeper.sweep_saved_invites(), {'indexed': 1, 'removed': 1})
+        self.assertEqual(self.fb_util.get_data("invite_saves"), {"live": {"user1": "lock1", "user2": "lock1"}})
+        self.assertEqual(self.fb_util.get_data("users/user1/locks/lock2"), {"name": "Home"})
+        self.assertIsNotNone(self.fb_util.get_data(SAVED_INVITES_SWEPT))
+
+        # the expired invite now takes the saved invites with it
+        self.assertEqual(self.sweeper.sweep(now + 61)['saved_invites'], 2)
+        self.assertEqual(self.fb_util.get_data("users"), {"user1": {"locks": {"lock2": {"name": "Home"}}}})
+        self.fb_util.delete_key("users")
+        self.fb_util.delete_key("sweeper")
+
+
+
+class TestInviteSweeperMemoryMethods(TestInviteSweeperMethods):
+    # the same checks on the in-memory database, which runs without Firebase credentials
+
+    @classmethod
+    def setUpClass(cls):
+        cls.fb_util = MemoryFirebaseUtil()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from key_pool import KeyPairPool
+from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+
+
+class TestKeyPairPoolMethods(unittest.TestCase):
+
+    def test_get_pem(self):
+        pool = KeyPairPool(size=2, bits=1024).start()
+
+        pem1 = pool.get_pem()
+        pem2 = pool.get_pem()
+        pool.close()
+
+        self.assertIn(b"PRIVATE KEY", pem1)
+        self.assertNotEqual(pem1, pem2)
+
+    def test_cache_dir_reused(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pool = KeyPairPool(size=1, bits=1024, cache_dir=cache_dir)
+            pem = pool.get_pem()
+            pool.close()
+
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertEqual(os.stat(os.path.join(cache_dir, os.listdir(cache_dir)[0])).st_mode & 0o777, 0o600)
+
+            pool = KeyPairPool(size=1, bits=1024, cache_dir=cache_dir)
+            self.assertEqual(len(pool), 1)
+            self.assertEqual(pool.get_pem(), pem)
+            pool.close()
+
+    def test_rsa_util_with_key_provider(self):
+        pool = KeyPairPool(size=1, bits=1024)
+
+        for backend in [None, BACKEND_CRYPTOGRAPHY]:
+            rsa = RSA_Util(key_provider=pool, backend=backend) if backend else RSA_Util(key_provider=pool)
+            signature_b64 = rsa.sign("This is a message!")
+            self.assertTrue(rsa.is_signature_valid("This is a message!", signature_b64))
+
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import lock_client_util
+from lock_client_util import LockClient, AsyncLockClient, LockGateway, AsyncLockGateway
+
+
+class _SlowEchoLock:
+    # answers every message with itself after a delay, on one connection at a time, like a lock does
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.connections = 0
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with connection:
+                while True:
+                    data = connection.recv(1024)
+                    if not data:
+                        break
+                    time.sleep(self.delay)
+                    connection.sendall(data)
+
+    def close(self):
+        # shutdown wakes the accept() of the serving thread, which would otherwise keep the socket listening
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+
+
+class TestLockClientMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = _SlowEchoLock()
+        self.port = lock_client_util.LOCK_PORT
+        lock_client_util.LOCK_PORT = self.lock.port
+
+    def tearDown(self):
+        lock_client_util.LOCK_PORT = self.port
+        self.lock.close()
+
+    def test_connects_on_first_message(self):
+        lock_client = LockClient("127.0.0.1")
+
+        self.assertFalse(lock_client.connected)
+        self.assertEqual(lock_client.send_msg_to_lock("open"), b"open")
+        self.assertTrue(lock_client.connected)
+
+        lock_client.close_sock()
+
+    def test_concurrent_messages_get_their_own_replies(self):
+        lock_client = LockClient("127.0.0.1")
+        messages = [f"msg-{i:02d}" for i in range(16)]
+
+        with ThreadPoolExecutor(len(messages)) as executor:
+            responses = list(executor.map(lock_client.send_msg_to_lock, messages))
+
+        self.assertEqual(responses, [message.encode() for message in messages])
+        self.assertEqual(self.lock.connections, 1)
+
+        lock_client.close_sock()
+
+    def test_closed_or_unreachable_lock(self):
+        lock_client = LockClient("127.0.0.1")
+        lock_client.close_sock()
+
+        self.assertIsNone(lock_client.send_msg_to_lock("open"))
+
+        self.lock.close()
+        self.assertIsNone(LockClient("127.0.0.1").send_msg_to_lock("open"))
+
+
+class TestLockGatewayMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = _SlowEchoLock()
+        self.port = lock_client_util.LOCK_PORT
+        lock_client_util.LOCK_PORT = self.lock.port
+
+    def tearDown(self):
+        lock_client_util.LOCK_PORT = self.port
+        self.lock.close()
+
+    def test_one_client_per_key(self):
+        gateway = LockGateway(max_connections=2)
+
+        with ThreadPoolExecutor(8) as executor:
+            lock_clients = list(executor.map(lambda _: gateway.get_client(("u1", "AA"), "127.0.0.1"), range(8)))
+
+        self.assertEqual(len({id(lock_client) for lock_client in lock_clients}), 1)
+        self.assertEqual(len(gateway), 1)
+
+        gateway.close_all()
+        self.assertEqual(len(gateway), 0)
+
+    def test_idle_clients_are_closed(self):
+        gateway = LockGateway(idle_timeout=10)
+        idle = gateway.get_client(("u1", "AA"), "127.0.0.1", now=0)
+        recent = gateway.get_client(("u2", "AA"), "127.0.0.1", now=5)
+
+        gateway.evict_idle(now=12)
+
+        self.assertEqual(list(gateway.clients.values()), [recent])
+        self.assertIsNone(idle.send_msg_to_lock("open"))
+        gateway.close_all()
+
+    def test_least_recently_used_client_makes_room(self):
+        gateway = LockGateway(max_connections=2)
+        gateway.get_client(("u1", "AA"), "127.0.0.1", now=0)
+        gateway.get_client(("u2", "AA"), "127.0.0.1", now=1)
+        gateway.get_client(("u1", "AA"), "127.0.0.1", now=2)
+
+        self.assertIsNotNone(gateway.get_client(("u3", "AA"), "127.0.0.1", now=3))
+        self.assertEqual(list(gateway.clients), [("u1", "AA"), ("u3", "AA")])
+        gateway.close_all()
+
+    def test_clients_in_use_are_not_evicted(self):
+        self.lock.delay = 0.2
+        gateway = LockGateway(max_connections=1)
+        lock_client = gateway.get_client(("u1", "AA"), "127.0.0.1")
+
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(gateway.send_msg, ("u1", "AA"), lock_client, "open")
+            time.sleep(0.05)
+            self.assertIsNone(gateway.get_client(("u2", "AA"), "127.0.0.1"))
+            self.assertEqual(future.result(), b"open")
+
+        self.assertIsNotNone(gateway.get_client(("u2", "AA"), "127.0.0.1"))
+        self.assertEqual(list(gateway.clients), [("u2", "AA")])
+        gateway.close_all()
+
+    def test_send_msg_closes_when_asked(self):
+        gateway = LockGateway()
+        lock_client = gateway.get_client(("u1", "AA"), "127.0.0.1")
+
+        self.assertEqual(gateway.send_msg(("u1", "AA"), lock_client, "open"), b"open")
+        self.assertEqual(len(gateway), 1)
+        self.assertEqual(gateway.send_msg(("u1", "AA"), lock_client, "close", close=True), b"close")
+        self.assertEqual(len(gateway), 0)
+
+    def test_close_client_keeps_a_replacement(self):
+        gateway = LockGateway()
+        old = gateway.get_client(("u1", "AA"), "127.0.0.1")
+        gateway.close_client(("u1", "AA"), old)
+        new = gateway.get_client(("u1", "AA"), "127.0.0.1")
+
+        gateway.close_client(("u1", "AA"), old)
+
+        self.assertIs(gateway.get_client(("u1", "AA"), "127.0.0.1"), new)
+        gateway.close_all()
+
+
+class TestAsyncLockGatewayMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.lock = _SlowEchoLock()
+        self.port = lock_client_util.LOCK_PORT
+        lock_client_util.LOCK_PORT = self.lock.port
+
+    def tearDown(self):
+        lock_client_util.LOCK_PORT = self.port
+        self.lock.close()
+
+    def test_connects_on_first_message(self):
+        async def run():
+            lock_client = AsyncLockClient("127.0.0.1")
+            self.assertFalse(lock_client.connected)
+            self.assertEqual(await lock_client.send_msg_to_lock("open"), b"open")
+            self.assertTrue(lock_client.connected)
+
+            lock_client.close_sock()
+            self.assertIsNone(await lock_client.send_msg_to_lock("open"))
+
+        asyncio.run(run())
+
+    def test_concurrent_requests_share_one_connection(self):
+        # the requests of one key that run together get one client, which opens one connection
+        gateway = AsyncLockGateway()
+        messages = [f"msg-{i:02d}" for i in range(8)]
+
+        async def request(msg):
+            lock_client = await gateway.get_client(("u1", "AA"), "127.0.0.1")
+            return await gateway.send_msg(("u1", "AA"), lock_client, msg)
+
+        async def run():
+            try:
+                return await asyncio.gather(*[request(msg) for msg in messages])
+            finally:
+                gateway.close_all()
+
+        self.assertEqual(asyncio.run(run()), [msg.encode() for msg in messages])
+        self.assertEqual(self.lock.connections, 1)
+
+    def test_unreachable_lock(self):
+        gateway = AsyncLockGateway()
+        self.lock.close()
+
+        async def run():
+            lock_client = await gateway.get_client(("u1", "AA"), "127.0.0.1")
+            return await gateway.send_msg(("u1", "AA"), lock_client, "open")
+
+        self.assertIsNone(asyncio.run(run()))
+        self.assertEqual(len(gateway), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
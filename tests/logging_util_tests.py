@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from flask import Flask, jsonify
+from quart import Quart
+
+import logging_util
+from logging_util import BatchFileWriter, log_app, add_log_fields, audit, hash_id, set_log_uid, log_result, \
+    log_event
+from metrics_util import dependency_timer
+
+
+class _ListWriter:
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+
+class TestLoggingUtilMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = _ListWriter()
+        self.default_writer, logging_util.writer = logging_util.writer, self.writer
+
+    def tearDown(self):
+        logging_util.writer = self.default_writer
+
+    def test_batch_file_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "server.log")
+            writer = BatchFileWriter(filename, interval=60)
+
+            writer.write({'log': "audit", 'event': "invite_created"})
+            writer.write({'log': "access", 'route': "/"})
+            writer.flush()
+
+            with open(filename) as file:
+                records = [json.loads(line) for line in file]
+
+        self.assertEqual(records, [{'log': "audit", 'event': "invite_created"}, {'log': "access", 'route': "/"}])
+
+    def test_batch_file_writer_rotation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "server-{pid}.log")
+            writer = BatchFileWriter(filename, max_bytes=100, backup_count=2, interval=60)
+
+            for i in range(4):
+                writer.write({'i': i, 'padding': "x" * 100})
+                writer.flush()
+
+            current = filename.format(pid=os.getpid())
+            self.assertFalse(os.path.exists(current))
+            self.assertTrue(os.path.exists(f"{current}.1"))
+            self.assertTrue(os.path.exists(f"{current}.2"))
+            self.assertFalse(os.path.exists(f"{current}.3"))
+
+            with open(f"{current}.1") as file:
+                self.assertEqual(json.loads(file.readline())['i'], 3)
+
+    def test_batch_file_writer_full_queue(self):
+        writer = BatchFileWriter(os.devnull, interval=60, max_queue_size=2)
+
+        for i in range(5):
+            writer.write({'i': i})
+
+        self.assertEqual(writer.dropped, 3)
+
+    def test_access_log(self):
+        app = Flask(__name__)
+        log_app(app)
+
+        @app.route("/locks/<lock_id>")
+        def get_lock(lock_id):
+            add_log_fields(lock_mac=lock_id)
+            set_log_uid("user1")
+            with dependency_timer("firebase", "get_data"):
+                pass
+            audit("remote_command", success=True)
+            response = {'success': False, 'code': 404, 'msg': 'Unknown lock'}
+            log_result(response)
+            return jsonify(response)
+
+        app.test_client().get("/locks/AA")
+
+        audit_record, access_record = self.writer.records
+        self.assertEqual(access_record['log'], "access")
+        self.assertEqual(access_record['route'], "/locks/<lock_id>")
+        self.assertEqual(access_record['status'], 200)
+        self.assertEqual(access_record['code'], 404)
+        self.assertEqual(access_record['lock_mac'], "AA")
+        self.assertEqual(access_record['uid_hash'], hash_id("user1"))
+        self.assertIn('firebase', access_record['stages_ms'])
+        self.assertGreaterEqual(access_record['latency_ms'], 0)
+
+        self.assertEqual(audit_record['event'], "remote_command")
+        self.assertEqual(audit_record['lock_mac'], "AA")
+        self.assertEqual(audit_record['uid_hash'], hash_id("user1"))
+
+    def test_access_log_error(self):
+        app = Flask(__name__)
+        log_app(app)
+
+        @app.route("/fail")
+        def fail():
+            raise ValueError()
+
+        app.test_client().get("/fail")
+
+        self.assertEqual(self.writer.records[0]['status'], 500)
+        self.assertEqual(self.writer.records[0]['error'], "ValueError")
+
+    def test_access_log_async_app(self):
+        # hooks on a Quart app see the fields the coroutine views add
+        app = Quart(__name__)
+        log_app(app)
+
+        @app.route("/locks/<lock_id>")
+        async def get_lock(lock_id):
+            add_log_fields(lock_mac=lock_id)
+            set_log_uid("user1")
+            await asyncio.sleep(0)
+            response = {'success': False, 'code': 404, 'msg': 'Unknown lock'}
+            log_result(response)
+            return response
+
+        asyncio.run(app.test_client().get("/locks/AA"))
+
+        access_record, = self.writer.records
+        self.assertEqual(access_record['route'], "/locks/<lock_id>")
+        self.assertEqual(access_record['status'], 200)
+        self.assertEqual(access_record['code'], 404)
+        self.assertEqual(access_record['lock_mac'], "AA")
+        self.assertEqual(access_record['uid_hash'], hash_id("user1"))
+
+    def test_access_log_does_not_parse_responses(self):
+        # the result code is only the one the view gives to log_result
+        app = Flask(__name__)
+        log_app(app)
+
+        @app.route("/")
+        def fail():
+            return jsonify({'success': False, 'code': 404})
+
+        app.test_client().get("/")
+
+        self.assertEqual(self.writer.records[0]['status'], 200)
+        self.assertNotIn('code', self.writer.records[0])
+
+    def test_disabled(self):
+        logging_util.writer = None
+
+        app = Flask(__name__)
+        log_app(app)
+
+        @app.route("/")
+        def ping():
+            add_log_fields(lock_mac="AA")
+            audit("remote_command")
+            return "pong"
+
+        self.assertEqual(app.test_client().get("/").data, b"pong")
+        self.assertEqual(self.writer.records, [])
+
+    def test_log_event(self):
+        log_event("invite_sweeper", "sweep_failed", error=ValueError("timeout"), invites=2)
+
+        record, = self.writer.records
+        self.assertEqual((record['log'], record['source'], record['event']), ("event", "invite_sweeper", "sweep_failed"))
+        self.assertEqual((record['error'], record['invites']), ("ValueError: timeout", 2))
+
+    def test_log_event_without_log_file(self):
+        # goes to the logging module, errors as warnings
+        logging_util.writer = None
+
+        with self.assertLogs("invite_sweeper", level="WARNING") as logs:
+            log_event("invite_sweeper", "sweep_failed", error=ValueError("timeout"))
+
+        self.assertIn("sweep_failed", logs.output[0])
+        self.assertEqual(self.writer.records, [])
+
+    def test_hash_id(self):
+        self.assertEqual(hash_id("user1"), hash_id("user1"))
+        self.assertNotEqual(hash_id("user1"), hash_id("user2"))
+        self.assertEqual(len(hash_id("user1")), 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
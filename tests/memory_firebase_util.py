@@ -0,0 +1,333 @@
+import asyncio
+import copy
+import hashlib
+import json
+import queue
+import threading
+import time
+
+from firebase_util import generate_random_id
+
+
+def _split(path):
+    return [part for part in path.split("/") if part]
+
+
+def _prune(value):
+    # the Realtime Database does not keep empty objects
+    if isinstance(value, dict):
+        value = {key: _prune(child) for key, child in value.items()}
+        value = {key: child for key, child in value.items() if child is not None}
+        return value or None
+    return value
+
+
+class MemoryFirebaseUtil:
+    # In-process stand-in for FirebaseUtil with the same Realtime Database semantics: update() merges children, None
+    # deletes, empty objects read as None. Every call waits `latency` seconds, a Firebase round trip, outside the lock.
+
+    def __init__(self, data=None, latency=0):
+        self.latency = latency
+
+        self._data = _prune(copy.deepcopy(data)) or {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get(self, parts):
+        node = self._data
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        self._write(parts, value)
+        self._notify(parts)
+
+    def _write(self, parts, value):
+        if not parts:
+            self._data = _prune(value) or {}
+            return
+
+        nodes = [self._data]
+        for part in parts[:-1]:
+            child = nodes[-1].get(part)
+            if not isinstance(child, dict):
+                child = nodes[-1][part] = {}
+            nodes.append(child)
+
+        value = _prune(copy.deepcopy(value))
+        if value is None:
+            nodes[-1].pop(parts[-1], None)
+        else:
+            nodes[-1][parts[-1]] = value
+
+        # drop the parents left empty by a delete
+        for i in range(len(nodes) - 1, 0, -1):
+            if nodes[i]:
+                break
+            nodes[i - 1].pop(parts[i - 1], None)
+
+    def _notify(self, parts):
+        # a "put" event for every listener at, above or below the written path, sent while the lock is held so
+        # listeners see the writes in order
+        for listener in self._listeners:
+            path = listener.parts
+            if parts[:len(path)] == path:
+                listener.send("put", "/" + "/".join(parts[len(path):]), copy.deepcopy(self._get(parts)))
+            elif path[:len(parts)] == parts:
+                listener.send("put", "/", copy.deepcopy(self._get(path)))
+
+    def listen(self, path, callback):
+        with self._lock:
+            listener = MemoryListenerRegistration(self, _split(path), callback)
+            listener.send("put", "/", copy.deepcopy(self._get(listener.parts)))
+            self._listeners.append(listener)
+        return listener
+
+    def _update(self, parts, data):
+        for key, value in data.items():
+            self._set(parts + _split(key), value)
+
+    def get_data(self, path):
+        self._round_trip()
+        with self._lock:
+            return copy.deepcopy(self._get(_split(path)))
+
+    def set_data(self, path, data):
+        self._round_trip()
+        with self._lock:
+            self._update(_split(path), data)
+        return True
+
+    def set_multiple_data(self, data_by_path):
+        self._round_trip()
+        with self._lock:
+            self._update([], data_by_path)
+        return True
+
+    def delete_key(self, path):
+        self._round_trip()
+        with self._lock:
+            self._set(_split(path), None)
+        return True
+
+    def claim_data(self, path):
+        self._round_trip()
+        with self._lock:
+            data = self._get(_split(path))
+            self._set(_split(path), None)
+        return data
+
+    def delete_data_if(self, path, condition):
+        self._round_trip()
+        with self._lock:
+            data = self._get(_split(path))
+            if data is None or not condition(data):
+                return None
+            self._set(_split(path), None)
+        return data
+
+    def add_data_to_path(self, path, data):
+        return self.set_data(f"{path}/{generate_random_id(8)}", data)
+
+    def get_data_where_child_equal_to(self, path, child, value):
+        self._round_trip()
+        with self._lock:
+            for key, node in (self._get(_split(path)) or {}).items():
+                if isinstance(node, dict) and node.get(child) == value:
+                    return {key: copy.deepcopy(node)}
+        return {}
+
+    def get_data_where_child_between(self, path, child, start, end, limit):
+        # numbers only; without start, nodes missing `child` are included and come first, as null does in the database
+        def value(node):
+            return node.get(child) if isinstance(node, dict) else None
+
+        self._round_trip()
+        with self._lock:
+            nodes = [(key, node) for key, node in (self._get(_split(path)) or {}).items()
+                     if (start is None or value(node) is not None and start <= value(node))
+                     and (value(node) is None or value(node) <= end)]
+            nodes.sort(key=lambda item: (value(item[1]) is not None, value(item[1]) or 0))
+            return copy.deepcopy(dict(nodes[:limit]))
+
+    def set_random_username(self, user_id):
+        username = generate_random_id(15)
+        self.set_data(f"users/{user_id}", {'username': username})
+        return username
+
+
+class MemoryEvent:
+    # firebase_admin.db.Event
+
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class MemoryListenerRegistration:
+    # firebase_admin.db.ListenerRegistration: the callback gets the events on a thread of its own
+
+    def __init__(self, store, parts, callback):
+        self.store = store
+        self.parts = parts
+        self.callback = callback
+
+        self._events = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, event_type, path, data):
+        self._events.put(MemoryEvent(event_type, path, data))
+
+    def close(self):
+        with self.store._lock:
+            if self in self.store._listeners:
+                self.store._listeners.remove(self)
+        self._events.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            self.callback(event)
+
+
+def _etag(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class MemoryReference:
+    # The part of firebase_admin.db.Reference that FirebaseUtil uses, on a MemoryFirebaseUtil
+
+    def __init__(self, store, path, query=None):
+        self.store = store
+        self.path = path
+        self.query = query or {}
+
+    def _child_query(self, **query):
+        return MemoryReference(self.store, self.path, {**self.query, **query})
+
+    def order_by_child(self, child):
+        return self._child_query(child=child)
+
+    def start_at(self, start):
+        return self._child_query(start=start)
+
+    def end_at(self, end):
+        return self._child_query(end=end)
+
+    def equal_to(self, value):
+        return self._child_query(start=value, end=value)
+
+    def limit_to_first(self, limit):
+        return self._child_query(limit=limit)
+
+    def get(self, etag=False):
+        if self.query:
+            return self.store.get_data_where_child_between(self.path, self.query["child"], self.query.get("start"),
+                                                           self.query["end"], self.query.get("limit"))
+        if etag:
+            with self.store._lock:
+                data = copy.deepcopy(self.store._get(_split(self.path)))
+            return data, _etag(data)
+        return self.store.get_data(self.path)
+
+    def update(self, value):
+        self.store.set_data(self.path, value)
+
+    def delete(self):
+        self.store.delete_key(self.path)
+
+    def listen(self, callback):
+        return self.store.listen(self.path, callback)
+
+    def set_if_unchanged(self, expected_etag, value):
+        with self.store._lock:
+            data = copy.deepcopy(self.store._get(_split(self.path)))
+            if _etag(data) != expected_etag:
+                return False, data, _etag(data)
+            self.store._set(_split(self.path), value)
+            return True, copy.deepcopy(value), _etag(value)
+
+
+class MemoryDb:
+    # Stands in for the firebase_admin.db module, e.g. FirebaseUtil(db=MemoryDb())
+
+    def __init__(self, data=None, latency=0):
+        self.store = MemoryFirebaseUtil(data, latency)
+
+    def reference(self, path="/"):
+        return MemoryReference(self.store, path)
+
+
+def verify_test_id_token(id_token, **kwargs):
+    # Token verifier for firebase_util.set_id_token_verifier: "token:<uid>" is a valid token of user <uid>, with an
+    # email derived from it; anything else is rejected like an invalid Firebase ID token.
+    if not isinstance(id_token, str) or not id_token.startswith("token:"):
+        raise ValueError("Invalid ID token")
+
+    uid = id_token[len("token:"):]
+    return {'uid': uid, 'user_id': uid, 'email': f"{uid}@example.com"}
+
+
+class MemoryCredential:
+    # google.auth credential for AsyncFirebaseUtil that never needs a refresh
+    valid = True
+    token = "memory"
+
+
+def memory_rest_transport(store, latency=0):
+    # httpx transport that answers the Realtime Database REST calls of AsyncFirebaseUtil from a MemoryFirebaseUtil
+    # (whose own latency should be 0), each after `latency` seconds awaited, so concurrent requests overlap
+    import httpx
+
+    def _json_response(status_code, data, headers=None):
+        # httpx leaves the body empty for json=None, the database answers null
+        return httpx.Response(status_code, content=json.dumps(data).encode(), headers=headers)
+
+    async def handle(request):
+        await asyncio.sleep(latency)
+
+        path = request.url.path[:-len(".json")]
+        params = request.url.params
+        reference = MemoryReference(store, path)
+
+        if request.method == "GET" and "equalTo" in params:
+            data = store.get_data_where_child_equal_to(path, json.loads(params["orderBy"]),
+                                                       json.loads(params["equalTo"]))
+        elif request.method == "GET" and "orderBy" in params:
+            start = json.loads(params["startAt"]) if "startAt" in params else None
+            data = store.get_data_where_child_between(path, json.loads(params["orderBy"]), start,
+                                                      json.loads(params["endAt"]), int(params["limitToFirst"]))
+        elif request.method == "GET" and request.headers.get("X-Firebase-ETag"):
+            data, etag = reference.get(etag=True)
+            return _json_response(200, data, {'ETag': etag})
+        elif request.method == "GET":
+            data = store.get_data(path)
+        elif request.method == "PATCH":
+            store.set_data(path, json.loads(request.content))
+            return httpx.Response(204)
+        elif request.method == "DELETE":
+            store.delete_key(path)
+            data = None
+        elif request.method == "PUT" and "if-match" in request.headers:
+            success, data, etag = reference.set_if_unchanged(request.headers["if-match"], json.loads(request.content))
+            if not success:
+                return _json_response(412, data, {'ETag': etag})
+        else:
+            return httpx.Response(405)
+
+        return _json_response(200, data)
+
+    return httpx.MockTransport(handle)
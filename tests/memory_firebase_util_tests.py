@@ -0,0 +1,76 @@
+import unittest
+
+import firebase_util
+from firebase_util import FirebaseUtil, check_if_user, get_decoded_claims_id_token, set_id_token_verifier
+from memory_firebase_util import MemoryFirebaseUtil, MemoryDb, verify_test_id_token
+
+
+class TestMemoryFirebaseUtilMethods(unittest.TestCase):
+
+    def test_set_merges_children(self):
+        fb_util = MemoryFirebaseUtil({'doors': {'AA': {'MAC': "AA", 'BLE': "BB"}}})
+
+        fb_util.set_data("doors/AA", {'IP': "127.0.0.1"})
+
+        self.assertEqual(fb_util.get_data("doors/AA"), {'MAC': "AA", 'BLE': "BB", 'IP': "127.0.0.1"})
+        self.assertEqual(fb_util.get_data("doors/AA/BLE"), "BB")
+        self.assertIsNone(fb_util.get_data("doors/CC"))
+
+    def test_multiple_data_and_delete(self):
+        fb_util = MemoryFirebaseUtil({'invites': {'i1': {'type': 1}}, 'invite_saves': {'i1': {'u1': "AA"}}})
+
+        fb_util.set_multiple_data({"invites/i1": None, "invite_saves/i1": None, "users/u1/locks/AA/id": "AA"})
+
+        self.assertIsNone(fb_util.get_data("invites"))
+        self.assertEqual(fb_util.get_data("users/u1/locks"), {'AA': {'id': "AA"}})
+
+        fb_util.delete_key("users/u1/locks/AA")
+        self.assertIsNone(fb_util.get_data("users"))
+
+    def test_get_returns_copies(self):
+        fb_util = MemoryFirebaseUtil({'users': {'u1': {'phone_ids': ["p1"]}}})
+
+        fb_util.get_data("users/u1/phone_ids").append("p2")
+
+        self.assertEqual(fb_util.get_data("users/u1/phone_ids"), ["p1"])
+
+    def test_claim_data(self):
+        fb_util = MemoryFirebaseUtil({'invites': {'i1': {'type': 1}}})
+
+        self.assertEqual(fb_util.claim_data("invites/i1"), {'type': 1})
+        self.assertIsNone(fb_util.claim_data("invites/i1"))
+
+    def test_queries(self):
+        fb_util = MemoryFirebaseUtil({'invites': {'i1': {'expiration': 30}, 'i2': {'expiration': 10},
+                                                  'i3': {'expiration': 20}, 'i4': {'type': 1}}})
+
+        self.assertEqual(list(fb_util.get_data_where_child_between("invites", "expiration", 0, 25, 10)), ["i2", "i3"])
+        self.assertEqual(list(fb_util.get_data_where_child_between("invites", "expiration", 0, 25, 1)), ["i2"])
+        self.assertEqual(fb_util.get_data_where_child_equal_to("invites", "expiration", 30), {'i1': {'expiration': 30}})
+
+    def test_firebase_util_on_memory_db(self):
+        fb_util = FirebaseUtil(db=MemoryDb({'invites': {'i1': {'type': 1, 'expiration': 10},
+                                                        'i2': {'type': 2, 'expiration': 20}}}))
+
+        fb_util.set_multiple_data({"invites/i2/type": 3, "invite_saves/i2/u1": "AA"})
+
+        self.assertEqual(fb_util.get_data("invites/i2"), {'type': 3, 'expiration': 20})
+        self.assertEqual(list(fb_util.get_data_where_child_between("invites", "expiration", 0, 15, 10)), ["i1"])
+        self.assertEqual(fb_util.claim_data("invites/i1"), {'type': 1, 'expiration': 10})
+        self.assertIsNone(fb_util.claim_data("invites/i1"))
+        self.assertEqual(list(fb_util.get_data("invites")), ["i2"])
+
+    def test_id_token_verifier(self):
+        set_id_token_verifier(verify_test_id_token)
+        try:
+            self.assertEqual(get_decoded_claims_id_token("token:u1")['uid'], "u1")
+            self.assertTrue(check_if_user("token:u1"))
+            self.assertFalse(check_if_user("not a token"))
+        finally:
+            set_id_token_verifier(None)
+
+        self.assertIsNone(firebase_util._id_token_verifier)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+
+from flask import Flask
+from prometheus_client import REGISTRY
+from quart import Quart
+
+from metrics_util import instrument_app, timed, dependency_timer, generate_metrics
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetricsUtilMethods(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        app = Flask(__name__)
+        instrument_app(app)
+
+        @app.route("/items/<item_id>")
+        def get_item(item_id):
+            return {'success': True}
+
+        @app.route("/fail")
+        def fail():
+            raise ValueError()
+
+        cls.client = app.test_client()
+
+    def test_route_metrics(self):
+        labels = {'method': "GET", 'route': "/items/<item_id>"}
+        count = _sample("http_request_duration_seconds_count", labels)
+        responses = _sample("http_requests_total", {**labels, 'status': "200"})
+
+        self.client.get("/items/1")
+        self.client.get("/items/2")
+
+        self.assertEqual(_sample("http_request_duration_seconds_count", labels), count + 2)
+        self.assertEqual(_sample("http_requests_total", {**labels, 'status': "200"}), responses + 2)
+        self.assertEqual(_sample("http_requests_in_progress", labels), 0)
+
+    def test_route_metrics_error(self):
+        labels = {'method': "GET", 'route': "/fail", 'status': "500"}
+        responses = _sample("http_requests_total", labels)
+
+        self.client.get("/fail")
+
+        self.assertEqual(_sample("http_requests_total", labels), responses + 1)
+
+    def test_route_metrics_unmatched(self):
+        labels = {'method': "GET", 'route': "unmatched", 'status': "404"}
+        responses = _sample("http_requests_total", labels)
+
+        self.client.get("/does-not-exist")
+
+        self.assertEqual(_sample("http_requests_total", labels), responses + 1)
+
+    def test_route_metrics_async_app(self):
+        app = Quart(__name__)
+        instrument_app(app)
+
+        @app.route("/async-items/<item_id>")
+        async def get_item(item_id):
+            return {'success': True}
+
+        labels = {'method': "GET", 'route': "/async-items/<item_id>"}
+        responses = _sample("http_requests_total", {**labels, 'status': "200"})
+
+        asyncio.run(app.test_client().get("/async-items/1"))
+
+        self.assertEqual(_sample("http_requests_total", {**labels, 'status': "200"}), responses + 1)
+        self.assertEqual(_sample("http_requests_in_progress", labels), 0)
+
+    def test_timed(self):
+        labels = {'dependency': "test", 'operation': "double"}
+
+        @timed("test")
+        def double(value):
+            return value * 2
+
+        count = _sample("dependency_call_duration_seconds_count", labels)
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(_sample("dependency_call_duration_seconds_count", labels), count + 1)
+
+    def test_dependency_timer_error(self):
+        labels = {'dependency': "test", 'operation': "fail"}
+        errors = _sample("dependency_call_errors_total", labels)
+
+        with self.assertRaises(ValueError):
+            with dependency_timer("test", "fail"):
+                raise ValueError()
+
+        self.assertEqual(_sample("dependency_call_errors_total", labels), errors + 1)
+
+    def test_generate_metrics(self):
+        body, content_type = generate_metrics()
+
+        self.assertIn(b"http_requests_total", body)
+        self.assertTrue(content_type.startswith("text/plain"))
+
+
+if __name__ == '__main__':
+    unittest.main()
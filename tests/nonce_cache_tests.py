@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from nonce_cache import NonceCache, SqliteNonceCache, nonce_cache_from_env
+
+NOW = 1651449600
+
+
+class TestNonceCacheMethods(unittest.TestCase):
+
+    def test_check_and_add_ok(self):
+        cache = NonceCache()
+
+        self.assertTrue(cache.check_and_add("nonce", NOW, now=NOW))
+        self.assertTrue(cache.contains("nonce", NOW))
+        self.assertEqual(len(cache), 1)
+
+    def test_check_and_add_replay(self):
+        cache = NonceCache()
+
+        cache.check_and_add("nonce", NOW, now=NOW)
+        self.assertFalse(cache.check_and_add("nonce", NOW, now=NOW + 10))
+
+    def test_check_and_add_stale(self):
+        cache = NonceCache(window=60)
+
+        self.assertFalse(cache.is_fresh(NOW - 61, now=NOW))
+        self.assertFalse(cache.check_and_add("nonce", NOW - 61, now=NOW))
+        self.assertFalse(cache.check_and_add("nonce", NOW + 61, now=NOW))
+
+    def test_expired_buckets_dropped(self):
+        cache = NonceCache(window=60, bucket_seconds=10)
+
+        cache.check_and_add("nonce1", NOW, now=NOW)
+        cache.check_and_add("nonce2", NOW + 100, now=NOW + 100)
+
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(cache.contains("nonce1", NOW))
+
+    def test_max_entries(self):
+        cache = NonceCache(window=60, bucket_seconds=10, max_entries=2)
+
+        self.assertTrue(cache.check_and_add("nonce1", NOW - 30, now=NOW))
+        self.assertTrue(cache.check_and_add("nonce2", NOW, now=NOW))
+        self.assertTrue(cache.check_and_add("nonce3", NOW, now=NOW))
+        self.assertEqual(len(cache), 2)
+
+        # the bucket of nonce1 was dropped early, so its replay must be rejected as stale
+        self.assertFalse(cache.is_fresh(NOW - 30, now=NOW))
+        self.assertFalse(cache.check_and_add("nonce1", NOW - 30, now=NOW))
+        self.assertFalse(cache.check_and_add("nonce4", NOW, now=NOW))
+
+
+class TestSqliteNonceCacheMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "nonces.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay_to_another_worker(self):
+        worker1, worker2 = SqliteNonceCache(self.filename), SqliteNonceCache(self.filename)
+
+        self.assertTrue(worker1.check_and_add(("AA", "nonce"), NOW, now=NOW))
+        self.assertTrue(worker2.contains(("AA", "nonce"), NOW))
+        self.assertFalse(worker2.check_and_add(("AA", "nonce"), NOW, now=NOW + 10))
+        self.assertTrue(worker2.check_and_add(("BB", "nonce"), NOW, now=NOW))
+
+    def test_stale(self):
+        cache = SqliteNonceCache(self.filename, window=60)
+
+        self.assertFalse(cache.check_and_add(("AA", "nonce"), NOW - 61, now=NOW))
+        self.assertEqual(len(cache), 0)
+
+    def test_prune(self):
+        cache = SqliteNonceCache(self.filename, window=60)
+        cache.PRUNE_EVERY = 2
+
+        cache.check_and_add(("AA", "nonce1"), NOW, now=NOW)
+        cache.check_and_add(("AA", "nonce2"), NOW + 100, now=NOW + 100)
+
+        self.assertEqual(len(cache), 1)
+
+    def test_locked_file_falls_back_to_process(self):
+        cache = SqliteNonceCache(self.filename, timeout=0.01)
+        cache.check_and_add(("AA", "nonce0"), NOW, now=NOW)
+
+        locker = sqlite3.connect(self.filename, isolation_level=None)
+        locker.execute("BEGIN EXCLUSIVE")
+        try:
+            self.assertTrue(cache.check_and_add(("AA", "nonce"), NOW, now=NOW))
+            self.assertFalse(cache.check_and_add(("AA", "nonce"), NOW, now=NOW))
+        finally:
+            locker.execute("ROLLBACK")
+            locker.close()
+
+    def test_nonce_cache_from_env(self):
+        with mock.patch.dict(os.environ, {'NONCE_DB': self.filename}):
+            self.assertIsInstance(nonce_cache_from_env(), SqliteNonceCache)
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIsInstance(nonce_cache_from_env(), NonceCache)
+
+
+if __name__ == '__main__':
+    unittest.main()
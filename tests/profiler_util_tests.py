@@ -0,0 +1,81 @@
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+from profiler_util import SamplingProfiler, profile, install_signal_handler, profiler
+
+
+def _busy_wait(stop_event):
+    while not stop_event.is_set():
+        sum(range(100))
+
+
+class TestProfilerUtilMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.stop_event = threading.Event()
+        self.worker = threading.Thread(target=_busy_wait, args=(self.stop_event,))
+        self.worker.start()
+
+    def tearDown(self):
+        self.stop_event.set()
+        self.worker.join()
+        profiler.stop()
+
+    def test_profile(self):
+        collapsed = profile(0.2, interval=0.005)
+
+        lines = collapsed.splitlines()
+        self.assertTrue(any("profiler_util_tests:_busy_wait" in line for line in lines))
+        self.assertFalse(any("sampling-profiler" in line or "profiler_util:_run" in line for line in lines))
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertGreater(int(count), 0)
+
+    def test_excludes_caller(self):
+        collapsed = profile(0.1, interval=0.005)
+
+        self.assertNotIn("profiler_util:profile", collapsed)
+
+    def test_start_twice(self):
+        sampling_profiler = SamplingProfiler(interval=0.005)
+
+        self.assertTrue(sampling_profiler.start())
+        self.assertFalse(sampling_profiler.start())
+        time.sleep(0.1)
+        self.assertIn("_busy_wait", sampling_profiler.stop())
+        self.assertFalse(sampling_profiler.running)
+
+    def test_already_running(self):
+        profiler.start()
+        self.assertIsNone(profile(0.1))
+
+    def test_signal_handler(self):
+        with tempfile.TemporaryDirectory() as directory:
+            previous_handler = signal.getsignal(signal.SIGUSR2)
+            try:
+                install_signal_handler(seconds=10, output_dir=directory)
+
+                os.kill(os.getpid(), signal.SIGUSR2)
+                time.sleep(0.1)
+                self.assertTrue(profiler.running)
+
+                os.kill(os.getpid(), signal.SIGUSR2)
+                for _ in range(100):
+                    if os.listdir(directory):
+                        break
+                    time.sleep(0.05)
+            finally:
+                signal.signal(signal.SIGUSR2, previous_handler)
+
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            with open(os.path.join(directory, files[0])) as file:
+                self.assertIn("_busy_wait", file.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import rate_limit_util
+from rate_limit_util import RateLimiter, MemoryBucketStore, SqliteBucketStore, token_key
+
+
+class TestRateLimitUtilMethods(unittest.TestCase):
+
+    def test_burst_and_refill(self):
+        limiter = RateLimiter("test", {'ip': (2, 3)}, MemoryBucketStore())
+
+        for _ in range(3):
+            self.assertEqual(limiter.check(now=100, ip="1.2.3.4"), 0)
+
+        self.assertAlmostEqual(limiter.check(now=100, ip="1.2.3.4"), 0.5)
+        self.assertEqual(limiter.check(now=100, ip="5.6.7.8"), 0)
+        # 2 tokens per second
+        self.assertEqual(limiter.check(now=100.5, ip="1.2.3.4"), 0)
+        self.assertGreater(limiter.check(now=100.5, ip="1.2.3.4"), 0)
+        # never more than the burst
+        for _ in range(3):
+            self.assertEqual(limiter.check(now=1000, ip="1.2.3.4"), 0)
+        self.assertGreater(limiter.check(now=1000, ip="1.2.3.4"), 0)
+
+    def test_limited_client_does_not_use_lock_tokens(self):
+        limiter = RateLimiter("test", {'ip': (1, 1), 'lock': (1, 2)}, MemoryBucketStore())
+
+        self.assertEqual(limiter.check(now=100, ip="1.2.3.4", lock="AA"), 0)
+        for _ in range(5):
+            self.assertGreater(limiter.check(now=100, ip="1.2.3.4", lock="AA"), 0)
+
+        self.assertEqual(limiter.check(now=100, ip="5.6.7.8", lock="AA"), 0)
+        self.assertGreater(limiter.check(now=100, ip="9.9.9.9", lock="AA"), 0)
+        self.assertEqual(limiter.check(now=100, ip="9.9.9.8", lock=None), 0)
+
+    def test_memory_store_max_keys(self):
+        bucket_store = MemoryBucketStore(max_keys=2)
+        limiter = RateLimiter("test", {'ip': (1, 1)}, bucket_store)
+
+        for ip in ["1.1.1.1", "2.2.2.2", "3.3.3.3"]:
+            limiter.check(now=100, ip=ip)
+
+        self.assertEqual(len(bucket_store), 2)
+
+    def test_sqlite_store_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "rate_limits.db")
+            # two stores on one file, as two workers would have
+            first = RateLimiter("test", {'user': (1, 2)}, SqliteBucketStore(filename))
+            second = RateLimiter("test", {'user': (1, 2)}, SqliteBucketStore(filename))
+
+            self.assertEqual(first.check(now=100, user="u1"), 0)
+            self.assertEqual(second.check(now=100, user="u1"), 0)
+            self.assertAlmostEqual(first.check(now=100, user="u1"), 1)
+            self.assertEqual(second.check(now=101, user="u1"), 0)
+
+    def test_disabled(self):
+        default_store, rate_limit_util.store = rate_limit_util.store, None
+        try:
+            limiter = RateLimiter("test", {'ip': (1, 1)})
+            for _ in range(5):
+                self.assertEqual(limiter.check(ip="1.2.3.4"), 0)
+        finally:
+            rate_limit_util.store = default_store
+
+    def test_token_key(self):
+        self.assertEqual(token_key("token1"), token_key("token1"))
+        self.assertNotEqual(token_key("token1"), token_key("token2"))
+        self.assertIsNone(token_key(None))
+        self.assertIsNone(token_key(["token1"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
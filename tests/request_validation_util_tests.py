@@ -0,0 +1,87 @@
+import json
+import unittest
+
+from request_validation_util import validate_signed_request, is_valid_mac, is_valid_key, is_valid_utc_offset, \
+    get_client_ip, MAX_DATA_LENGTH
+
+
+class TestRequestValidationUtilMethods(unittest.TestCase):
+
+    def test_validate_signed_request_ok(self):
+        args = {'signature': "c2lnbmF0dXJl", 'data': json.dumps({'smart_lock_MAC': "aa:00:aa:00:aa:00"})}
+
+        error_response, data_dict = validate_signed_request(args)
+
+        self.assertEqual(error_response, None)
+        self.assertEqual(data_dict, {'smart_lock_MAC': "AA:00:AA:00:AA:00"})
+
+    def test_validate_signed_request_not_signed(self):
+        args = {'data': json.dumps({'smart_lock_MAC': "AA:00:AA:00:AA:00"})}
+
+        self.assertEqual(validate_signed_request(args),
+                         ({'success': False, 'code': 403, 'msg': 'Message not signed'}, None))
+
+    def test_validate_signed_request_no_data(self):
+        self.assertEqual(validate_signed_request({'signature': "c2lnbmF0dXJl"}),
+                         ({'success': False, 'code': 400, 'msg': 'Invalid data'}, None))
+
+    def test_validate_signed_request_data_too_long(self):
+        args = {'signature': "c2lnbmF0dXJl", 'data': " " * (MAX_DATA_LENGTH + 1)}
+
+        self.assertEqual(validate_signed_request(args),
+                         ({'success': False, 'code': 400, 'msg': 'Invalid data'}, None))
+
+    def test_validate_signed_request_invalid_json(self):
+        for data in ["{not json", "[1, 2]", "null"]:
+            self.assertEqual(validate_signed_request({'signature': "c2lnbmF0dXJl", 'data': data}),
+                             ({'success': False, 'code': 400, 'msg': 'Invalid data'}, None))
+
+    def test_validate_signed_request_no_mac(self):
+        args = {'signature': "c2lnbmF0dXJl", 'data': json.dumps({'phone_id': "abc"})}
+
+        self.assertEqual(validate_signed_request(args),
+                         ({'success': False, 'code': 400, 'msg': 'Invalid smart_lock_MAC'}, None))
+
+    def test_validate_signed_request_not_a_dict(self):
+        self.assertEqual(validate_signed_request(None), ({'success': False, 'code': 400, 'msg': 'Invalid request'}, None))
+
+    def test_is_valid_mac(self):
+        self.assertTrue(is_valid_mac("AA:00:aa:00:AA:0f"))
+        self.assertFalse(is_valid_mac("AA:00:AA:00:AA"))
+        self.assertFalse(is_valid_mac("AA:00:AA:00:AA:0G"))
+        self.assertFalse(is_valid_mac(None))
+
+    def test_is_valid_key(self):
+        self.assertTrue(is_valid_key("abcDEF123"))
+        self.assertFalse(is_valid_key("abc/def"))
+        self.assertFalse(is_valid_key("../doors"))
+        self.assertFalse(is_valid_key("abc?def"))
+        self.assertFalse(is_valid_key(""))
+        self.assertFalse(is_valid_key(12))
+
+    def test_is_valid_utc_offset(self):
+        self.assertTrue(is_valid_utc_offset(0))
+        self.assertTrue(is_valid_utc_offset(3600))
+        self.assertTrue(is_valid_utc_offset(-12 * 3600))
+        self.assertFalse(is_valid_utc_offset(15 * 3600))
+        self.assertFalse(is_valid_utc_offset("3600"))
+        self.assertFalse(is_valid_utc_offset(True))
+        self.assertFalse(is_valid_utc_offset(None))
+
+    def test_get_client_ip_without_trusted_proxy(self):
+        # a client supplied X-Forwarded-For is ignored
+        self.assertEqual(get_client_ip("10.0.0.1", None), "10.0.0.1")
+        self.assertEqual(get_client_ip("10.0.0.1", "1.2.3.4"), "10.0.0.1")
+
+    def test_get_client_ip_with_trusted_proxies(self):
+        self.assertEqual(get_client_ip("10.0.0.1", "1.2.3.4", 1), "1.2.3.4")
+        # entries left of the ones the proxies added are the client's own
+        self.assertEqual(get_client_ip("10.0.0.1", "6.6.6.6, 1.2.3.4", 1), "1.2.3.4")
+        self.assertEqual(get_client_ip("10.0.0.1", "6.6.6.6, 1.2.3.4, 10.0.0.2", 2), "1.2.3.4")
+        # fewer hops than trusted proxies
+        self.assertEqual(get_client_ip("10.0.0.1", "1.2.3.4", 2), "10.0.0.1")
+        self.assertEqual(get_client_ip("10.0.0.1", None, 1), "10.0.0.1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import unittest
+
+from response_signer import ResponseSigner
+from rsa_util import RSA_Util
+import rsa_util_tests
+
+NOW = 1651449600
+
+
+class CountingRSAUtil(RSA_Util):
+    signatures = 0
+
+    def sign(self, message):
+        self.signatures += 1
+        return super().sign(message)
+
+
+class TestResponseSignerMethods(unittest.TestCase):
+    rsa = CountingRSAUtil(key_str=rsa_util_tests.TestRSAUtilMethods.RSA_PRIV_KEY_STR)
+
+    def setUp(self):
+        self.rsa.signatures = 0
+
+    def test_sign_authorization_ok(self):
+        signer = ResponseSigner(self.rsa, ttl=300)
+        authorization = {'type': 2, 'phone_id': "phone1", 'valid_from': 0, 'valid_until': NOW + 100}
+
+        signed_data, signature_b64 = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", authorization, True,
+                                                               NOW + 100, now=NOW)
+
+        self.assertTrue(self.rsa.is_signature_valid(signed_data, signature_b64))
+        signed = json.loads(signed_data)
+        self.assertEqual(signed['data'], authorization)
+        self.assertEqual(signed['smart_lock_MAC'], "AA:00:AA:00:AA:00")
+        # the verdict is signed too, and the signature ends with it
+        self.assertEqual((signed['allowed'], signed['allowed_until']), (True, NOW + 100))
+        self.assertEqual((signed['issued_at'], signed['expires']), (NOW, NOW + 100))
+
+    def test_sign_authorization_expires(self):
+        signer = ResponseSigner(self.rsa, ttl=300)
+
+        signed_data, _ = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 0}, True, None, now=NOW)
+
+        self.assertEqual(json.loads(signed_data)['expires'], NOW + 300)
+
+    def test_sign_authorization_cached(self):
+        signer = ResponseSigner(self.rsa, ttl=300)
+
+        first = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 0, 'phone_id': "phone1"}, True,
+                                          None, now=NOW)
+        second = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'phone_id': "phone1", 'type': 0}, True,
+                                           None, now=NOW + 149)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.rsa.signatures, 1)
+
+        # signed again once half of the ttl is gone
+        third = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 0, 'phone_id': "phone1"}, True,
+                                          None, now=NOW + 150)
+
+        self.assertNotEqual(first, third)
+        self.assertEqual(self.rsa.signatures, 2)
+
+    def test_sign_authorization_changed(self):
+        signer = ResponseSigner(self.rsa)
+
+        first = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 0}, True, None, now=NOW)
+        second = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 1}, True, None, now=NOW)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.rsa.signatures, 2)
+        self.assertEqual(len(signer), 1)
+
+    def test_sign_authorization_revoked(self):
+        signer = ResponseSigner(self.rsa)
+
+        granted = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", {'type': 0}, True, None, now=NOW)
+        revoked = signer.sign_authorization("AA:00:AA:00:AA:00", "phone1", None, False, None, now=NOW)
+
+        self.assertNotEqual(granted, revoked)
+        self.assertFalse(json.loads(revoked[0])['allowed'])
+
+    def test_max_entries(self):
+        signer = ResponseSigner(self.rsa, max_entries=2)
+
+        for phone_id in ["phone1", "phone2", "phone3"]:
+            signer.sign_authorization("AA:00:AA:00:AA:00", phone_id, {'type': 0}, True, None)
+
+        self.assertEqual(len(signer), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
 from firebase_util_for_tests import FirebaseUtilForTests
-from rsa_util import RSA_Util, get_rsa_key_from_x509_cert
+from rsa_util import RSA_Util, get_rsa_key_from_x509_cert, get_public_key_from_x509_cert, BACKEND_CRYPTOGRAPHY
 
 
 class TestRSAUtilMethods(unittest.TestCase):
@@ -43,6 +43,8 @@ Q25wRWKI10hwG0cYRiVbiwIxqoYqF+4SGGoQBZ3/XhXSdBfGG6UC53hESl7rRO5W
 ymIEhdLR7VqY2PkHcU2GChWxpf2IhUwlJYP+er10dKFvSUHxivHB
 -----END RSA PRIVATE KEY-----'''
 
+    CERT = f"-----BEGIN CERTIFICATE-----MIIDnDCCAoQCFCgMck/fiKWOmeNKNcQTKI66xXUEMA0GCSqGSIb3DQEBCwUAMIGqMQswCQYDVQQGEwJQVDEPMA0GA1UECAwGTGlzYm9uMQ8wDQYDVQQHDAZMaXNib24xHTAbBgNVBAoMFE1TYyBCZXJuYXJkbyBNYXJxdWVzMQswCQYDVQQLDAJDQTEZMBcGA1UEAwwQQmVybmFyZG8gTWFycXVlczEyMDAGCSqGSIb3DQEJARYjYmVybmFyZG9jbWFycXVlc0B0ZWNuaWNvLnVsaXNib2EucHQwHhcNMjIwNDI1MTQ1ODU1WhcNMjMwNDI1MTQ1ODU1WjBqMQswCQYDVQQGEwJQVDEPMA0GA1UECAwGTGlzYm9uMQ8wDQYDVQQHDAZMaXNib24xHTAbBgNVBAoMFE1TYyBCZXJuYXJkbyBNYXJxdWVzMRowGAYDVQQDDBE3QzpERjpBMToxQTowRTo1QTCCASIwDQYJKoZIhvcNAQEBBQADggEPADCCAQoCggEBAMSx1WkxxeQ9SZv/uZ/mB/wotECwIP9p5sslvkMDR2WDVnPd60Ekbpo4L+CJotZFBraaruz7JkrRrRVpV1LGgRyIFhIQZF2Nbch7+Jd69DaRVnqYVBEfhA/FKPdPrI6xeFcnGQIewEu0rjEU0iYe6a81ezdx7ZeBh3xlA9ynYovdLmCCj0qtpxTlqAc3EiukJrZ5EG98sOM2+nFVI6AQ+6j2Hs8fVSmP4GMu6hjavb6KClznR7Hu6CwmfuTtEG3mj2Od2i7iW7NiibU69IsBJsgNhCySrN30IlRCnorWwMmzpP9pr4Al0HEC6zdR9q5f3KRGDen+qicY4D05LbfnZ5ECAwEAATANBgkqhkiG9w0BAQsFAAOCAQEAVIZYs/w7f+m8df7ceUFkR6mfWZDMr+NrBwsKfoM3ezlgQUcmcezYuRadvn94KxDw2QL65d0vQvTCVFSXOnbb1wQktXrRtueo9Dat+rwMccOORq2lMO1B/zrhjXSNVh4Aou2fzvNJXC5yC3sAnKfBMDEhxvsct+jT+MogCXKh7r8gRHErY2FoEDge9RvkWDZFqIOeLt8/juALdOjsU+XDaKK6oAb+N4pVun7KxiXFussoX/3bf3y6kVLwUmvse9OhmXt4R7jV1jn6kFUpYetqhrAQcvP5Id3fc3op+su0j51RgHZ5n2tKirR9TgauTvo8Ag5JM5mL3bllWdI2wnSmlA==-----END CERTIFICATE-----"
+
     def test_rsa_init_with_filename(self):
         rsa = RSA_Util(filename="../public_key.pem")
         self.assertEqual(rsa.key.exportKey().decode(), self.RSA_PUB_KEY_STR)
@@ -99,6 +101,51 @@ ymIEhdLR7VqY2PkHcU2GChWxpf2IhUwlJYP+er10dKFvSUHxivHB
         is_valid = rsa.is_signature_valid(message_invalid, signature_b64)
         self.assertFalse(is_valid)
 
+    def test_cryptography_init_with_key_str(self):
+        rsa = RSA_Util(key_str=self.RSA_PUB_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        rsa_pycryptodome = RSA_Util(key_str=self.RSA_PUB_KEY_STR)
+        self.assertEqual(rsa.get_public_key_base64(), rsa_pycryptodome.get_public_key_base64())
+        self.assertEqual(rsa.get_public_key_base64("PEM"), rsa_pycryptodome.get_public_key_base64("PEM"))
+
+    def test_cryptography_init_with_cert_public_key(self):
+        rsa = RSA_Util(key_obj=get_public_key_from_x509_cert(self.CERT), backend=BACKEND_CRYPTOGRAPHY)
+        rsa_pycryptodome = RSA_Util(key_str=get_rsa_key_from_x509_cert(self.CERT))
+        self.assertEqual(rsa.get_public_key_base64(), rsa_pycryptodome.get_public_key_base64())
+
+    def test_cryptography_sign_verified_by_pycryptodome(self):
+        rsa = RSA_Util(key_str=self.RSA_PRIV_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        rsa_pycryptodome = RSA_Util(key_str=self.RSA_PRIV_KEY_STR)
+        message = "This is a message!"
+
+        signature_b64 = rsa.sign(message)
+        self.assertTrue(rsa_pycryptodome.is_signature_valid(message, signature_b64))
+        self.assertTrue(rsa.is_signature_valid(message, signature_b64))
+
+    def test_pycryptodome_sign_verified_by_cryptography(self):
+        rsa = RSA_Util(key_str=self.RSA_PRIV_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        rsa_pycryptodome = RSA_Util(key_str=self.RSA_PRIV_KEY_STR)
+        message = "This is a message!"
+
+        signature_b64 = rsa_pycryptodome.sign(message)
+        self.assertTrue(rsa.is_signature_valid(message, signature_b64))
+        self.assertFalse(rsa.is_signature_valid("This is a invalid message!", signature_b64))
+
+    def test_cryptography_is_signature_valid_invalid_signature(self):
+        rsa = RSA_Util(key_str=self.RSA_PRIV_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        self.assertFalse(rsa.is_signature_valid("This is a message!", "SU5WQUxJRCBTSUdOQVRVUkU="))
+
+    def test_cryptography_encrypt_decrypt_parity(self):
+        rsa = RSA_Util(key_str=self.RSA_PRIV_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        rsa_pycryptodome = RSA_Util(key_str=self.RSA_PRIV_KEY_STR)
+        plaintext = "This is a plaintext message!"
+
+        self.assertEqual(rsa_pycryptodome.decrypt_msg(rsa.encrypt_msg(plaintext)).decode(), plaintext)
+        self.assertEqual(rsa.decrypt_msg(rsa_pycryptodome.encrypt_msg(plaintext)).decode(), plaintext)
+
+    def test_cryptography_decrypt_msg_with_pub_key(self):
+        rsa = RSA_Util(key_str=self.RSA_PUB_KEY_STR, backend=BACKEND_CRYPTOGRAPHY)
+        self.assertEqual(rsa.decrypt_msg(rsa.encrypt_msg("This is a plaintext message!")), None)
+
 
 if __name__ == '__main__':
     unittest.main()
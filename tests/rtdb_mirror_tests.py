@@ -0,0 +1,138 @@
+import time
+import unittest
+
+from firebase_util import FirebaseUtil
+from memory_firebase_util import MemoryDb, MemoryEvent
+from rtdb_mirror import RtdbMirror, HEARTBEAT_PATH
+
+
+class _CountingDb(MemoryDb):
+    # counts the references made outside the mirror's heartbeats
+
+    def __init__(self, data=None, latency=0):
+        super().__init__(data, latency)
+        self.references = 0
+
+    def reference(self, path="/"):
+        if not path.startswith(HEARTBEAT_PATH):
+            self.references += 1
+        return super().reference(path)
+
+
+def _wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class TestRtdbMirrorMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.db = _CountingDb({
+            'doors': {'AA': {'MAC': "AA", 'BLE': "BB"}, 'CC': {'MAC': "CC", 'BLE': "DD"}},
+            'authorizations': {'AA': {'phone1': {'type': 0}}},
+            'users': {'u1': {'username': "user1"}},
+        })
+        self.mirror = RtdbMirror(self.db, ["doors", "authorizations"])
+        self.fb_util = FirebaseUtil(db=self.db)
+        self.fb_util.mirror = self.mirror
+
+        self.mirror.check()
+        _wait_until(lambda: self.mirror.is_synced("doors") and self.mirror.is_synced("authorizations"))
+
+    def tearDown(self):
+        self.mirror.stop()
+
+    def test_reads_from_mirror(self):
+        references = self.db.references
+
+        self.assertEqual(self.fb_util.get_data("doors/AA"), {'MAC': "AA", 'BLE': "BB"})
+        self.assertEqual(self.fb_util.get_data("authorizations/AA/phone1/type"), 0)
+        self.assertIsNone(self.fb_util.get_data("doors/EE"))
+        self.assertEqual(self.fb_util.get_data_where_child_equal_to("doors", "BLE", "DD"),
+                         {'CC': {'MAC': "CC", 'BLE': "DD"}})
+        self.assertEqual(self.db.references, references)
+
+        # other trees are read from the database
+        self.assertEqual(self.fb_util.get_data("users/u1/username"), "user1")
+        self.assertEqual(self.db.references, references + 1)
+
+    def test_reads_are_copies(self):
+        self.fb_util.get_data("doors/AA")['BLE'] = "XX"
+
+        self.assertEqual(self.fb_util.get_data("doors/AA/BLE"), "BB")
+
+    def test_changes_from_other_writers(self):
+        # e.g. another worker
+        self.db.store.set_data("doors/AA", {'IP': "127.0.0.1"})
+        self.db.store.delete_key("authorizations/AA")
+
+        _wait_until(lambda: self.fb_util.get_data("doors/AA/IP") == "127.0.0.1")
+        self.assertEqual(self.fb_util.get_data("doors/AA"), {'MAC': "AA", 'BLE': "BB", 'IP': "127.0.0.1"})
+        _wait_until(lambda: self.fb_util.get_data("authorizations") is None)
+
+    def test_own_writes(self):
+        self.fb_util.set_multiple_data({"doors/AA/IP": "127.0.0.1", "doors/CC": None})
+
+        self.assertEqual(self.fb_util.get_data("doors/AA/IP"), "127.0.0.1")
+        self.assertIsNone(self.fb_util.get_data("doors/CC"))
+
+    def test_patch_event(self):
+        self.mirror._apply_event("doors", MemoryEvent("patch", "/AA", {'IP': "127.0.0.1", 'BLE': None}))
+        self.mirror._apply_event("doors", MemoryEvent("put", "/CC", None))
+
+        self.assertEqual(self.fb_util.get_data("doors"), {'AA': {'MAC': "AA", 'IP': "127.0.0.1"}})
+
+    def test_lag(self):
+        _wait_until(lambda: self.mirror._heartbeat_pending_since is None)
+
+        self.assertGreaterEqual(self.mirror.lag(), 0)
+        self.assertLess(self.mirror.lag(), self.mirror.stale_after)
+
+    def test_reopens_ended_listener(self):
+        listener = self.mirror._listeners["doors"]
+        listener.close()
+        self.db.store.set_data("doors/AA", {'IP': "127.0.0.1"})
+
+        self.mirror.check()
+
+        self.assertIsNot(self.mirror._listeners["doors"], listener)
+        _wait_until(lambda: self.mirror.is_synced("doors"))
+        self.assertEqual(self.fb_util.get_data("doors/AA/IP"), "127.0.0.1")
+
+    def test_stale(self):
+        listener = self.mirror._listeners["doors"]
+        self.mirror._heartbeat_pending_since = time.time() - 2 * self.mirror.stale_after
+
+        self.assertFalse(self.mirror.is_synced("doors"))
+        references = self.db.references
+        self.assertEqual(self.fb_util.get_data("doors/AA/BLE"), "BB")
+        self.assertEqual(self.db.references, references + 1)
+
+        self.mirror.check()
+
+        self.assertIsNot(self.mirror._listeners["doors"], listener)
+        _wait_until(lambda: self.mirror.is_synced("doors"))
+
+    def test_failed_event_resyncs(self):
+        with self.assertLogs("rtdb_mirror", level="WARNING") as logs:
+            self.mirror._listeners["doors"].callback(MemoryEvent("patch", "/AA", "not an object"))
+
+        self.assertIn("event_failed", logs.output[0])
+        self.assertFalse(self.mirror.is_synced("doors"))
+        self.mirror.check()
+        _wait_until(lambda: self.mirror.is_synced("doors"))
+
+    def test_stop(self):
+        listeners = list(self.mirror._listeners.values())
+
+        self.mirror.stop()
+
+        self.assertFalse(any(listener._thread.is_alive() for listener in listeners))
+        self.assertIsNone(self.db.store.get_data(HEARTBEAT_PATH))
+
+
+if __name__ == '__main__':
+    unittest.main()
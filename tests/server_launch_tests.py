@@ -0,0 +1,42 @@
+import os
+import unittest
+from unittest import mock
+
+from lock_client_util import LOCK_TIMEOUT
+
+# importing server_launch sets PROMETHEUS_MULTIPROC_DIR for gunicorn, keep it out of the test process
+with mock.patch.dict(os.environ):
+    from server_launch import get_server_config, PRESETS, DEFAULT_PRESET
+
+
+class TestServerLaunchMethods(unittest.TestCase):
+
+    def test_presets(self):
+        for preset in PRESETS:
+            config = get_server_config(preset)
+
+            self.assertEqual(config["worker_class"], preset)
+            self.assertGreater(config["timeout"], 2 * LOCK_TIMEOUT)
+            self.assertGreater(config["graceful_timeout"], 2 * LOCK_TIMEOUT)
+
+        self.assertFalse(get_server_config("gevent")["preload_app"])
+
+    def test_preset_from_env(self):
+        with mock.patch.dict(os.environ, {"SERVER_PRESET": "sync", "WEB_CONCURRENCY": "3", "PORT": "8080"}):
+            config = get_server_config()
+
+        self.assertEqual(config["worker_class"], "sync")
+        self.assertEqual(config["workers"], 3)
+        self.assertEqual(config["bind"], "0.0.0.0:8080")
+
+    def test_default_preset(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(get_server_config()["worker_class"], DEFAULT_PRESET)
+
+    def test_unknown_preset(self):
+        with self.assertRaises(ValueError):
+            get_server_config("unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import unittest
+from unittest import mock
+
+from rsa_util import RSA_Util, BACKEND_CRYPTOGRAPHY
+import rsa_util_tests
+from signature_verifier import SignatureVerifier, workers_from_env
+
+
+class TestSignatureVerifierMethods(unittest.TestCase):
+    rsa = RSA_Util(key_str=rsa_util_tests.TestRSAUtilMethods.RSA_PRIV_KEY_STR)
+    public_key = rsa.get_public_key().exportKey()
+    message = "This is a message!"
+    signature_b64 = rsa.sign(message)
+    public_key_obj = RSA_Util(key_str=public_key, backend=BACKEND_CRYPTOGRAPHY).key
+
+    @classmethod
+    def setUpClass(cls):
+        cls.verifier = SignatureVerifier(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.verifier.close()
+
+    def test_verify_ok(self):
+        self.assertTrue(self.verifier.verify(self.public_key, self.message, self.signature_b64))
+
+    def test_verify_invalid_message(self):
+        self.assertFalse(self.verifier.verify(self.public_key, "This is a invalid message!", self.signature_b64))
+
+    def test_verify_malformed_signature(self):
+        self.assertFalse(self.verifier.verify(self.public_key, self.message, "not base64!"))
+
+    def test_verify_many(self):
+        items = [(self.public_key, self.message, self.signature_b64), (self.public_key, "other", self.signature_b64)]
+
+        self.assertEqual(self.verifier.verify_many(items), [True, False])
+
+    def test_verify_key_object(self):
+        # inline, and converted to PEM for the pool
+        for verifier in [SignatureVerifier(), self.verifier]:
+            self.assertTrue(verifier.verify(self.public_key_obj, self.message, self.signature_b64))
+            self.assertFalse(verifier.verify(self.public_key_obj, "other", self.signature_b64))
+
+    def test_verify_inline(self):
+        verifier = SignatureVerifier()
+
+        self.assertTrue(verifier.verify(self.public_key, self.message, self.signature_b64))
+        # no pool or dispatcher thread is started
+        self.assertIsNone(verifier._pool)
+
+    def test_workers_from_env(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(workers_from_env(), 0)
+        with mock.patch.dict(os.environ, {'SIGNATURE_VERIFIER_WORKERS': "2"}):
+            self.assertEqual(workers_from_env(), 2)
+        with mock.patch.dict(os.environ, {'SIGNATURE_VERIFIER_WORKERS': "auto"}):
+            self.assertIsNone(workers_from_env())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_util import FirebaseUtil
+from memory_firebase_util import MemoryDb
+from single_flight import SingleFlight, AsyncSingleFlight
+
+
+class _CountingDb(MemoryDb):
+
+    def __init__(self, data=None, latency=0):
+        super().__init__(data, latency)
+        self.references = 0
+
+    def reference(self, path="/"):
+        self.references += 1
+        return super().reference(path)
+
+
+def _wait_for_followers(single_flight, n):
+    while sum(call.followers for call in list(single_flight._calls.values())) < n:
+        time.sleep(0.001)
+
+
+class TestSingleFlightMethods(unittest.TestCase):
+
+    def _run_concurrently(self, n, func):
+        with ThreadPoolExecutor(n) as executor:
+            futures = [executor.submit(func) for _ in range(n)]
+            return [future.result() for future in futures]
+
+    def test_concurrent_calls_share_one_call(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def read():
+            calls.append(1)
+            release.wait(5)
+            return {'MAC': "AA"}
+
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(single_flight.do, "doors/AA", read) for _ in range(8)]
+            _wait_for_followers(single_flight, 7)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, shared in results], [{'MAC': "AA"}] * 8)
+        self.assertTrue(all(shared for result, shared in results))
+        # every caller gets its own copy
+        self.assertEqual(len({id(result) for result, shared in results}), 8)
+        self.assertEqual(len(single_flight), 0)
+
+    def test_sequential_calls_are_not_shared(self):
+        single_flight = SingleFlight()
+        result = {'MAC': "AA"}
+
+        self.assertEqual(single_flight.do("doors/AA", lambda: result), (result, False))
+        self.assertIs(single_flight.do("doors/AA", lambda: result)[0], result)
+
+    def test_errors_are_shared(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+
+        def read():
+            release.wait(5)
+            raise ValueError()
+
+        with ThreadPoolExecutor(4) as executor:
+            futures = [executor.submit(single_flight.do, "doors/AA", read) for _ in range(4)]
+            _wait_for_followers(single_flight, 3)
+            release.set()
+            for future in futures:
+                self.assertRaises(ValueError, future.result)
+
+        self.assertEqual(single_flight.do("doors/AA", lambda: 1), (1, False))
+
+    def test_forget(self):
+        single_flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_read():
+            started.set()
+            release.wait(5)
+            return "old"
+
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(single_flight.do, "doors/AA", slow_read)
+            started.wait(5)
+            single_flight.forget()
+            self.assertEqual(single_flight.do("doors/AA", lambda: "new"), ("new", False))
+            release.set()
+            self.assertEqual(future.result(), ("old", False))
+
+    def test_firebase_util_coalesces_reads(self):
+        db = _CountingDb({'doors': {'AA': {'MAC': "AA", 'BLE': "BB"}}}, latency=0.2)
+        fb_util = FirebaseUtil(db=db)
+
+        results = self._run_concurrently(8, lambda: fb_util.get_data("doors/AA"))
+
+        self.assertEqual(results, [{'MAC': "AA", 'BLE': "BB"}] * 8)
+        self.assertLess(db.references, 8)
+
+        results[0]['MAC'] = "CC"
+        self.assertEqual(results[1]['MAC'], "AA")
+
+    def test_firebase_util_without_coalescing(self):
+        db = _CountingDb({'doors': {'AA': {'MAC': "AA"}}}, latency=0.1)
+        fb_util = FirebaseUtil(db=db, coalesce_reads=False)
+
+        self._run_concurrently(4, lambda: fb_util.get_data("doors/AA"))
+
+        self.assertEqual(db.references, 4)
+
+
+class TestAsyncSingleFlightMethods(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_call(self):
+        single_flight = AsyncSingleFlight()
+        calls = []
+
+        async def read():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'MAC': "AA"}
+
+        async def run():
+            return await asyncio.gather(*[single_flight.do("doors/AA", read) for _ in range(8)])
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, shared in results], [{'MAC': "AA"}] * 8)
+        self.assertTrue(all(shared for result, shared in results))
+        self.assertEqual(len({id(result) for result, shared in results}), 8)
+        self.assertEqual(len(single_flight), 0)
+
+    def test_sequential_calls_are_not_shared(self):
+        single_flight = AsyncSingleFlight()
+        result = {'MAC': "AA"}
+
+        async def read():
+            return result
+
+        async def run():
+            return [await single_flight.do("doors/AA", read) for _ in range(2)]
+
+        self.assertEqual(asyncio.run(run()), [(result, False)] * 2)
+
+    def test_errors_are_shared(self):
+        single_flight = AsyncSingleFlight()
+
+        async def read():
+            await asyncio.sleep(0.01)
+            raise ValueError()
+
+        async def run():
+            return await asyncio.gather(*[single_flight.do("doors/AA", read) for _ in range(4)],
+                                        return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in asyncio.run(run())))
+        self.assertEqual(len(single_flight), 0)
+
+    def test_cancelled_caller_does_not_cancel_the_call(self):
+        single_flight = AsyncSingleFlight()
+
+        async def read():
+            await asyncio.sleep(0.02)
+            return "AA"
+
+        async def run():
+            first = asyncio.ensure_future(single_flight.do("doors/AA", read))
+            second = asyncio.ensure_future(single_flight.do("doors/AA", read))
+            await asyncio.sleep(0.005)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(run()), ("AA", True))
+
+    def test_forget(self):
+        single_flight = AsyncSingleFlight()
+
+        async def slow_read():
+            await asyncio.sleep(0.02)
+            return "old"
+
+        async def new_read():
+            return "new"
+
+        async def run():
+            old = asyncio.ensure_future(single_flight.do("doors/AA", slow_read))
+            await asyncio.sleep(0.005)
+            single_flight.forget()
+            self.assertEqual(await single_flight.do("doors/AA", new_read), ("new", False))
+            self.assertEqual(await old, ("old", False))
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
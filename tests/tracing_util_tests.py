@@ -0,0 +1,147 @@
+import json
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+
+import tracing_util
+from tracing_util import Tracer, FileSpanExporter, OtlpHttpSpanExporter, parse_traceparent, set_attributes, \
+    trace_app, STATUS_ERROR
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class _ListProcessor:
+
+    def __init__(self):
+        self.spans = []
+
+    def on_end(self, span):
+        self.spans.append(span)
+
+
+class TestTracingUtilMethods(unittest.TestCase):
+
+    def test_nested_spans(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=1, processors=[processor])
+
+        with tracer.start_span("root") as root:
+            with tracer.start_span("child", **{'rtdb.path': "doors/AA"}):
+                set_attributes(**{'lock.mac': "AA"})
+
+        child, ended_root = processor.spans
+        self.assertIs(ended_root, root)
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(child.attributes, {'rtdb.path': "doors/AA", 'lock.mac': "AA"})
+        self.assertGreaterEqual(root.end_ns, child.end_ns)
+
+    def test_not_sampled(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=0, processors=[processor])
+
+        with tracer.start_span("root") as root:
+            with tracer.start_span("child") as child:
+                pass
+
+        self.assertIsNone(root)
+        self.assertIsNone(child)
+        self.assertEqual(processor.spans, [])
+
+    def test_no_processors(self):
+        with Tracer(sample_rate=1).start_span("root") as root:
+            self.assertIsNone(root)
+
+    def test_error_status(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=1, processors=[processor])
+
+        with self.assertRaises(TimeoutError):
+            with tracer.start_span("lock.recv"):
+                raise TimeoutError()
+
+        self.assertEqual(processor.spans[0].status, STATUS_ERROR)
+        self.assertEqual(processor.spans[0].error, "TimeoutError")
+
+    def test_remote_parent(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=0, processors=[processor])
+
+        with tracer.start_span("root", parent=(TRACE_ID, PARENT_ID, True)) as root:
+            pass
+
+        self.assertEqual(root.trace_id, TRACE_ID)
+        self.assertEqual(root.parent_id, PARENT_ID)
+
+        with tracer.start_span("root", parent=(TRACE_ID, PARENT_ID, False)) as root:
+            self.assertIsNone(root)
+
+    def test_parse_traceparent(self):
+        self.assertEqual(parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01"), (TRACE_ID, PARENT_ID, True))
+        self.assertEqual(parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00"), (TRACE_ID, PARENT_ID, False))
+        self.assertIsNone(parse_traceparent(None))
+        self.assertIsNone(parse_traceparent("00-abc-def-01"))
+        self.assertIsNone(parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-zz"))
+
+    def test_file_exporter(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=1, processors=[processor])
+        with tracer.start_span("root", **{'lock.mac': "AA"}):
+            pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "spans.jsonl")
+            FileSpanExporter(filename).export(processor.spans)
+
+            with open(filename) as file:
+                exported = [json.loads(line) for line in file]
+
+        self.assertEqual(exported[0]['name'], "root")
+        self.assertEqual(exported[0]['attributes'], {'lock.mac': "AA"})
+
+    def test_otlp_payload(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=1, processors=[processor])
+        with tracer.start_span("root", **{'http.status_code': 200}):
+            pass
+
+        payload = OtlpHttpSpanExporter("http://localhost:4318/v1/traces").to_payload(processor.spans)
+        span = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+
+        self.assertEqual(span['name'], "root")
+        self.assertEqual(len(span['traceId']), 32)
+        self.assertEqual(span['kind'], 2)
+        self.assertEqual(span['attributes'], [{'key': 'http.status_code', 'value': {'intValue': "200"}}])
+
+    def test_trace_app(self):
+        processor = _ListProcessor()
+        tracer = Tracer(sample_rate=1, processors=[processor])
+
+        app = Flask(__name__)
+        trace_app(app)
+
+        @app.route("/locks/<lock_id>")
+        def get_lock(lock_id):
+            with tracer.start_span("firebase.get_data"):
+                pass
+            return {'success': True}
+
+        default_tracer, tracing_util.tracer = tracing_util.tracer, tracer
+        try:
+            app.test_client().get("/locks/AA", headers={'traceparent': f"00-{TRACE_ID}-{PARENT_ID}-01"})
+        finally:
+            tracing_util.tracer = default_tracer
+
+        child, root = processor.spans
+        self.assertEqual(root.name, "GET /locks/<lock_id>")
+        self.assertEqual(root.trace_id, TRACE_ID)
+        self.assertEqual(root.attributes['http.status_code'], 200)
+        self.assertEqual(child.parent_id, root.span_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,299 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from request_hooks import request_globals, request_hook
+
+# OpenTelemetry-style spans without the SDK. Configured from the environment:
+#   TRACE_SAMPLE_RATE    fraction of requests (root spans) that are traced, 0 by default
+#   TRACE_EXPORT_FILE    append finished spans to this file as JSON lines
+#   TRACE_OTLP_ENDPOINT  POST finished spans to an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces
+# Spans are only recorded when an exporter is configured and the trace is sampled.
+
+SERVICE_NAME = "smart-lock-server"
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# marks a trace that was not sampled, so its child spans are skipped without a new sampling decision
+_NOT_SAMPLED = object()
+
+
+def _random_id(n_bytes):
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None, root=False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        # first span of this service in the trace, exported as a server span
+        self.root = root
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_OK
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6,
+            'attributes': self.attributes,
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+class FileSpanExporter:
+    # One JSON object per span and line
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def export(self, spans):
+        with open(self.filename, "a") as file:
+            for span in spans:
+                file.write(json.dumps(span.to_dict()) + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpHttpSpanExporter:
+    # OTLP/HTTP with the JSON encoding, which collectors accept on /v1/traces
+
+    def __init__(self, endpoint, service_name=SERVICE_NAME, timeout=5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def to_payload(self, spans):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': _otlp_value(self.service_name)}]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or "",
+                    'name': span.name,
+                    'kind': 2 if span.root else 1,
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [{'key': key, 'value': _otlp_value(value)}
+                                   for key, value in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error or ""} if span.status == STATUS_ERROR else {'code': 1},
+                } for span in spans]
+            }]
+        }]}
+
+    def export(self, spans):
+        import requests
+
+        requests.post(self.endpoint, json=self.to_payload(spans), timeout=self.timeout).raise_for_status()
+
+
+class BatchSpanProcessor:
+    # Queues finished spans and exports them from a background thread, every `interval` seconds or `batch_size` spans.
+    # When the queue is full new spans are dropped rather than slowing requests down.
+
+    def __init__(self, exporter, interval=5, batch_size=512, max_queue_size=4096):
+        self.exporter = exporter
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._batch_ready = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def on_end(self, span):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            return
+
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    def flush(self):
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for start in range(0, len(spans), self.batch_size):
+            try:
+                self.exporter.export(spans[start:start + self.batch_size])
+            except Exception:
+                pass
+
+    def _ensure_thread(self):
+        # started lazily, and again after a fork (e.g. gunicorn --preload)
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._batch_ready = threading.Event()
+                    threading.Thread(target=self._run, args=(self._batch_ready,), daemon=True).start()
+                    self._pid = pid
+
+    def _run(self, batch_ready):
+        while True:
+            batch_ready.wait(self.interval)
+            batch_ready.clear()
+            self.flush()
+
+
+class Tracer:
+
+    def __init__(self, sample_rate=0.0, processors=None):
+        self.sample_rate = sample_rate
+        self.processors = list(processors or [])
+
+    @contextmanager
+    def start_span(self, name, parent=None, **attributes):
+        # Yields the new Span, or None when the trace is not recorded. parent is a (trace_id, span_id, sampled)
+        # tuple for a trace started elsewhere (see parse_traceparent).
+        current = _current_span.get()
+
+        if current is _NOT_SAMPLED or not self.processors:
+            yield None
+            return
+
+        if current is not None:
+            span = Span(name, current.trace_id, current.span_id, attributes)
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent
+            span = Span(name, trace_id, parent_id, attributes, root=True) if sampled else None
+        elif random.random() < self.sample_rate:
+            span = Span(name, _random_id(16), None, attributes, root=True)
+        else:
+            span = None
+
+        token = _current_span.set(span or _NOT_SAMPLED)
+        try:
+            yield span
+        except BaseException as e:
+            if span is not None:
+                span.status = STATUS_ERROR
+                span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            if span is not None:
+                span.end_ns = time.time_ns()
+                for processor in self.processors:
+                    processor.on_end(span)
+
+
+def parse_traceparent(header):
+    # W3C traceparent "00-<trace_id>-<parent_id>-<flags>", returns (trace_id, parent_id, sampled) or None
+    parts = header.split("-") if header else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def _tracer_from_env():
+    processors = []
+    if os.environ.get("TRACE_EXPORT_FILE"):
+        processors.append(BatchSpanProcessor(FileSpanExporter(os.environ["TRACE_EXPORT_FILE"])))
+    if os.environ.get("TRACE_OTLP_ENDPOINT"):
+        processors.append(BatchSpanProcessor(OtlpHttpSpanExporter(os.environ["TRACE_OTLP_ENDPOINT"])))
+    return Tracer(float(os.environ.get("TRACE_SAMPLE_RATE", 0)), processors)
+
+
+tracer = _tracer_from_env()
+
+
+def start_span(name, **attributes):
+    return tracer.start_span(name, **attributes)
+
+
+def set_attributes(**attributes):
+    # adds attributes to the current span, if the trace is recorded
+    span = _current_span.get()
+    if span is not None and span is not _NOT_SAMPLED:
+        span.attributes.update(attributes)
+
+
+def traced(name=None):
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_app(app):
+    # one root span per request, continuing the caller's trace when it sends a traceparent header
+    request, g = request_globals(app)
+    hook = request_hook(app)
+
+    @app.before_request
+    @hook
+    def _start_request_span():
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.trace_span = tracer.start_span(f"{request.method} {route}",
+                                         parent=parse_traceparent(request.headers.get("traceparent")),
+                                         **{'http.method': request.method, 'http.route': route})
+        span = g.trace_span.__enter__()
+        if span is not None:
+            span.set_attribute('http.client_ip', request.remote_addr)
+
+    @app.after_request
+    @hook
+    def _record_status(response):
+        set_attributes(**{'http.status_code': response.status_code})
+        return response
+
+    @app.teardown_request
+    @hook
+    def _end_request_span(exc):
+        if "trace_span" in g:
+            if exc is None:
+                g.trace_span.__exit__(None, None, None)
+            else:
+                g.trace_span.__exit__(type(exc), exc, exc.__traceback__)
+
+    return app